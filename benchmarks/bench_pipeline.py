@@ -0,0 +1,181 @@
+"""
+Benchmark de extremo a extremo del pipeline de evaluación con el proveedor
+local simulado (LLM_PROVIDER=fake): no hace llamadas de red ni tiene coste.
+
+Mide, para cada combinación de tamaño de oferta, tamaño de CV y concurrencia:
+  - candidatos por segundo,
+  - latencia p50 / p95 por candidato,
+  - llamadas al LLM por candidato,
+  - pico de memoria (tracemalloc),
+  - con --cascade, la tasa de veredictos escalados al modelo fuerte.
+
+Uso (desde la raíz del proyecto):
+  python -m benchmarks.bench_pipeline
+  python -m benchmarks.bench_pipeline --offer-sizes 5,20 --cv-sizes 40,400 \\
+      --concurrency 1,8,32 --candidates 200 --latency 0.05 --json resultados.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# El proveedor y las cachés se configuran antes de importar el proyecto (config lee el entorno al importarse)
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="ia_eval_bench_"))
+os.environ.setdefault("INSTRUMENTATION_MAX_RECORDS", "1000000")
+# Sin limitador salvo que se pida una cuota (--rpm / --tpm)
+os.environ.setdefault("LLM_RATE_LIMIT_ENABLED", "false")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+SKILLS = [
+    "Python", "Django", "Docker", "Kubernetes", "SQL", "AWS", "React", "TypeScript", "Java",
+    "Spring", "Git", "Linux", "Terraform", "Kafka", "Airflow", "Spark", "PyTorch", "FastAPI",
+    "Redis", "MongoDB", "GraphQL", "Go", "Rust", "Scala", "Tableau", "Excel", "Jira", "Scrum",
+]
+FILLER = (
+    "Participé en el diseño e implantación de servicios internos, coordinando con "
+    "equipos de producto y operaciones, documentando decisiones y revisando código."
+)
+
+
+def make_offer(n_requirements: int, rng: random.Random) -> str:
+    lines = []
+    for i in range(n_requirements):
+        skill = SKILLS[i % len(SKILLS)]
+        if i % 5 == 4:
+            lines.append(f"Se valora experiencia con {skill}")
+        elif i % 7 == 6:
+            lines.append(f"Grado en Informática o Máster en {skill}")
+        else:
+            lines.append(f"Experiencia en {skill} ({rng.randint(1, 5)} años)")
+    return "\n".join(lines)
+
+
+def make_cv(n_lines: int, rng: random.Random) -> str:
+    lines = ["PERFIL", "Ingeniero de software con experiencia en desarrollo backend.", "", "EXPERIENCIA"]
+    while len(lines) < n_lines:
+        skills = ", ".join(rng.sample(SKILLS, 3))
+        lines.append(f"Proyecto con {skills}. {FILLER}")
+    return "\n".join(lines)
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round((len(values) - 1) * q)))]
+
+
+async def run_case(offer_size: int, cv_size: int, concurrency: int, candidates: int, seed: int, eval_kwargs: dict) -> dict:
+    from models.instrumentation import recorder
+    from schemas import cascade_stats, reset_cascade_stats
+    from services.batch_evaluator import evaluate_offer_many
+
+    rng = random.Random(seed)
+    oferta = make_offer(offer_size, rng)
+    cvs = ((f"c{i}", make_cv(cv_size, rng)) for i in range(candidates))
+
+    recorder.clear()
+    reset_cascade_stats()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    latencies = []
+    errors = 0
+    async for item in evaluate_offer_many(oferta, cvs, max_concurrency=concurrency, **eval_kwargs):
+        latencies.append(item.elapsed)
+        errors += item.error is not None
+    wall = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    llm_calls = sum(1 for r in recorder.records() if not r.cache_hit)
+    return {
+        "offer_size": offer_size,
+        "cv_lines": cv_size,
+        "concurrency": concurrency,
+        "candidates": candidates,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "candidates_per_s": round(candidates / wall, 2) if wall else 0.0,
+        "p50_s": round(_percentile(latencies, 0.50), 4),
+        "p95_s": round(_percentile(latencies, 0.95), 4),
+        "llm_calls_per_candidate": round(llm_calls / candidates, 2),
+        "llm_calls_per_min": round(llm_calls / wall * 60, 1) if wall else 0.0,
+        "peak_mem_mb": round(peak / 1024 / 1024, 2),
+        "escalation_rate": cascade_stats().get("check_requirements", {}).get("escalation_rate"),
+    }
+
+
+def _ints(text: str):
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline con el LLM simulado.")
+    parser.add_argument("--offer-sizes", default="5,20", help="Nº de requisitos por oferta (lista separada por comas).")
+    parser.add_argument("--cv-sizes", default="40,400", help="Nº de líneas por CV (lista separada por comas).")
+    parser.add_argument("--concurrency", default="1,8,32", help="Niveles de concurrencia (lista separada por comas).")
+    parser.add_argument("--candidates", type=int, default=100, help="CVs por caso.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Latencia simulada por llamada (s).")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Jitter de la latencia (s).")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Tasa de errores simulados.")
+    parser.add_argument("--rate-limit-share", type=float, default=0.0, help="Fracción de los errores que son 429.")
+    parser.add_argument("--rpm", type=float, help="Activa el limitador con esta cuota de peticiones por minuto.")
+    parser.add_argument("--tpm", type=float, help="Cuota de tokens por minuto del limitador (con --rpm).")
+    parser.add_argument("--cascade", action="store_true", help="Activa la cascada de modelos (barato -> fuerte).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-cache", action="store_true", help="Desactiva la caché de veredictos.")
+    parser.add_argument("--no-prematch", action="store_true", help="Desactiva el pre-matcher local.")
+    parser.add_argument("--json", help="Guarda los resultados en este fichero JSON.")
+    args = parser.parse_args()
+
+    os.environ["FAKE_LLM_LATENCY"] = str(args.latency)
+    os.environ["FAKE_LLM_JITTER"] = str(args.jitter)
+    os.environ["FAKE_LLM_ERROR_RATE"] = str(args.error_rate)
+    os.environ["FAKE_LLM_RATE_LIMIT_SHARE"] = str(args.rate_limit_share)
+    os.environ["FAKE_LLM_SEED"] = str(args.seed)
+    if args.rpm or args.tpm:
+        os.environ["LLM_RATE_LIMIT_ENABLED"] = "true"
+        os.environ["LLM_RPM"] = str(args.rpm or 0)
+        os.environ["LLM_TPM"] = str(args.tpm or 0)
+    if args.cascade:
+        os.environ["CASCADE_ENABLED"] = "true"
+
+    eval_kwargs = {"use_cache": not args.no_cache, "prematch": not args.no_prematch}
+
+    results = []
+    header = f"{'reqs':>5} {'lines':>6} {'conc':>5} {'cand/s':>8} {'p50_s':>8} {'p95_s':>8} {'calls/c':>8} {'rpm':>8} {'mem_mb':>8} {'err':>4} {'esc':>6}"
+    print(header)
+    print("-" * len(header))
+    case = 0
+    for offer_size in _ints(args.offer_sizes):
+        for cv_size in _ints(args.cv_sizes):
+            for concurrency in _ints(args.concurrency):
+                # Semilla distinta por caso: CVs nuevos, sin aciertos de caché heredados del caso anterior
+                case += 1
+                res = asyncio.run(run_case(
+                    offer_size, cv_size, concurrency, args.candidates, args.seed * 1000 + case, eval_kwargs
+                ))
+                results.append(res)
+                print(
+                    f"{res['offer_size']:>5} {res['cv_lines']:>6} {res['concurrency']:>5} "
+                    f"{res['candidates_per_s']:>8} {res['p50_s']:>8} {res['p95_s']:>8} "
+                    f"{res['llm_calls_per_candidate']:>8} {res['llm_calls_per_min']:>8} {res['peak_mem_mb']:>8} {res['errors']:>4} "
+                    f"{'-' if res['escalation_rate'] is None else res['escalation_rate']:>6}"
+                )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Benchmark de arranque: cuánto cuesta importar los puntos de entrada (CLI y
+workers) y compilar el grafo de la entrevista en un proceso nuevo.
+
+Para cada módulo lanza procesos Python limpios y mide:
+  - tiempo de importación acumulado (python -X importtime),
+  - arranque en frío (proceso completo: intérprete + import),
+  - qué dependencias pesadas quedan cargadas tras el import (langchain_openai,
+    langgraph, ...); deberían cargarse solo al usarse.
+Además mide la primera compilación del grafo y la segunda (caché por proceso).
+
+Con --max-import-ms o con una dependencia prohibida cargada, sale con código 1:
+sirve para detectar regresiones en CI.
+
+Uso (desde la raíz del proyecto):
+  python -m benchmarks.bench_startup
+  python -m benchmarks.bench_startup --modules main,services.job_queue --repeat 10 \\
+      --max-import-ms 600 --top 15 --json arranque.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = "main,services.batch_evaluator,services.job_queue,services.batch_api,services.interview_sessions"
+# Dependencias que no deben cargarse solo por importar el módulo (se importan al primer uso)
+HEAVY_MODULES = ("langchain_openai", "openai", "httpx", "langgraph", "langchain_core")
+# Los módulos cuyo trabajo es precisamente usar una de ellas quedan exentos
+EXPECTED_HEAVY = {
+    "services.interview_sessions": {"langgraph", "langchain_core"},
+}
+
+_GRAPH_SCRIPT = """
+import time
+t0 = time.perf_counter()
+from services.conversation_agent import get_conversation_graph
+t1 = time.perf_counter()
+get_conversation_graph()
+t2 = time.perf_counter()
+get_conversation_graph()
+t3 = time.perf_counter()
+print(f"{(t1 - t0) * 1000:.1f} {(t2 - t1) * 1000:.1f} {(t3 - t2) * 1000:.3f}")
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env.setdefault("LLM_PROVIDER", "fake")
+    env.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="ia_eval_startup_"))
+    env["PYTHONPATH"] = str(ROOT) + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def _run(args, env) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+
+def parse_importtime(stderr: str) -> dict:
+    """
+    Salida de -X importtime -> {módulo: (self_us, cumulative_us)} (la primera vez que aparece).
+    """
+    result = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        result.setdefault(parts[2].strip(), (int(parts[0]), int(parts[1])))
+    return result
+
+
+def measure_module(module: str, repeat: int, env: dict) -> dict:
+    import_ms, cold_ms = [], []
+    timings = {}
+    for _ in range(repeat):
+        proc = _run(["-X", "importtime", "-c", f"import {module}"], env)
+        timings = parse_importtime(proc.stderr)
+        import_ms.append(timings.get(module, (0, 0))[1] / 1000)
+
+        t0 = time.perf_counter()
+        _run(["-c", f"import {module}"], env)
+        cold_ms.append((time.perf_counter() - t0) * 1000)
+
+    probe = ";".join([
+        "import sys",
+        f"import {module}",
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))",
+    ])
+    loaded = [m for m in _run(["-c", probe], env).stdout.strip().split(",") if m]
+    top = sorted(timings.items(), key=lambda kv: kv[1][0], reverse=True)
+    return {
+        "module": module,
+        "import_ms": round(statistics.median(import_ms), 1),
+        "cold_start_ms": round(statistics.median(cold_ms), 1),
+        "heavy_loaded": loaded,
+        "unexpected_heavy": [m for m in loaded if m not in EXPECTED_HEAVY.get(module, set())],
+        "top_self_ms": [(name, round(self_us / 1000, 1)) for name, (self_us, _) in top],
+    }
+
+
+def measure_graph(repeat: int, env: dict) -> dict:
+    rows = [[float(x) for x in _run(["-c", _GRAPH_SCRIPT], env).stdout.split()] for _ in range(repeat)]
+    return {
+        "import_ms": round(statistics.median(r[0] for r in rows), 1),
+        "first_compile_ms": round(statistics.median(r[1] for r in rows), 1),
+        "cached_ms": round(statistics.median(r[2] for r in rows), 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de arranque (tiempos de importación y grafo).")
+    parser.add_argument("--modules", default=DEFAULT_MODULES, help="Módulos a importar (lista separada por comas).")
+    parser.add_argument("--repeat", type=int, default=5, help="Procesos por medida (se toma la mediana).")
+    parser.add_argument("--top", type=int, default=0, help="Muestra los N módulos con más tiempo propio de importación.")
+    parser.add_argument("--max-import-ms", type=float, help="Falla si algún módulo tarda más en importarse.")
+    parser.add_argument("--json", help="Guarda los resultados en este fichero JSON.")
+    args = parser.parse_args()
+
+    env = _env()
+    # Un proceso previo compila los .pyc: se mide con la caché de bytecode caliente,
+    # como en un despliegue normal, y todas las medidas parten del mismo estado
+    _run(["-c", "import main"], env)
+
+    results = []
+    header = f"{'módulo':<32} {'import_ms':>10} {'cold_ms':>9}  dependencias pesadas cargadas"
+    print(header)
+    print("-" * len(header))
+    for module in [m.strip() for m in args.modules.split(",") if m.strip()]:
+        res = measure_module(module, args.repeat, env)
+        results.append(res)
+        print(f"{module:<32} {res['import_ms']:>10} {res['cold_start_ms']:>9}  {', '.join(res['heavy_loaded']) or '-'}")
+        if args.top:
+            for name, ms in res["top_self_ms"][:args.top]:
+                print(f"    {ms:>8} ms  {name}")
+
+    graph = measure_graph(args.repeat, env)
+    print()
+    print(
+        f"Grafo de la entrevista: import {graph['import_ms']} ms, primera compilación "
+        f"{graph['first_compile_ms']} ms, siguientes {graph['cached_ms']} ms (caché por proceso)"
+    )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"modules": results, "graph": graph}, f, indent=2)
+
+    failures = [
+        f"{r['module']}: carga {', '.join(r['unexpected_heavy'])} al importarse"
+        for r in results if r["unexpected_heavy"]
+    ]
+    if args.max_import_ms is not None:
+        failures += [
+            f"{r['module']}: {r['import_ms']} ms > {args.max_import_ms} ms"
+            for r in results if r["import_ms"] > args.max_import_ms
+        ]
+    if failures:
+        print()
+        print("REGRESIÓN DE ARRANQUE:")
+        for failure in failures:
+            print(f"  - {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,3 +7,164 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
 DEFAULT_LLM_MODEL = os.getenv("DEFAULT_LLM_MODEL", "gpt-4o-mini")
+
+# Proveedor de LLM: "openai" o "fake" (modelo local determinista, sin red)
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+# Parámetros del proveedor "fake": latencia (s), jitter (s), tasa de errores y
+# fracción de esos errores que son 429
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.0"))
+FAKE_LLM_JITTER = float(os.getenv("FAKE_LLM_JITTER", "0.0"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0.0"))
+FAKE_LLM_RATE_LIMIT_SHARE = float(os.getenv("FAKE_LLM_RATE_LIMIT_SHARE", "0.0"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+
+# Cassette de llamadas al LLM: "" (desactivado), "record", "replay" o "auto"
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "").lower()
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "cassettes/llm_cassette.jsonl")
+
+# Cascada de modelos: primero un modelo barato que devuelve su confianza y
+# solo lo dudoso (o lo que decide un descarte) se repite con un modelo más fuerte.
+# Por etapa: modelo barato, modelo fuerte, confianza mínima y qué hacer con los
+# requisitos obligatorios ("negative": repetir los no cumplidos, "all" o "none").
+CASCADE_ENABLED = os.getenv("CASCADE_ENABLED", "false").lower() in ("1", "true", "yes")
+CASCADE_STAGES = {
+    "check_requirements": {
+        "cheap_model": os.getenv("CASCADE_CHECK_CHEAP_MODEL", "gpt-4.1-nano"),
+        "strong_model": os.getenv("CASCADE_CHECK_STRONG_MODEL", DEFAULT_LLM_MODEL),
+        "min_confidence": float(os.getenv("CASCADE_CHECK_MIN_CONFIDENCE", "0.8")),
+        "escalate_mandatory": os.getenv("CASCADE_CHECK_ESCALATE_MANDATORY", "negative"),
+    },
+    "interpret_answer": {
+        "cheap_model": os.getenv("CASCADE_INTERPRET_CHEAP_MODEL", "gpt-4.1-nano"),
+        "strong_model": os.getenv("CASCADE_INTERPRET_STRONG_MODEL", DEFAULT_LLM_MODEL),
+        "min_confidence": float(os.getenv("CASCADE_INTERPRET_MIN_CONFIDENCE", "0.7")),
+        "escalate_mandatory": os.getenv("CASCADE_INTERPRET_ESCALATE_MANDATORY", "negative"),
+    },
+}
+
+# Número máximo de CVs evaluados en paralelo en el modo batch
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+
+# Detección de CVs duplicados en el modo batch (services/cv_ingest.py): los
+# duplicados exactos y casi duplicados reutilizan la evaluación del primero
+CV_DEDUP_ENABLED = os.getenv("CV_DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# Similitud de Jaccard (estimada con MinHash) a partir de la que dos CVs son casi duplicados (> 1 = solo exactos)
+CV_NEAR_DUP_THRESHOLD = float(os.getenv("CV_NEAR_DUP_THRESHOLD", "0.9"))
+CV_SHINGLE_SIZE = int(os.getenv("CV_SHINGLE_SIZE", "3"))
+# Permutaciones de MinHash, repartidas en bandas del índice LSH (deben ser divisibles)
+CV_MINHASH_PERMUTATIONS = int(os.getenv("CV_MINHASH_PERMUTATIONS", "128"))
+CV_MINHASH_BANDS = int(os.getenv("CV_MINHASH_BANDS", "16"))
+# CVs distintos recordados por el índice y evaluaciones guardadas para reutilizar
+# (memoria acotada sea cual sea el tamaño del lote; se olvidan primero los más antiguos)
+CV_DEDUP_MAX_ENTRIES = int(os.getenv("CV_DEDUP_MAX_ENTRIES", "50000"))
+CV_DEDUP_MAX_RESULTS = int(os.getenv("CV_DEDUP_MAX_RESULTS", "5000"))
+
+# Directorio de cachés persistentes (requisitos parseados, evaluaciones, ...)
+CACHE_DIR = os.getenv("CACHE_DIR", ".cache")
+# Número máximo de ofertas parseadas en caché (desalojo LRU)
+REQUIREMENTS_CACHE_MAX_ENTRIES = int(os.getenv("REQUIREMENTS_CACHE_MAX_ENTRIES", "512"))
+# Número máximo de veredictos (CV, requisito) en caché (desalojo LRU)
+EVAL_CACHE_MAX_ENTRIES = int(os.getenv("EVAL_CACHE_MAX_ENTRIES", "100000"))
+# Un acierto solo actualiza el último acceso (para el LRU) si tiene más de estos segundos,
+# y esas actualizaciones se escriben por lotes: leer de la caché no es una escritura
+CACHE_TOUCH_INTERVAL = float(os.getenv("CACHE_TOUCH_INTERVAL", "300"))
+CACHE_TOUCH_BATCH = int(os.getenv("CACHE_TOUCH_BATCH", "256"))
+# Margen sobre max_entries antes de desalojar (fracción): se desaloja por lotes, no en cada escritura
+CACHE_EVICT_SLACK = float(os.getenv("CACHE_EVICT_SLACK", "0.1"))
+
+# Canonicalización de requisitos (services/requirement_canon.py): textos equivalentes
+# ("Experiencia en Python", "Python (experiencia)") comparten identificador, caché y veredicto
+REQUIREMENT_CANON_ENABLED = os.getenv("REQUIREMENT_CANON_ENABLED", "true").lower() in ("1", "true", "yes")
+# Tabla de alias aprendidos (texto -> requisito canónico)
+REQUIREMENT_ALIASES_PATH = os.getenv("REQUIREMENT_ALIASES_PATH", os.path.join(CACHE_DIR, "requirement_aliases.sqlite3"))
+
+# Almacén persistente de resultados (SQLite en modo WAL)
+RESULTS_DB_PATH = os.getenv("RESULTS_DB_PATH", os.path.join(CACHE_DIR, "results.sqlite3"))
+# Resultados acumulados antes de cada escritura en bloque del modo batch
+RESULTS_FLUSH_EVERY = int(os.getenv("RESULTS_FLUSH_EVERY", "100"))
+
+# Cola de trabajos de las campañas multiproceso (services/job_queue.py)
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(CACHE_DIR, "jobs.sqlite3"))
+# Segundos que un worker retiene un trabajo antes de que otro pueda reclamarlo
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Trabajos reclamados de una vez y evaluaciones en vuelo por proceso
+JOB_CLAIM_SIZE = int(os.getenv("JOB_CLAIM_SIZE", "32"))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "8"))
+
+# Limitador de llamadas al LLM por proceso (models/rate_limiter.py); desactivado por defecto
+LLM_RATE_LIMIT_ENABLED = os.getenv("LLM_RATE_LIMIT_ENABLED", "false").lower() in ("1", "true", "yes")
+# Cuota del proveedor (la de la cuenta / tier): peticiones y tokens por minuto (0 = sin límite).
+# No hay valores por defecto: si no se indican, el limitador solo reintenta y corta el circuito
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+# Fracción de la cuota que se usa (margen para no rozar el límite)
+LLM_RATE_HEADROOM = float(os.getenv("LLM_RATE_HEADROOM", "0.9"))
+# Ráfaga máxima admitida, en segundos de cuota
+LLM_RATE_BURST_SECONDS = float(os.getenv("LLM_RATE_BURST_SECONDS", "2"))
+# Tokens de respuesta que se suman a la estimación del prompt
+LLM_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "256"))
+# Concurrencia adaptativa: máximo y mínimo de llamadas en vuelo
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+# Reintentos con backoff exponencial (con jitter) ante 429, 5xx y timeouts
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+# Circuit breaker: fallos seguidos para abrirlo y segundos que permanece abierto
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "20"))
+LLM_CIRCUIT_COOLDOWN = float(os.getenv("LLM_CIRCUIT_COOLDOWN", "30"))
+
+# Pool de conexiones HTTP compartido por todos los clientes LLM del proceso
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+
+# Pre-matcher local: resuelve requisitos evidentes sin llamar al LLM (opt-in)
+PREMATCH_ENABLED = os.getenv("PREMATCH_ENABLED", "false").lower() in ("1", "true", "yes")
+# JSON opcional con skills / alias / implicaciones adicionales
+PREMATCH_SKILLS_PATH = os.getenv("PREMATCH_SKILLS_PATH", "")
+
+# Recuperación de secciones del CV: solo se envía al LLM lo relevante para los requisitos
+RETRIEVAL_ENABLED = os.getenv("RETRIEVAL_ENABLED", "false").lower() in ("1", "true", "yes")
+RETRIEVAL_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "1500"))
+# Por debajo de esta cobertura de términos de los requisitos se envía el CV completo
+RETRIEVAL_MIN_COVERAGE = float(os.getenv("RETRIEVAL_MIN_COVERAGE", "0.8"))
+RETRIEVAL_MAX_SECTION_LINES = int(os.getenv("RETRIEVAL_MAX_SECTION_LINES", "12"))
+
+# Conciliación de los items del LLM con los requisitos pedidos: similitud mínima
+# para aceptar un texto reformulado y re-preguntas (solo de los que falten)
+RECONCILE_MIN_SIMILARITY = float(os.getenv("RECONCILE_MIN_SIMILARITY", "0.85"))
+RECONCILE_MAX_REASKS = int(os.getenv("RECONCILE_MAX_REASKS", "1"))
+
+# Contexto del CV para evaluar requisitos: "raw" (CV completo), "profile" (perfil
+# estructurado extraído una vez por CV) o "profile+snippets" (perfil + secciones relevantes)
+CV_CONTEXT_MODE = os.getenv("CV_CONTEXT_MODE", "raw").lower()
+CV_PROFILE_CACHE_MAX_ENTRIES = int(os.getenv("CV_PROFILE_CACHE_MAX_ENTRIES", "100000"))
+# Presupuesto de tokens de los fragmentos del CV en el modo "profile+snippets"
+CV_PROFILE_SNIPPET_TOKENS = int(os.getenv("CV_PROFILE_SNIPPET_TOKENS", "500"))
+
+# Instrumentación de llamadas al LLM (tiempos, tokens, coste)
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "true").lower() in ("1", "true", "yes")
+INSTRUMENTATION_MAX_RECORDS = int(os.getenv("INSTRUMENTATION_MAX_RECORDS", "100000"))
+# Si se indican, los registros se exportan al terminar el proceso
+INSTRUMENTATION_JSONL_PATH = os.getenv("INSTRUMENTATION_JSONL_PATH", "")
+INSTRUMENTATION_TRACE_PATH = os.getenv("INSTRUMENTATION_TRACE_PATH", "")
+
+# Resumen de la conversación (memoria a largo plazo) en segundo plano
+SUMMARY_EVERY_N_TURNS = int(os.getenv("SUMMARY_EVERY_N_TURNS", "3"))
+SUMMARY_TOKEN_THRESHOLD = int(os.getenv("SUMMARY_TOKEN_THRESHOLD", "800"))
+SUMMARY_MAX_WORKERS = int(os.getenv("SUMMARY_MAX_WORKERS", "4"))
+# Memoria de corto plazo acotada: como mucho HISTORY_MAX_ENTRIES mensajes (buffer circular)
+# y HISTORY_MAX_TOKENS tokens; al llegar al límite se resume y se descarta lo ya resumido
+HISTORY_MAX_ENTRIES = int(os.getenv("HISTORY_MAX_ENTRIES", "48"))
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "2000"))
+
+# Entrevista por lotes: requisitos relacionados que se preguntan en un mismo turno (1 = uno a uno)
+INTERVIEW_BATCH_SIZE = int(os.getenv("INTERVIEW_BATCH_SIZE", "3"))
+
+# Sesiones de entrevista concurrentes: checkpoints del grafo en SQLite (una sesión
+# en espera de respuesta solo ocupa filas en el fichero) y sesiones que avanzan a la vez
+INTERVIEW_CHECKPOINT_PATH = os.getenv("INTERVIEW_CHECKPOINT_PATH", os.path.join(CACHE_DIR, "interviews.sqlite3"))
+INTERVIEW_MAX_CONCURRENCY = int(os.getenv("INTERVIEW_MAX_CONCURRENCY", "64"))
+# Conservar los checkpoints de las entrevistas terminadas (por defecto se borran)
+INTERVIEW_KEEP_FINISHED = os.getenv("INTERVIEW_KEEP_FINISHED", "false").lower() in ("1", "true", "yes")
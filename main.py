@@ -1,3 +1,4 @@
+from config import INTERVIEW_BATCH_SIZE
 from services.requirement_parser import parse_requirements
 from services.cv_evaluator import (
     evaluate_cv_against_requirements,
@@ -5,6 +6,9 @@ from services.cv_evaluator import (
 )
 
 from services.conversation_agent import ask_candidate_about_requirements_with_graph
+from services.cache import text_hash
+from services.requirement_canon import unique_requirements
+from services.results_store import get_results_store
 
 
 
@@ -40,6 +44,11 @@ def main():
         print("No se han podido extraer requisitos de la oferta. Revisa el texto de entrada.")
         return
 
+    # Oferta, evaluación y entrevista quedan en el almacén de resultados (RESULTS_DB_PATH)
+    store = get_results_store()
+    offer_id = store.save_offer(oferta_texto, requisitos)
+    candidate_id = text_hash(cv_text)[:12]
+
     print("Requisitos interpretados:")
     for r in requisitos:
         print(f"- [{r['tipo']}] {r['texto']}")
@@ -47,7 +56,10 @@ def main():
 
     # 4) Evaluar CV contra los requisitos (Fase 1)
     print("Evaluando CV contra la oferta...\n")
-    eval_result = evaluate_cv_against_requirements(requisitos, cv_text)
+    # Primero los obligatorios; los opcionales solo si el candidato sigue en el proceso
+    eval_result = evaluate_cv_against_requirements(requisitos, cv_text, short_circuit=True)
+
+    store.save_evaluations(offer_id, [(candidate_id, eval_result)])
 
     print("Resultado de la primera fase:")
     print(eval_result)
@@ -62,17 +74,16 @@ def main():
 
     print(not_found)
     
-    seen = set()
-    not_found_unique = []
-    for r in not_found:
-        if r not in seen:
-            seen.add(r)
-            not_found_unique.append(r)
+    # Una sola pregunta por requisito, aunque la oferta lo redacte de varias formas
+    not_found_unique = unique_requirements(not_found)
 
     
+    # Se pregunta por bloques de requisitos relacionados (INTERVIEW_BATCH_SIZE por turno)
     additional_fulfilled = ask_candidate_about_requirements_with_graph(
     not_found_requirements=not_found_unique,
     initial_long_term_summary="",
+    requirement_dicts=requisitos,
+    batch_size=INTERVIEW_BATCH_SIZE,
 )
 
 
@@ -84,6 +95,8 @@ def main():
         additional_fulfilled=additional_fulfilled,
     )
 
+    store.save_interview(offer_id, candidate_id, additional_fulfilled, reeval)
+
     print("Resultado final tras la conversación:")
     print(reeval)
     print(f"\nPuntuación final: {reeval['score']}%")
@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, convert_to_messages
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import RunnableLambda
+
+from config import LLM_CASSETTE_MODE, LLM_CASSETTE_PATH
+
+
+# ==========================
+# CASSETTE DE LLAMADAS AL LLM (GRABAR / REPRODUCIR)
+# ==========================
+# Graba pares prompt -> respuesta de las cadenas de schemas.py en un fichero
+# JSONL y los reproduce después sin red, sin coste y con resultados idénticos.
+#
+# Modos (LLM_CASSETTE_MODE):
+#   ""       desactivado (por defecto)
+#   "record" llama siempre al LLM y graba la respuesta
+#   "replay" solo reproduce; una llamada sin grabar lanza CassetteMissError
+#   "auto"   reproduce si está grabada y, si no, llama al LLM y la graba
+
+MODES = ("", "record", "replay", "auto")
+
+
+class CassetteMissError(LookupError):
+    """La llamada no está en el cassette (modo "replay")."""
+
+
+def to_messages(value: Any) -> List[BaseMessage]:
+    """
+    Mensajes renderizados a partir de la entrada de un modelo de chat
+    (PromptValue, texto o lista de mensajes / dicts).
+    """
+    if isinstance(value, PromptValue):
+        return value.to_messages()
+    if isinstance(value, str):
+        return convert_to_messages([("human", value)])
+    return convert_to_messages(value)
+
+
+def cassette_key(messages: List[BaseMessage], model: str, schema_name: str = "") -> str:
+    """
+    Hash de los mensajes ya renderizados (rol + contenido), el modelo y el
+    esquema de salida (dos esquemas distintos con el mismo prompt no deben
+    compartir respuesta).
+    """
+    h = hashlib.sha256()
+    for part in (model, schema_name):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    for m in messages:
+        h.update(m.type.encode("utf-8"))
+        h.update(b"\x00")
+        content = m.content if isinstance(m.content, str) else json.dumps(m.content, sort_keys=True)
+        h.update(content.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class Cassette:
+    """
+    Fichero JSONL con una línea por llamada: {"key", "model", "schema", "output"}.
+
+    Se carga entero en memoria al abrirlo; las grabaciones nuevas se añaden
+    al final del fichero (si una clave aparece varias veces, gana la última).
+    """
+
+    def __init__(self, path: str, mode: str = "auto"):
+        if mode not in MODES:
+            raise ValueError(f"Modo de cassette no válido: {mode!r} (usa uno de {MODES})")
+        self.path = path
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]] = entry
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return entry
+
+    def put(self, key: str, model: str, schema_name: str, output: Any) -> None:
+        entry = {"key": key, "model": model, "schema": schema_name, "output": output}
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous["output"] == output:
+                return
+            self._entries[key] = entry
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.recorded += 1
+
+    def compact(self) -> None:
+        """
+        Reescribe el fichero sin las grabaciones repetidas.
+        """
+        with self._lock:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            os.replace(tmp, self.path)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "recorded": self.recorded,
+            }
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """
+    Cassette del proceso según LLM_CASSETTE_MODE / LLM_CASSETTE_PATH (None si está desactivado).
+    """
+    global _cassette
+    if not LLM_CASSETTE_MODE:
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(LLM_CASSETTE_PATH, LLM_CASSETTE_MODE)
+        return _cassette
+
+
+def _dump(result: Any, schema: Optional[type]) -> Any:
+    if schema is None:
+        return result.content
+    if hasattr(result, "model_dump"):
+        return result.model_dump()
+    return result.dict()
+
+
+def _restore(output: Any, schema: Optional[type]) -> Any:
+    if schema is None:
+        return AIMessage(content=output)
+    if hasattr(schema, "model_validate"):
+        return schema.model_validate(output)
+    return schema.parse_obj(output)
+
+
+def with_cassette(runnable: Any, cassette: Cassette, model: str, schema: Optional[type] = None):
+    """
+    Envuelve un modelo de chat (o un modelo con structured output) para que
+    sus llamadas pasen por el cassette. Con `schema` se graba el objeto
+    Pydantic validado; sin él, el contenido del AIMessage.
+    """
+    schema_name = schema.__name__ if schema is not None else ""
+
+    def lookup(value: Any):
+        key = cassette_key(to_messages(value), model, schema_name)
+        if cassette.mode in ("replay", "auto"):
+            entry = cassette.get(key)
+            if entry is not None:
+                return key, _restore(entry["output"], schema)
+            if cassette.mode == "replay":
+                raise CassetteMissError(f"Llamada no grabada en {cassette.path} (modelo {model}, esquema {schema_name or '-'})")
+        return key, None
+
+    def invoke(value: Any, config=None):
+        key, result = lookup(value)
+        if result is not None:
+            return result
+        result = runnable.invoke(value, config)
+        cassette.put(key, model, schema_name, _dump(result, schema))
+        return result
+
+    async def ainvoke(value: Any, config=None):
+        key, result = lookup(value)
+        if result is not None:
+            return result
+        result = await runnable.ainvoke(value, config)
+        cassette.put(key, model, schema_name, _dump(result, schema))
+        return result
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"cassette[{schema_name or model}]")
+
+
+if __name__ == "__main__":
+    # Uso: python -m models.cassette compact [ruta]   (elimina grabaciones repetidas)
+    if len(sys.argv) not in (2, 3) or sys.argv[1] != "compact":
+        print("Uso: python -m models.cassette compact [ruta]")
+        sys.exit(1)
+
+    cassette = Cassette(sys.argv[2] if len(sys.argv) == 3 else LLM_CASSETTE_PATH, mode="auto")
+    if os.path.exists(cassette.path):
+        cassette.compact()
+    print(f"Cassette '{cassette.path}': {len(cassette)} llamadas.")
@@ -0,0 +1,387 @@
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from models.token_counter import count_tokens
+
+
+class FakeLLMError(RuntimeError):
+    """Error simulado del proveedor."""
+    status_code = 500
+
+
+class FakeRateLimitError(FakeLLMError):
+    """429 simulado (para probar el limitador y los reintentos)."""
+    status_code = 429
+
+
+# ==========================
+# 1. CONSTRUCTORES DE SALIDAS ESTRUCTURADAS
+# ==========================
+# Nombre del esquema -> función (system, user) -> dict con los campos del esquema.
+# Las respuestas son deterministas: dependen solo del texto de entrada.
+
+AFFIRMATIVE = ("si", "yes", "claro", "por supuesto", "tengo", "cumplo", "poseo")
+STOPWORDS = {
+    "experiencia", "en", "con", "de", "del", "el", "la", "los", "las", "y", "o", "a", "un", "una",
+    "conocimiento", "conocimientos", "manejo", "dominio", "minimo", "minima", "anos", "nivel",
+    "valorable", "deseable", "se", "valora", "requerido", "obligatorio", "opcional", "para", "por",
+}
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9#+.]*[a-z0-9#+]", _fold(text))
+
+
+def _content_words(text: str) -> List[str]:
+    return [w for w in _words(text) if w not in STOPWORDS]
+
+
+def _section(user: str, start: str, end: Optional[str] = None) -> str:
+    idx = user.find(start)
+    if idx < 0:
+        return ""
+    body = user[idx + len(start):]
+    if end is not None:
+        stop = body.find(end)
+        if stop >= 0:
+            body = body[:stop]
+    return body
+
+
+def _listed_items(block: str) -> List[str]:
+    """
+    Líneas de una lista "- texto" o "1. texto".
+    """
+    items = []
+    for line in block.splitlines():
+        m = re.match(r"\s*(?:-|\d+[.)])\s+(.*\S)", line)
+        if m:
+            items.append(m.group(1))
+    return items
+
+
+def _coverage(requisito: str, available: set) -> float:
+    """
+    Fracción de las palabras clave del requisito que están en `available`.
+    """
+    words = _content_words(requisito)
+    if not words:
+        return 0.0
+    return sum(1 for w in words if w in available) / len(words)
+
+
+def _covered(requisito: str, available: set) -> bool:
+    """
+    True si al menos la mitad de las palabras clave del requisito están en `available`.
+    """
+    return _coverage(requisito, available) >= 0.5
+
+
+def _confidence(coverage: float) -> float:
+    # Seguro cuando casi todas (o casi ninguna) de las palabras aparecen; dudoso en torno a la mitad
+    return round(0.5 + abs(coverage - 0.5), 2)
+
+
+def _affirmative(answer: str) -> bool:
+    folded = _fold(answer).strip()
+    if folded.startswith("no"):
+        return False
+    return folded.startswith(AFFIRMATIVE) or any(f" {w} " in f" {folded} " for w in AFFIRMATIVE[3:])
+
+
+def _build_requirement_items(system: str, user: str) -> Dict[str, Any]:
+    oferta = _section(user, "Requisitos de la oferta:") or user
+    requirements = []
+    for i, line in enumerate(l.strip(" -*\t") for l in oferta.splitlines()):
+        if not line:
+            continue
+        folded = _fold(line)
+        tipo = "opcional" if any(w in folded for w in ("valorable", "deseable", "opcional", "se valora")) else "obligatorio"
+        options = [o.strip() for o in re.split(r"\s+o\s+", line) if o.strip()]
+        if len(options) > 1:
+            for option in options:
+                requirements.append({"texto": option, "tipo": tipo, "group": f"grupo_{i}", "operator": "OR"})
+        else:
+            requirements.append({"texto": line, "tipo": tipo, "group": None, "operator": None})
+    return {"requirements": requirements}
+
+
+def _build_eval_list(system: str, user: str) -> Dict[str, Any]:
+    reqs = _listed_items(_section(user, "Requisitos:", "CV:"))
+    cv_words = set(_words(_section(user, "CV:")))
+    items = []
+    for req in reqs:
+        coverage = _coverage(req, cv_words)
+        cumple = coverage >= 0.5
+        items.append({
+            "requisito": req,
+            "cumple": cumple,
+            "justificacion": "El CV menciona los términos clave del requisito." if cumple
+            else "El CV no deja claro que se cumpla el requisito.",
+            "confianza": _confidence(coverage),
+        })
+    return {"items": items}
+
+
+def _build_match_result(system: str, user: str) -> Dict[str, Any]:
+    answer = _section(user, "Respuesta del candidato:")
+    cumple = _affirmative(answer)
+    return {
+        "cumple": cumple,
+        "justificacion": "El candidato afirma cumplirlo." if cumple else "La respuesta no lo confirma.",
+        # Un "sí" / "no" explícito es claro; el resto de respuestas, dudosas
+        "confianza": 0.95 if cumple or _fold(answer).strip().startswith("no") else 0.6,
+    }
+
+
+def _build_match_list(system: str, user: str) -> Dict[str, Any]:
+    reqs = _listed_items(_section(user, "Requisitos preguntados:", "Respuesta del candidato:"))
+    answer = _section(user, "Respuesta del candidato:").split("\n\n")[0]
+    positive = _affirmative(answer)
+    answer_words = set(_words(answer))
+    # Si la respuesta nombra requisitos concretos, solo esos se dan por cumplidos
+    named = any(_covered(r, answer_words) for r in reqs)
+    items = []
+    for req in reqs:
+        coverage = _coverage(req, answer_words)
+        cumple = positive and (coverage >= 0.5 or not named)
+        items.append({
+            "requisito": req,
+            "cumple": cumple,
+            "justificacion": "El candidato afirma cumplirlo." if cumple else "La respuesta no lo confirma.",
+            "confianza": _confidence(coverage) if named else (0.9 if positive else 0.6),
+        })
+    return {"items": items}
+
+
+def _build_cv_profile(system: str, user: str) -> Dict[str, Any]:
+    # Perfil mínimo: todas las palabras clave del CV como tecnologías (sin repetir)
+    words = list(dict.fromkeys(_content_words(_section(user, "CV:") or user)))
+    return {
+        "skills": [], "tecnologias": words, "experiencia": [],
+        "educacion": [], "idiomas": [], "certificaciones": [],
+    }
+
+
+def _build_promptlouder(system: str, user: str) -> Dict[str, Any]:
+    return {"message": user[:80], "score": 50.0, "tags": sorted(set(_content_words(user)))[:5]}
+
+
+STRUCTURED_BUILDERS: Dict[str, Callable[[str, str], Dict[str, Any]]] = {
+    "RequirementItemsResponse": _build_requirement_items,
+    "RequirementEvalList": _build_eval_list,
+    "RequirementMatchResult": _build_match_result,
+    "RequirementMatchList": _build_match_list,
+    "PromptLouderResult": _build_promptlouder,
+    "CVProfile": _build_cv_profile,
+    # Variantes con confianza (primer paso de la cascada de modelos); los
+    # esquemas sin el campo ignoran "confianza"
+    "RequirementEvalListScored": _build_eval_list,
+    "RequirementMatchResultScored": _build_match_result,
+    "RequirementMatchListScored": _build_match_list,
+}
+
+
+def register_structured_builder(schema_name: str, builder: Callable[[str, str], Dict[str, Any]]) -> None:
+    """
+    Permite a otros módulos añadir respuestas simuladas para sus esquemas.
+    """
+    STRUCTURED_BUILDERS[schema_name] = builder
+
+
+def _schema_fields(schema: type) -> Dict[str, Any]:
+    # Pydantic v2 (model_fields) o v1 (__fields__)
+    return getattr(schema, "model_fields", None) or getattr(schema, "__fields__", {})
+
+
+def _generic_payload(schema: type) -> Dict[str, Any]:
+    """
+    Respuesta mínima válida para un esquema sin constructor registrado.
+    """
+    payload = {}
+    for name, f in _schema_fields(schema).items():
+        annotation = getattr(f, "annotation", None) or getattr(f, "outer_type_", str)
+        text = str(annotation)
+        if "bool" in text:
+            payload[name] = False
+        elif "float" in text or "int" in text:
+            payload[name] = 0
+        elif "List" in text or "list" in text:
+            payload[name] = []
+        else:
+            payload[name] = ""
+    return payload
+
+
+def _validate(schema: type, raw: str):
+    if hasattr(schema, "model_validate_json"):
+        return schema.model_validate_json(raw)
+    return schema.parse_raw(raw)
+
+
+# ==========================
+# 2. MODELO DE CHAT SIMULADO
+# ==========================
+
+class FakeChatModel(BaseChatModel):
+    """
+    Sustituto local y determinista de ChatOpenAI (LLM_PROVIDER=fake).
+
+    - Devuelve salidas válidas para los esquemas de schemas.py.
+    - Simula latencia (con jitter) y una tasa de errores configurable.
+    - Informa de tokens estimados, así que la instrumentación funciona igual.
+    """
+
+    model_name: str = "fake"
+    temperature: float = 0.0
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_share: float = 0.0
+    seed: int = 0
+
+    _rng: Any = None
+    _rng_lock: Any = None
+
+    def __init__(self, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._rng = random.Random(self.seed)
+        self._rng_lock = threading.Lock()
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _draw(self) -> tuple:
+        with self._rng_lock:
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+            rate_limited = fail and self._rng.random() < self.rate_limit_share
+        return delay, fail, rate_limited
+
+    @staticmethod
+    def _raise(rate_limited: bool) -> None:
+        if rate_limited:
+            raise FakeRateLimitError("Simulated 429: rate limit exceeded")
+        raise FakeLLMError("Simulated provider error")
+
+    def _respond(self, messages: List[BaseMessage], schema: Optional[type]) -> ChatResult:
+        system = "\n".join(str(m.content) for m in messages if m.type == "system")
+        user = "\n".join(str(m.content) for m in messages if m.type != "system")
+
+        if schema is None:
+            # Texto libre (p. ej. el resumen de la conversación)
+            lines = [l for l in user.splitlines() if l.strip()] or [l for l in system.splitlines() if l.strip()]
+            content = "Resumen: " + " ".join(lines[-3:])[:300]
+        else:
+            builder = STRUCTURED_BUILDERS.get(schema.__name__)
+            payload = builder(system, user) if builder else _generic_payload(schema)
+            content = json.dumps(payload, ensure_ascii=False)
+
+        prompt_tokens = count_tokens(system + user, self.model_name)
+        completion_tokens = count_tokens(content, self.model_name)
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=content))],
+            llm_output={
+                "token_usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens},
+                "model_name": self.model_name,
+            },
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        delay, fail, rate_limited = self._draw()
+        time.sleep(delay)
+        if fail:
+            self._raise(rate_limited)
+        return self._respond(messages, kwargs.get("fake_schema"))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        delay, fail, rate_limited = self._draw()
+        await asyncio.sleep(delay)
+        if fail:
+            self._raise(rate_limited)
+        return self._respond(messages, kwargs.get("fake_schema"))
+
+    def with_structured_output(self, schema, **kwargs: Any):
+        # El esquema viaja como kwarg hasta _generate, que devuelve JSON válido;
+        # después se valida con Pydantic igual que con el proveedor real.
+        return self.bind(fake_schema=schema) | RunnableLambda(lambda msg: _validate(schema, msg.content))
+
+
+# ==========================
+# 3. PROCESADOR BATCH SIMULADO
+# ==========================
+# Sustituto local de la API batch del proveedor: lee un JSONL de peticiones
+# (custom_id, method, url, body) y escribe el JSONL de resultados con el mismo
+# formato que devuelve el proveedor. Como él, no garantiza el orden.
+
+def _batch_response(request: Dict[str, Any], rng: random.Random, error_rate: float) -> Dict[str, Any]:
+    custom_id = request["custom_id"]
+    if rng.random() < error_rate:
+        return {
+            "id": f"batch_req_{custom_id}",
+            "custom_id": custom_id,
+            "response": {"status_code": 500, "body": {"error": {"message": "Simulated provider error"}}},
+            "error": None,
+        }
+
+    body = request["body"]
+    messages = body.get("messages", [])
+    system = "\n".join(str(m["content"]) for m in messages if m["role"] == "system")
+    user = "\n".join(str(m["content"]) for m in messages if m["role"] != "system")
+    schema_name = ((body.get("response_format") or {}).get("json_schema") or {}).get("name", "")
+    builder = STRUCTURED_BUILDERS.get(schema_name)
+    content = json.dumps(builder(system, user), ensure_ascii=False) if builder else "{}"
+
+    model = body.get("model", "fake")
+    prompt_tokens = count_tokens(system + user, model)
+    completion_tokens = count_tokens(content, model)
+    return {
+        "id": f"batch_req_{custom_id}",
+        "custom_id": custom_id,
+        "response": {
+            "status_code": 200,
+            "body": {
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            },
+        },
+        "error": None,
+    }
+
+
+def process_batch_file(input_path: str, output_path: str, error_rate: float = 0.0, seed: int = 0) -> int:
+    """
+    Procesa un fichero de peticiones batch y escribe el de resultados
+    (una línea por petición, en orden aleatorio). Devuelve el nº de peticiones.
+    """
+    rng = random.Random(seed)
+    with open(input_path, "r", encoding="utf-8") as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+    responses = [_batch_response(r, rng, error_rate) for r in requests]
+    rng.shuffle(responses)
+    with open(output_path, "w", encoding="utf-8") as f:
+        for response in responses:
+            f.write(json.dumps(response, ensure_ascii=False) + "\n")
+    return len(responses)
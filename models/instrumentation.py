@@ -0,0 +1,254 @@
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import (
+    DEFAULT_LLM_MODEL,
+    INSTRUMENTATION_ENABLED,
+    INSTRUMENTATION_MAX_RECORDS,
+    INSTRUMENTATION_JSONL_PATH,
+    INSTRUMENTATION_TRACE_PATH,
+)
+
+
+# Precio estimado en USD por millón de tokens (entrada, salida)
+MODEL_PRICES: Dict[str, tuple] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    # Los nombres versionados ("gpt-4o-mini-2024-07-18") usan el precio del prefijo más largo
+    prices = None
+    for name in sorted(MODEL_PRICES, key=len, reverse=True):
+        if model.startswith(name):
+            prices = MODEL_PRICES[name]
+            break
+    if prices is None:
+        return 0.0
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+
+
+@dataclass
+class CallRecord:
+    # Etapa del pipeline ("parse_requirements", "check_requirements", ...)
+    stage: str
+    candidate_id: Optional[str] = None
+    model: str = DEFAULT_LLM_MODEL
+    # Inicio (epoch, segundos) y duración (segundos)
+    start: float = 0.0
+    duration: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    retries: int = 0
+    cache_hit: bool = False
+    error: Optional[str] = None
+    thread_id: int = field(default_factory=threading.get_ident)
+
+
+_candidate_id: contextvars.ContextVar = contextvars.ContextVar("llm_candidate_id", default=None)
+_current_call: contextvars.ContextVar = contextvars.ContextVar("llm_current_call", default=None)
+
+
+class Recorder:
+    """
+    Almacén en memoria (acotado) de los registros de llamadas al LLM.
+    """
+
+    def __init__(self, max_records: int = INSTRUMENTATION_MAX_RECORDS):
+        self._lock = threading.Lock()
+        self._records: deque = deque(maxlen=max_records)
+
+    def add(self, record: CallRecord) -> None:
+        with self._lock:
+            self._records.append(record)
+
+    def records(self) -> List[CallRecord]:
+        with self._lock:
+            return list(self._records)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+
+recorder = Recorder()
+
+
+@contextmanager
+def instrumentation_context(candidate_id: Optional[str]) -> Iterator[None]:
+    """
+    Etiqueta con el candidato las llamadas hechas dentro del bloque.
+    Al ser un contextvar, funciona igual con hilos que con tareas asyncio.
+    """
+    token = _candidate_id.set(candidate_id)
+    try:
+        yield
+    finally:
+        _candidate_id.reset(token)
+
+
+def record_retry(n: int = 1) -> None:
+    record: Optional[CallRecord] = _current_call.get()
+    if record is not None:
+        record.retries += n
+
+
+def record_cache_hit(stage: str, n: int = 1) -> None:
+    """
+    Registra `n` resultados servidos desde caché (sin llamada al LLM).
+    """
+    if not INSTRUMENTATION_ENABLED or n <= 0:
+        return
+    now = time.time()
+    for _ in range(n):
+        recorder.add(CallRecord(
+            stage=stage,
+            candidate_id=_candidate_id.get(),
+            start=now,
+            cache_hit=True,
+        ))
+
+
+@contextmanager
+def track_call(stage: str) -> Iterator[CallRecord]:
+    """
+    Mide una llamada al LLM: tiempo de pared, tokens (vía UsageCallbackHandler),
+    coste estimado, reintentos y error si lo hay.
+    """
+    record = CallRecord(stage=stage, candidate_id=_candidate_id.get(), start=time.time())
+    token = _current_call.set(record)
+    t0 = time.perf_counter()
+    try:
+        yield record
+    except BaseException as exc:
+        record.error = repr(exc)
+        raise
+    finally:
+        record.duration = time.perf_counter() - t0
+        record.cost_usd = estimate_cost(record.model, record.prompt_tokens, record.completion_tokens)
+        _current_call.reset(token)
+        if INSTRUMENTATION_ENABLED:
+            recorder.add(record)
+
+
+def instrumented(stage: str) -> Callable:
+    """
+    Decorador para funciones (síncronas o async) que hacen una llamada al LLM.
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with track_call(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track_call(stage):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+# ==========================
+# AGREGADOS Y EXPORTACIÓN
+# ==========================
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def stage_summary(records: Optional[List[CallRecord]] = None) -> Dict[str, Dict[str, float]]:
+    """
+    Agregados por etapa: llamadas, aciertos de caché, errores, reintentos,
+    latencia p50/p95 (solo llamadas reales), tokens y coste.
+    """
+    records = recorder.records() if records is None else records
+    by_stage: Dict[str, List[CallRecord]] = {}
+    for r in records:
+        by_stage.setdefault(r.stage, []).append(r)
+
+    summary = {}
+    for stage, recs in by_stage.items():
+        calls = [r for r in recs if not r.cache_hit]
+        durations = sorted(r.duration for r in calls)
+        summary[stage] = {
+            "calls": len(calls),
+            "cache_hits": len(recs) - len(calls),
+            "errors": sum(1 for r in calls if r.error),
+            "retries": sum(r.retries for r in calls),
+            "p50_s": round(_percentile(durations, 0.50), 4),
+            "p95_s": round(_percentile(durations, 0.95), 4),
+            "prompt_tokens": sum(r.prompt_tokens for r in calls),
+            "completion_tokens": sum(r.completion_tokens for r in calls),
+            "cost_usd": round(sum(r.cost_usd for r in calls), 6),
+        }
+    return summary
+
+
+def export_jsonl(path: str, records: Optional[List[CallRecord]] = None) -> None:
+    records = recorder.records() if records is None else records
+    with open(path, "w", encoding="utf-8") as f:
+        for r in records:
+            f.write(json.dumps(asdict(r), ensure_ascii=False) + "\n")
+
+
+def export_chrome_trace(path: str, records: Optional[List[CallRecord]] = None) -> None:
+    """
+    Exporta en formato Chrome Trace (chrome://tracing o https://ui.perfetto.dev):
+    una fila por candidato (o por hilo si no hay candidato) con cada llamada como intervalo.
+    """
+    records = recorder.records() if records is None else records
+    events = []
+    for r in records:
+        args = {k: v for k, v in asdict(r).items() if k not in ("stage", "start", "duration", "thread_id")}
+        event = {
+            "name": r.stage,
+            "cat": "cache" if r.cache_hit else "llm",
+            "pid": os.getpid(),
+            "tid": r.candidate_id or str(r.thread_id),
+            "ts": int(r.start * 1_000_000),
+            "args": args,
+        }
+        if r.cache_hit:
+            event.update({"ph": "i", "s": "t"})
+        else:
+            event.update({"ph": "X", "dur": int(r.duration * 1_000_000)})
+        events.append(event)
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+
+
+def _export_at_exit() -> None:
+    if INSTRUMENTATION_JSONL_PATH:
+        export_jsonl(INSTRUMENTATION_JSONL_PATH)
+    if INSTRUMENTATION_TRACE_PATH:
+        export_chrome_trace(INSTRUMENTATION_TRACE_PATH)
+
+
+if INSTRUMENTATION_JSONL_PATH or INSTRUMENTATION_TRACE_PATH:
+    atexit.register(_export_at_exit)
@@ -1,10 +1,189 @@
-from langchain_openai import ChatOpenAI
-from config import OPENAI_API_KEY, DEFAULT_LLM_MODEL
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Hashable, Optional
 
-def get_llm(temperature: float = 0.7):
-    llm = ChatOpenAI(
-        api_key=OPENAI_API_KEY,
-        model=DEFAULT_LLM_MODEL,
+from config import (
+    OPENAI_API_KEY,
+    DEFAULT_LLM_MODEL,
+    LLM_PROVIDER,
+    LLM_RATE_LIMIT_ENABLED,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_MAX_KEEPALIVE,
+    FAKE_LLM_LATENCY,
+    FAKE_LLM_JITTER,
+    FAKE_LLM_ERROR_RATE,
+    FAKE_LLM_RATE_LIMIT_SHARE,
+    FAKE_LLM_SEED,
+)
+
+if TYPE_CHECKING:
+    import httpx
+
+
+# ==========================
+# REGISTRO DE CLIENTES Y CADENAS
+# ==========================
+# Un único registro por proceso: los ChatOpenAI, los wrappers de structured
+# output y las cadenas prompt | llm se construyen una vez y se reutilizan,
+# compartiendo el mismo pool de conexiones HTTP (sin repetir TLS ni la
+# conversión del esquema Pydantic en cada llamada).
+#
+# langchain_openai / httpx (y los wrappers de langchain_core) se importan al
+# construir el primer cliente: importar este módulo no los carga, así que los
+# procesos que no llegan a llamar al LLM (caché, pre-matcher, CLI) arrancan antes.
+
+_lock = threading.RLock()
+_http_client: Optional["httpx.Client"] = None
+_llms: Dict[Hashable, Any] = {}
+_structured_llms: Dict[Hashable, Any] = {}
+_chains: Dict[Hashable, Any] = {}
+_stats: Dict[str, Dict[str, int]] = {
+    "llm": {"hits": 0, "misses": 0},
+    "structured_llm": {"hits": 0, "misses": 0},
+    "chain": {"hits": 0, "misses": 0},
+}
+
+
+def _get_http_client() -> "httpx.Client":
+    global _http_client
+    if _http_client is None:
+        import httpx
+
+        _http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            ),
+        )
+    return _http_client
+
+
+def _get_or_build(kind: str, registry: Dict[Hashable, Any], key: Hashable, build: Callable[[], Any]) -> Any:
+    with _lock:
+        obj = registry.get(key)
+        if obj is not None:
+            _stats[kind]["hits"] += 1
+            return obj
+        _stats[kind]["misses"] += 1
+        obj = build()
+        registry[key] = obj
+        return obj
+
+
+def get_llm(temperature: float = 0.7, model: Optional[str] = None):
+    model = model or DEFAULT_LLM_MODEL
+
+    def build():
+        if LLM_PROVIDER == "fake":
+            return _build_fake_llm(model, temperature)
+        from langchain_openai import ChatOpenAI
+        from models.usage_callback import usage_handler
+
+        return ChatOpenAI(
+            api_key=OPENAI_API_KEY,
+            model=model,
+            temperature=temperature,
+            http_client=_get_http_client(),
+            # Con el limitador activo, los reintentos (con backoff compartido) son suyos
+            **({"max_retries": 0} if LLM_RATE_LIMIT_ENABLED else {}),
+            # Tokens, modelo y reintentos de cada llamada (ver models/instrumentation.py)
+            callbacks=[usage_handler],
+        )
+
+    return _get_or_build("llm", _llms, (model, temperature), build)
+
+
+def _build_fake_llm(model: str, temperature: float):
+    # Proveedor local sin red (benchmarks, pruebas offline); ver models/fake_llm.py
+    from models.fake_llm import FakeChatModel
+    from models.usage_callback import usage_handler
+
+    return FakeChatModel(
+        model_name=model,
         temperature=temperature,
+        latency=FAKE_LLM_LATENCY,
+        jitter=FAKE_LLM_JITTER,
+        error_rate=FAKE_LLM_ERROR_RATE,
+        rate_limit_share=FAKE_LLM_RATE_LIMIT_SHARE,
+        seed=FAKE_LLM_SEED,
+        callbacks=[usage_handler],
     )
-    return llm
+
+
+def _wrap(llm: Any, model: str, schema: Optional[type] = None):
+    # Limitador de cuota (models/rate_limiter.py) y, por fuera, el cassette:
+    # las respuestas reproducidas no consumen cuota
+    from models.cassette import get_cassette, with_cassette
+
+    if LLM_RATE_LIMIT_ENABLED:
+        from models.rate_limiter import with_rate_limit
+
+        llm = with_rate_limit(llm, model)
+    # Con LLM_CASSETTE_MODE activo, las llamadas se graban / reproducen (ver models/cassette.py)
+    cassette = get_cassette()
+    if cassette is None:
+        return llm
+    return with_cassette(llm, cassette, model, schema)
+
+
+def get_structured_llm(schema: type, temperature: float = 0.0, model: Optional[str] = None):
+    """
+    Devuelve (cacheado) llm.with_structured_output(schema).
+    """
+    model = model or DEFAULT_LLM_MODEL
+
+    def build():
+        structured = get_llm(temperature=temperature, model=model).with_structured_output(schema)
+        return _wrap(structured, model, schema)
+
+    return _get_or_build("structured_llm", _structured_llms, (model, temperature, schema), build)
+
+
+def get_chain(
+    name: str,
+    build: Callable[[Any], Any],
+    temperature: float = 0.0,
+    schema: Optional[type] = None,
+    model: Optional[str] = None,
+):
+    """
+    Devuelve (cacheada) la cadena `name` construida con `build(llm)`.
+
+    `llm` es el modelo con structured output si se indica `schema`, o el
+    modelo de chat sin más en caso contrario. La clave del registro es
+    (nombre, modelo, temperatura, esquema).
+    """
+    model = model or DEFAULT_LLM_MODEL
+
+    def build_chain():
+        if schema is not None:
+            llm = get_structured_llm(schema, temperature=temperature, model=model)
+        else:
+            llm = _wrap(get_llm(temperature=temperature, model=model), model)
+        return build(llm)
+
+    return _get_or_build("chain", _chains, (name, model, temperature, schema), build_chain)
+
+
+def registry_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Aciertos / fallos del registro por tipo de objeto.
+    """
+    with _lock:
+        return {kind: dict(counts) for kind, counts in _stats.items()}
+
+
+def reset_registry() -> None:
+    """
+    Vacía el registro (útil al cambiar de configuración en caliente).
+    """
+    global _http_client
+    with _lock:
+        _llms.clear()
+        _structured_llms.clear()
+        _chains.clear()
+        for counts in _stats.values():
+            counts["hits"] = 0
+            counts["misses"] = 0
+        if _http_client is not None:
+            _http_client.close()
+            _http_client = None
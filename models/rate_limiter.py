@@ -0,0 +1,377 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableLambda
+
+from config import (
+    LLM_RPM,
+    LLM_TPM,
+    LLM_RATE_HEADROOM,
+    LLM_RATE_BURST_SECONDS,
+    LLM_COMPLETION_TOKENS_ESTIMATE,
+    LLM_MAX_CONCURRENCY,
+    LLM_MIN_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_CIRCUIT_FAILURE_THRESHOLD,
+    LLM_CIRCUIT_COOLDOWN,
+)
+from models.cassette import to_messages
+from models.instrumentation import record_retry
+from models.token_counter import count_message_tokens
+
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================
+# LIMITADOR DE LLAMADAS AL LLM (por proceso)
+# ==========================
+# Todas las llamadas estructuradas pasan por un único limitador:
+#   1. Circuit breaker: con fallos sostenidos se deja de llamar durante un tiempo.
+#   2. Concurrencia adaptativa (AIMD): el nº de llamadas en vuelo baja a la
+#      mitad ante 429 / timeouts y sube de uno en uno mientras todo va bien.
+#   3. Dos token buckets (peticiones y tokens por minuto), con reservas: cada
+#      llamada reserva su coste y espera exactamente lo necesario, así que el
+#      ritmo se estabiliza justo por debajo de la cuota en vez de oscilar.
+#   4. Reintentos con backoff exponencial y jitter; un 429 pausa a todo el
+#      proceso (no solo a la llamada que lo recibió) para no provocar tormentas.
+
+
+class CircuitOpenError(RuntimeError):
+    """El circuit breaker está abierto: se rechaza la llamada sin enviarla."""
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    code = getattr(exc, "status_code", None)
+    if code is None:
+        code = getattr(getattr(exc, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """
+    Pausa que pide el servidor en un 429: cabeceras retry-after-ms o
+    retry-after (segundos o fecha HTTP) de la respuesta (errores de openai/httpx).
+    """
+    headers = getattr(getattr(exc, "response", None), "headers", None)
+    if headers:
+        try:
+            value = headers.get("retry-after-ms")
+            if value:
+                return max(0.0, float(value) / 1000)
+            value = headers.get("retry-after")
+            if value:
+                try:
+                    return max(0.0, float(value))
+                except ValueError:
+                    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            pass
+    # Errores propios (p. ej. los del proveedor simulado) pueden llevarlo como atributo
+    value = getattr(exc, "retry_after", None)
+    return float(value) if value else None
+
+
+def is_rate_limit(exc: BaseException) -> bool:
+    return status_code(exc) == 429
+
+
+def is_timeout(exc: BaseException) -> bool:
+    return isinstance(exc, (TimeoutError, asyncio.TimeoutError)) or "Timeout" in type(exc).__name__
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = status_code(exc)
+    if code is not None:
+        return code == 429 or code >= 500
+    return is_timeout(exc) or "Connection" in type(exc).__name__
+
+
+class TokenBucket:
+    """
+    Bucket de `per_minute` unidades por minuto, con una ráfaga máxima de
+    `burst_seconds` segundos de cuota (así el ritmo no supera la cuota al
+    arrancar aunque la ventana del proveedor sea de un minuto).
+
+    reserve(n) descuenta n aunque el saldo quede negativo y devuelve los
+    segundos que hay que esperar hasta que esa reserva esté cubierta: las
+    llamadas se reparten en el tiempo en el orden en que llegan.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = LLM_RATE_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = self.rate * burst_seconds
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= amount
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rpm: float = LLM_RPM,
+        tpm: float = LLM_TPM,
+        headroom: float = LLM_RATE_HEADROOM,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        min_concurrency: int = LLM_MIN_CONCURRENCY,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+        failure_threshold: int = LLM_CIRCUIT_FAILURE_THRESHOLD,
+        cooldown: float = LLM_CIRCUIT_COOLDOWN,
+    ):
+        self._lock = threading.Lock()
+        self.requests = TokenBucket(rpm * headroom)
+        self.tokens = TokenBucket(tpm * headroom)
+
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.in_flight = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._pause_until = 0.0
+
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+        self._stats: Dict[str, float] = {
+            "calls": 0, "retries": 0, "rate_limited": 0, "timeouts": 0,
+            "circuit_opens": 0, "rejected": 0, "wait_s": 0.0,
+        }
+
+    # ---------- circuit breaker ----------
+
+    def circuit_state(self) -> str:
+        with self._lock:
+            return self._circuit_state(time.monotonic())
+
+    def _circuit_state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at < self.cooldown:
+            return "open"
+        return "half_open"
+
+    def _check_circuit(self, now: float) -> bool:
+        """
+        True si esta llamada es la sonda de half_open. Lanza CircuitOpenError si está abierto.
+        """
+        state = self._circuit_state(now)
+        if state == "closed":
+            return False
+        if state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        self._stats["rejected"] += 1
+        raise CircuitOpenError(
+            f"Circuit breaker abierto tras {self._failures} fallos seguidos; reintentar en "
+            f"{max(0.0, self.cooldown - (now - self._opened_at)):.0f}s"
+        )
+
+    # ---------- admisión ----------
+
+    def _try_admit(self, cost_tokens: float) -> Optional[float]:
+        """
+        Intenta ocupar un hueco de concurrencia. Si lo consigue, reserva en los
+        buckets y devuelve los segundos a esperar antes de enviar; None si no hay hueco.
+        """
+        with self._lock:
+            now = time.monotonic()
+            probe = self._check_circuit(now)
+            if not probe and self.in_flight >= int(self.limit):
+                return None
+            self.in_flight += 1
+            wait = max(
+                self.requests.reserve(1, now),
+                self.tokens.reserve(cost_tokens, now),
+                self._pause_until - now,
+            )
+            self._stats["calls"] += 1
+            self._stats["wait_s"] += max(0.0, wait)
+            return max(0.0, wait)
+
+    def _release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._probing = False
+
+    def _on_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            # Aumento aditivo: +1 de concurrencia por cada "ventana" completa sin errores
+            self._successes += 1
+            if self._successes >= int(self.limit):
+                self._successes = 0
+                self.limit = min(self.max_concurrency, self.limit + 1)
+
+    def _on_failure(self, exc: BaseException, attempt: int) -> float:
+        """
+        Anota el fallo y devuelve los segundos de backoff antes de reintentar.
+        """
+        if not is_retryable(exc):
+            # Errores de la petición (validación, 400, ...): no dicen nada de la cuota ni del servicio
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._failures += 1
+            self._successes = 0
+            backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+            congestion = is_rate_limit(exc) or is_timeout(exc)
+            if congestion:
+                self._stats["rate_limited" if is_rate_limit(exc) else "timeouts"] += 1
+                # Reducción multiplicativa, como mucho una vez por backoff_base segundos
+                # (una ráfaga de 429 de llamadas ya en vuelo cuenta como una sola señal)
+                if now - self._last_decrease >= self.backoff_base:
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                    self._last_decrease = now
+            if is_rate_limit(exc):
+                # Pausa para todo el proceso: los demás no salen hasta que pase el backoff
+                retry_after = retry_after_seconds(exc)
+                pause = retry_after if retry_after is not None else backoff
+                self._pause_until = max(self._pause_until, now + pause)
+
+            if self._opened_at is not None:
+                # Falló la sonda de half_open: el circuito vuelve a abrirse
+                self._opened_at = now
+            elif self._failures >= self.failure_threshold:
+                self._opened_at = now
+                self._stats["circuit_opens"] += 1
+            return backoff
+
+    # ---------- ejecución ----------
+
+    def call(self, fn: Callable[[], Any], cost_tokens: float) -> Any:
+        attempt = 0
+        while True:
+            wait = self._try_admit(cost_tokens)
+            while wait is None:
+                time.sleep(0.01)
+                wait = self._try_admit(cost_tokens)
+            try:
+                if wait:
+                    time.sleep(wait)
+                result = fn()
+            except Exception as exc:
+                self._release()
+                backoff = self._on_failure(exc, attempt)
+                if not is_retryable(exc) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self._stats["retries"] += 1
+                record_retry()
+                time.sleep(backoff)
+                continue
+            self._release()
+            self._on_success()
+            return result
+
+    async def acall(self, fn: Callable[[], Any], cost_tokens: float) -> Any:
+        attempt = 0
+        while True:
+            wait = self._try_admit(cost_tokens)
+            while wait is None:
+                # El límite se comparte entre hilos y bucles de eventos: espera corta y reintento
+                await asyncio.sleep(0.01)
+                wait = self._try_admit(cost_tokens)
+            try:
+                if wait:
+                    await asyncio.sleep(wait)
+                result = await fn()
+            except Exception as exc:
+                self._release()
+                backoff = self._on_failure(exc, attempt)
+                if not is_retryable(exc) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self._stats["retries"] += 1
+                record_retry()
+                await asyncio.sleep(backoff)
+                continue
+            self._release()
+            self._on_success()
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats.update({
+                "concurrency_limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "circuit": self._circuit_state(time.monotonic()),
+            })
+            stats["wait_s"] = round(stats["wait_s"], 3)
+            return stats
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Limitador compartido por todo el proceso.
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            if not LLM_RPM and not LLM_TPM:
+                logger.warning(
+                    "Limitador activo sin cuota (LLM_RPM / LLM_TPM): solo se aplican reintentos, "
+                    "concurrencia adaptativa y circuit breaker. Indica la cuota de tu cuenta para limitar el ritmo."
+                )
+            _limiter = RateLimiter()
+        return _limiter
+
+
+def rate_limiter_stats() -> Dict[str, Any]:
+    return get_rate_limiter().stats()
+
+
+def _prompt_contents(value: Any) -> List[str]:
+    messages: List[BaseMessage] = to_messages(value)
+    return [m.content if isinstance(m.content, str) else str(m.content) for m in messages]
+
+
+def with_rate_limit(runnable: Any, model: str, limiter: Optional[RateLimiter] = None):
+    """
+    Envuelve un modelo (o modelo con structured output) para que sus llamadas
+    pasen por el limitador. El coste en tokens es la estimación tiktoken del
+    prompt renderizado más LLM_COMPLETION_TOKENS_ESTIMATE de respuesta.
+    """
+    def cost(value: Any) -> float:
+        return count_message_tokens(_prompt_contents(value), model) + LLM_COMPLETION_TOKENS_ESTIMATE
+
+    def invoke(value: Any, config=None):
+        lim = limiter or get_rate_limiter()
+        return lim.call(lambda: runnable.invoke(value, config), cost(value))
+
+    async def ainvoke(value: Any, config=None):
+        lim = limiter or get_rate_limiter()
+        return await lim.acall(lambda: runnable.ainvoke(value, config), cost(value))
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"rate_limited[{model}]")
@@ -0,0 +1,44 @@
+import logging
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import tiktoken
+
+from config import DEFAULT_LLM_MODEL
+
+
+logger = logging.getLogger(__name__)
+
+# Tokens extra por mensaje de chat (rol + separadores), según el formato de OpenAI
+TOKENS_PER_MESSAGE = 4
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    """
+    Codificador tiktoken del modelo, o None si no se puede cargar (por ejemplo,
+    sin red la primera vez que se descargan los ficheros BPE).
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:
+        logger.warning("No se pudo cargar tiktoken para %s (%s); se estiman tokens por longitud.", model, exc)
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    enc = _encoding(model or DEFAULT_LLM_MODEL)
+    if enc is None:
+        # Aproximación habitual: ~4 caracteres por token
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(contents: Iterable[str], model: Optional[str] = None) -> int:
+    """
+    Tokens aproximados de una lista de mensajes de chat (solo su contenido).
+    """
+    return sum(count_tokens(c, model) + TOKENS_PER_MESSAGE for c in contents)
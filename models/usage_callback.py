@@ -0,0 +1,44 @@
+from typing import Any, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from models.instrumentation import CallRecord, _current_call, record_retry
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """
+    Callback de LangChain que anota tokens, modelo y reintentos en la llamada en curso.
+    Se registra en cada ChatOpenAI desde models/llm_provider.py.
+
+    Vive fuera de models/instrumentation.py para que importar la instrumentación
+    no cargue langchain_core: solo se importa al construir el primer modelo.
+    """
+
+    run_inline = True
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        record: Optional[CallRecord] = _current_call.get()
+        if record is None:
+            return
+
+        output = response.llm_output or {}
+        usage = output.get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens is None:
+            # Algunos proveedores solo informan usage_metadata en el mensaje
+            for generations in response.generations:
+                for gen in generations:
+                    meta = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+                    prompt_tokens = (prompt_tokens or 0) + meta.get("input_tokens", 0)
+                    completion_tokens = (completion_tokens or 0) + meta.get("output_tokens", 0)
+
+        record.prompt_tokens += prompt_tokens or 0
+        record.completion_tokens += completion_tokens or 0
+        record.model = output.get("model_name") or record.model
+
+    def on_retry(self, retry_state, **kwargs: Any) -> None:
+        record_retry()
+
+
+usage_handler = UsageCallbackHandler()
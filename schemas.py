@@ -1,9 +1,22 @@
 # schemas.py
-from typing import List, Literal
+import difflib
+import hashlib
+import logging
+import re
+import threading
+import unicodedata
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Literal, Optional, Set, Tuple
 from pydantic import BaseModel, Field
 
-from langchain_core.prompts import ChatPromptTemplate
-from models.llm_provider import get_llm
+from config import CASCADE_ENABLED, CASCADE_STAGES, DEFAULT_LLM_MODEL, RECONCILE_MIN_SIMILARITY
+from models.llm_provider import get_chain, get_structured_llm
+from models.instrumentation import instrumented, track_call
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+    from langchain_core.prompts import ChatPromptTemplate
+
+logger = logging.getLogger(__name__)
 
 
 # ==========================
@@ -74,6 +87,59 @@ class RequirementEvalList(BaseModel):
         description="Lista de requisitos evaluados contra el CV."
     )
 
+class RequirementMatchItem(RequirementMatchResult):
+    """Resultado de un requisito dentro de una respuesta que cubre varios."""
+    requisito: str = Field(..., description="Texto del requisito evaluado.")
+
+class RequirementMatchList(BaseModel):
+    items: List[RequirementMatchItem] = Field(
+        ...,
+        description="Un resultado por cada requisito preguntado al candidato."
+    )
+
+# Variantes con confianza para el primer paso de la cascada de modelos
+CONFIANZA_FIELD_DESCRIPTION = "Seguridad en el veredicto, de 0 (dudoso) a 1 (evidente)."
+
+class RequirementEvalItemScored(RequirementEvalItem):
+    confianza: float = Field(..., ge=0, le=1, description=CONFIANZA_FIELD_DESCRIPTION)
+
+class RequirementEvalListScored(BaseModel):
+    items: List[RequirementEvalItemScored] = Field(
+        ...,
+        description="Lista de requisitos evaluados contra el CV, con su confianza."
+    )
+
+class RequirementMatchResultScored(RequirementMatchResult):
+    confianza: float = Field(..., ge=0, le=1, description=CONFIANZA_FIELD_DESCRIPTION)
+
+class RequirementMatchItemScored(RequirementMatchItem):
+    confianza: float = Field(..., ge=0, le=1, description=CONFIANZA_FIELD_DESCRIPTION)
+
+class RequirementMatchListScored(BaseModel):
+    items: List[RequirementMatchItemScored] = Field(
+        ...,
+        description="Un resultado (con confianza) por cada requisito preguntado al candidato."
+    )
+
+# Perfil estructurado del CV: se extrae una vez por CV y se reutiliza entre ofertas
+class RoleExperience(BaseModel):
+    puesto: str = Field(..., description="Puesto o rol desempeñado.")
+    empresa: str | None = Field(default=None, description="Empresa, si se indica.")
+    anios: float = Field(..., ge=0, description="Años (aproximados) en el puesto.")
+    tecnologias: List[str] = Field(default_factory=list, description="Tecnologías usadas en el puesto.")
+
+class LanguageLevel(BaseModel):
+    idioma: str = Field(...)
+    nivel: str | None = Field(default=None, description="Nivel (A1-C2, nativo, ...) si se indica.")
+
+class CVProfile(BaseModel):
+    skills: List[str] = Field(default_factory=list, description="Habilidades y funciones (no tecnologías).")
+    tecnologias: List[str] = Field(default_factory=list, description="Lenguajes, frameworks, herramientas y plataformas.")
+    experiencia: List[RoleExperience] = Field(default_factory=list, description="Experiencia por puesto.")
+    educacion: List[str] = Field(default_factory=list, description="Títulos y formación reglada.")
+    idiomas: List[LanguageLevel] = Field(default_factory=list)
+    certificaciones: List[str] = Field(default_factory=list)
+
 # ==========================
 # 2. PROMPTS (SYSTEM PROMPTS)
 # ==========================
@@ -208,6 +274,28 @@ requisitos no encontrados.
 5. Evite asignar propiedades poco características
 """
 
+# Prompt para extraer el perfil estructurado de un CV
+CV_PROFILE_SYSTEM_PROMPT = """
+#Role
+Eres parte del personal de recursos humanos de una empresa. Para esta tarea en particular recibirás un CV y tienes
+como objetivo resumirlo en un perfil estructurado y compacto, que después se usará para comprobar requisitos de
+muchas ofertas distintas sin volver a leer el CV completo.
+
+#Instructions
+
+1 Recibes el CV.
+2 Extrae las habilidades, las tecnologías, la experiencia por puesto (con los años aproximados y las
+tecnologías usadas en cada uno), la formación, los idiomas con su nivel y las certificaciones.
+3 Devuelve SOLO el JSON del perfil.
+
+#Rules
+
+- No inventes nada: incluye solo lo que aparece en el CV o se deduce directamente de él.
+- Conserva los nombres tal y como aparecen (tecnologías, títulos, certificaciones).
+- Si los años de un puesto no se pueden calcular, estima a partir de las fechas; si no hay fechas, usa 0.
+- No resumas de más: todo lo que pueda servir para comprobar un requisito debe estar en el perfil.
+"""
+
 # Prompt genérico para promptlouder
 PROMPTLOUDER_SYSTEM_PROMPT = """
 Eres un asistente experto en evaluación de candidatos.
@@ -218,77 +306,726 @@ Debes devolver una salida estructurada con:
 """
 
 
+# Se añade al system prompt en el primer paso (modelo barato) de la cascada
+CONFIDENCE_INSTRUCTIONS = """
 
-def parse_requirements_structured(oferta_texto: str) -> List[RequirementItem]:
-    llm = get_llm(temperature=0.0)
-    structured_llm = llm.with_structured_output(RequirementItemsResponse)
+#Confianza
+Para cada resultado indica también "confianza": un número entre 0 y 1 con tu seguridad en el veredicto.
+- 1: el texto lo deja completamente claro.
+- 0.5: la evidencia es indirecta, ambigua o depende de una inferencia.
+Sé honesto: usa valores bajos siempre que dudes; los casos dudosos los revisará otro evaluador.
+"""
+
+
+# Plantillas de usuario de cada cadena (también forman parte de la versión del prompt)
+PARSE_REQUIREMENTS_USER_TEMPLATE = "Requisitos de la oferta:\n\n{oferta}"
+MATCH_REQUIREMENT_USER_TEMPLATE = "Requisitos:\n{reqs}\n\nCV:\n{cv}"
+INTERPRET_ANSWER_USER_TEMPLATE = "Requisito: {req}\nRespuesta del candidato: {resp}"
+CV_PROFILE_USER_TEMPLATE = "CV:\n{cv}"
+INTERPRET_ANSWERS_USER_TEMPLATE = (
+    "Requisitos preguntados:\n{reqs}\n\nRespuesta del candidato: {resp}\n\n"
+    "Evalúa cada requisito por separado y devuelve un resultado para cada uno, "
+    "copiando el texto del requisito tal cual."
+)
 
-    prompt = ChatPromptTemplate.from_messages(
+
+def _prompt_version(*parts: str) -> str:
+    """
+    Versión de un prompt derivada de su contenido: cualquier cambio en el texto
+    cambia la versión y, con ella, las claves de caché que dependen de él.
+    """
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+PARSE_REQUIREMENTS_PROMPT_VERSION = _prompt_version(
+    PARSE_REQUIREMENTS_SYSTEM_PROMPT, PARSE_REQUIREMENTS_USER_TEMPLATE
+)
+MATCH_REQUIREMENT_PROMPT_VERSION = _prompt_version(
+    MATCH_REQUIREMENT_SYSTEM_PROMPT, MATCH_REQUIREMENT_USER_TEMPLATE
+)
+CV_PROFILE_PROMPT_VERSION = _prompt_version(CV_PROFILE_SYSTEM_PROMPT, CV_PROFILE_USER_TEMPLATE)
+
+
+def _chat_prompt(system_prompt: str, user_template: str) -> "ChatPromptTemplate":
+    # langchain_core se importa al construir la primera cadena, no al importar schemas
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_messages(
         [
-            ("system", PARSE_REQUIREMENTS_SYSTEM_PROMPT),
-            ("user", "Requisitos de la oferta:\n\n{oferta}"),
+            ("system", system_prompt),
+            ("user", user_template),
         ]
     )
 
-    chain = prompt | structured_llm
+
+def _parse_requirements_prompt() -> "ChatPromptTemplate":
+    return _chat_prompt(PARSE_REQUIREMENTS_SYSTEM_PROMPT, PARSE_REQUIREMENTS_USER_TEMPLATE)
+
+
+def _check_requirements_prompt() -> "ChatPromptTemplate":
+    return _chat_prompt(MATCH_REQUIREMENT_SYSTEM_PROMPT, MATCH_REQUIREMENT_USER_TEMPLATE)
+
+
+def _build_parse_requirements_chain(structured_llm):
+    return _parse_requirements_prompt() | structured_llm
+
+
+def _build_check_requirements_chain(structured_llm):
+    return _check_requirements_prompt() | structured_llm
+
+
+def _build_interpret_answer_chain(structured_llm):
+    prompt = _chat_prompt(INTERPRET_CANDIDATE_ANSWER_SYSTEM_PROMPT, INTERPRET_ANSWER_USER_TEMPLATE)
+
+    return prompt | structured_llm
+
+
+# Las cadenas se compilan una vez por proceso y se reutilizan (ver models/llm_provider.py)
+def _build_interpret_answers_chain(structured_llm):
+    prompt = _chat_prompt(INTERPRET_CANDIDATE_ANSWER_SYSTEM_PROMPT, INTERPRET_ANSWERS_USER_TEMPLATE)
+
+    return prompt | structured_llm
+
+
+def _build_cv_profile_chain(structured_llm):
+    prompt = _chat_prompt(CV_PROFILE_SYSTEM_PROMPT, CV_PROFILE_USER_TEMPLATE)
+
+    return prompt | structured_llm
+
+
+def _scored_chain_builder(system_prompt: str, user_template: str):
+    # Misma cadena que la original, pidiendo además la confianza de cada veredicto
+    def build(structured_llm):
+        return _chat_prompt(system_prompt + CONFIDENCE_INSTRUCTIONS, user_template) | structured_llm
+
+    return build
+
+
+def _parse_requirements_chain():
+    return get_chain(
+        "parse_requirements",
+        _build_parse_requirements_chain,
+        temperature=0.0,
+        schema=RequirementItemsResponse,
+    )
+
+
+def _check_requirements_chain(model: Optional[str] = None):
+    # ✅ Pasamos el modelo contenedor, NO List[...]
+    return get_chain(
+        "check_requirements",
+        _build_check_requirements_chain,
+        temperature=0.0,
+        schema=RequirementEvalList,
+        model=model,
+    )
+
+
+def _interpret_answer_chain(model: Optional[str] = None):
+    return get_chain(
+        "interpret_answer",
+        _build_interpret_answer_chain,
+        temperature=0.0,
+        schema=RequirementMatchResult,
+        model=model,
+    )
+
+
+def _interpret_answers_chain(model: Optional[str] = None):
+    return get_chain(
+        "interpret_answers",
+        _build_interpret_answers_chain,
+        temperature=0.0,
+        schema=RequirementMatchList,
+        model=model,
+    )
+
+
+def _cv_profile_chain():
+    return get_chain(
+        "cv_profile",
+        _build_cv_profile_chain,
+        temperature=0.0,
+        schema=CVProfile,
+    )
+
+
+def _check_requirements_scored_chain(model: str):
+    return get_chain(
+        "check_requirements_scored",
+        _scored_chain_builder(MATCH_REQUIREMENT_SYSTEM_PROMPT, MATCH_REQUIREMENT_USER_TEMPLATE),
+        temperature=0.0,
+        schema=RequirementEvalListScored,
+        model=model,
+    )
+
+
+def _interpret_answer_scored_chain(model: str):
+    return get_chain(
+        "interpret_answer_scored",
+        _scored_chain_builder(INTERPRET_CANDIDATE_ANSWER_SYSTEM_PROMPT, INTERPRET_ANSWER_USER_TEMPLATE),
+        temperature=0.0,
+        schema=RequirementMatchResultScored,
+        model=model,
+    )
+
+
+def _interpret_answers_scored_chain(model: str):
+    return get_chain(
+        "interpret_answers_scored",
+        _scored_chain_builder(INTERPRET_CANDIDATE_ANSWER_SYSTEM_PROMPT, INTERPRET_ANSWERS_USER_TEMPLATE),
+        temperature=0.0,
+        schema=RequirementMatchListScored,
+        model=model,
+    )
+
+
+def _check_requirements_input(requisitos: list[str], cv_text: str) -> dict:
+    reqs_str = "\n".join(f"- {r}" for r in requisitos)
+    return {"reqs": reqs_str, "cv": cv_text}
+
+
+# ==========================
+# CONCILIACIÓN DE ITEMS DEVUELTOS POR EL LLM
+# ==========================
+# El LLM a veces omite requisitos de la lista o copia el texto reformulado
+# ("Python (3 años)" -> "Experiencia de 3 años en Python"), y entonces la
+# búsqueda exacta por texto falla. reconcile_items asigna cada item a un
+# requisito pedido y devuelve aparte los que siguen sin respuesta, para
+# re-preguntar solo por esos.
+
+# Similitud mínima para aceptar un item cuando el LLM devolvió tantos items
+# como requisitos se pidieron
+_POSITION_MIN_SIMILARITY = 0.5
+
+
+def _match_text(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    # Sin viñetas / numeración al principio ni puntuación al final
+    text = re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", text)
+    return " ".join(text.split()).strip(" .;:")
+
+
+def _similarity(a: str, b: str) -> float:
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def reconcile_items(
+    requested: List[str],
+    items: List[Any],
+    min_similarity: float = RECONCILE_MIN_SIMILARITY,
+    renames: Optional[Dict[str, str]] = None,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Asigna los items devueltos por el LLM (con campo `requisito`) a los
+    requisitos pedidos, por este orden:
+      1. texto igual tras normalizar (mayúsculas, acentos, espacios, viñetas),
+      2. el resto, de la pareja más parecida a la menos parecida: se acepta si
+         la similitud llega a `min_similarity` o, si el LLM devolvió tantos
+         items como se pidieron, si los textos se parecen mínimamente.
+    La posición en la lista solo desempata entre candidatos igual de parecidos:
+    un LLM que reordena la respuesta no intercambia los veredictos.
+    Devuelve ({requisito pedido: item con ese texto}, requisitos sin item).
+    Si se pasa `renames`, se anotan en él las reformulaciones que llegan a
+    `min_similarity` como {texto del LLM: requisito pedido}.
+    """
+    wanted = list(dict.fromkeys(requested))
+    by_text: Dict[str, str] = {}
+    for texto in wanted:
+        by_text.setdefault(_match_text(texto), texto)
+
+    matched: Dict[str, Any] = {}
+    leftovers: List[Tuple[int, Any]] = []
+    for idx, item in enumerate(items):
+        texto = by_text.get(_match_text(item.requisito))
+        if texto is not None and texto not in matched:
+            matched[texto] = item
+        else:
+            leftovers.append((idx, item))
+
+    if leftovers:
+        same_count = len(items) == len(wanted)
+        floor = min(min_similarity, _POSITION_MIN_SIMILARITY) if same_count else min_similarity
+        free = [(pos, t) for pos, t in enumerate(wanted) if t not in matched]
+        pairs = sorted(
+            (
+                (-_similarity(_match_text(t), _match_text(item.requisito)), pos != idx, idx, pos, t)
+                for idx, item in leftovers
+                for pos, t in free
+            ),
+        )
+        items_by_idx = dict(leftovers)
+        for neg_score, _, idx, _, texto in pairs:
+            score = -neg_score
+            if score < floor:
+                break
+            if texto in matched or idx not in items_by_idx:
+                continue
+            matched[texto] = items_by_idx.pop(idx)
+            if renames is not None and score >= min_similarity:
+                renames[matched[texto].requisito] = texto
+
+    result = {}
+    for texto in wanted:
+        item = matched.get(texto)
+        if item is not None:
+            result[texto] = item if item.requisito == texto else type(item)(**{**item.dict(), "requisito": texto})
+    return result, [t for t in wanted if t not in result]
+
+
+def render_parse_requirements(oferta_texto: str) -> List["BaseMessage"]:
+    """
+    Mensajes que envía parse_requirements_structured, ya renderizados (para
+    exportar la petición a la API batch del proveedor).
+    """
+    return _parse_requirements_prompt().invoke({"oferta": oferta_texto}).to_messages()
+
+
+def render_check_requirements(requisitos: list[str], cv_text: str) -> List["BaseMessage"]:
+    """
+    Mensajes que envía check_requirement_structured, ya renderizados.
+    """
+    return _check_requirements_prompt().invoke(_check_requirements_input(requisitos, cv_text)).to_messages()
+
+
+@instrumented("parse_requirements")
+def parse_requirements_structured(oferta_texto: str) -> List[RequirementItem]:
+    chain = _parse_requirements_chain()
     result: RequirementItemsResponse = chain.invoke({"oferta": oferta_texto})
     return result.requirements
 
 
+@instrumented("parse_requirements")
+async def aparse_requirements_structured(oferta_texto: str) -> List[RequirementItem]:
+    """
+    Versión asíncrona de parse_requirements_structured (usa ainvoke).
+    """
+    chain = _parse_requirements_chain()
+    result: RequirementItemsResponse = await chain.ainvoke({"oferta": oferta_texto})
+    return result.requirements
+
+
+@instrumented("cv_profile")
+def extract_cv_profile_structured(cv_text: str) -> CVProfile:
+    """
+    Extrae el perfil estructurado del CV (una llamada; ver services/cv_profile.py).
+    """
+    return _cv_profile_chain().invoke({"cv": cv_text})
+
+
+@instrumented("cv_profile")
+async def aextract_cv_profile_structured(cv_text: str) -> CVProfile:
+    return await _cv_profile_chain().ainvoke({"cv": cv_text})
+
+
+def _check_requirements_call(
+    requisitos: list[str],
+    cv_text: str,
+    model: Optional[str] = None,
+    stage: str = "check_requirements",
+) -> list[RequirementEvalItem]:
+    with track_call(stage):
+        chain = _check_requirements_chain(model)
+        result: RequirementEvalList = chain.invoke(_check_requirements_input(requisitos, cv_text))
+
+    # Devolvemos la lista pura
+    return result.items
+
+
+async def _acheck_requirements_call(
+    requisitos: list[str],
+    cv_text: str,
+    model: Optional[str] = None,
+    stage: str = "check_requirements",
+) -> list[RequirementEvalItem]:
+    with track_call(stage):
+        chain = _check_requirements_chain(model)
+        result: RequirementEvalList = await chain.ainvoke(_check_requirements_input(requisitos, cv_text))
+    return result.items
+
+
 def check_requirement_structured(
     requisitos: list[str],
     cv_text: str,
+    mandatory: Iterable[str] = (),
 ) -> list[RequirementEvalItem]:
-    llm = get_llm(temperature=0.0)
+    """
+    Evalúa los requisitos contra el CV en una sola llamada. Con CASCADE_ENABLED
+    pasa por la cascada de modelos; `mandatory` son los requisitos obligatorios
+    (la cascada puede repetirlos siempre con el modelo fuerte).
+    """
+    if CASCADE_ENABLED:
+        return _check_cascade(requisitos, cv_text, set(mandatory))
+    return _check_requirements_call(requisitos, cv_text)
 
-    # ✅ Pasamos el modelo contenedor, NO List[...]
-    structured_llm = llm.with_structured_output(RequirementEvalList)
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", MATCH_REQUIREMENT_SYSTEM_PROMPT),
-            ("user", "Requisitos:\n{reqs}\n\nCV:\n{cv}"),
-        ]
-    )
+async def acheck_requirement_structured(
+    requisitos: list[str],
+    cv_text: str,
+    mandatory: Iterable[str] = (),
+) -> list[RequirementEvalItem]:
+    """
+    Versión asíncrona de check_requirement_structured (usa ainvoke), pensada
+    para evaluar muchos CVs en paralelo sin bloquear el bucle de eventos.
+    """
+    if CASCADE_ENABLED:
+        return await _acheck_cascade(requisitos, cv_text, set(mandatory))
+    return await _acheck_requirements_call(requisitos, cv_text)
+
+
+def _interpret_answer_call(
+    requisito: str,
+    respuesta: str,
+    model: Optional[str] = None,
+    stage: str = "interpret_answer",
+) -> RequirementMatchResult:
+    with track_call(stage):
+        chain = _interpret_answer_chain(model)
+        result: RequirementMatchResult = chain.invoke({"req": requisito, "resp": respuesta})
+    return result
 
-    reqs_str = "\n".join(f"- {r}" for r in requisitos)
 
-    chain = prompt | structured_llm
-    result: RequirementEvalList = chain.invoke({"reqs": reqs_str, "cv": cv_text})
+async def _ainterpret_answer_call(
+    requisito: str,
+    respuesta: str,
+    model: Optional[str] = None,
+    stage: str = "interpret_answer",
+) -> RequirementMatchResult:
+    with track_call(stage):
+        chain = _interpret_answer_chain(model)
+        result: RequirementMatchResult = await chain.ainvoke({"req": requisito, "resp": respuesta})
+    return result
 
-    # Devolvemos la lista pura
+
+def interpret_candidate_answer_structured(
+    requisito: str,
+    respuesta: str,
+    mandatory: bool = False,
+) -> RequirementMatchResult:
+    """
+    Interpreta si el candidato cumple el requisito a partir de su respuesta libre.
+    """
+    if CASCADE_ENABLED:
+        return _interpret_answer_cascade(requisito, respuesta, mandatory)
+    return _interpret_answer_call(requisito, respuesta)
+
+
+async def ainterpret_candidate_answer_structured(
+    requisito: str,
+    respuesta: str,
+    mandatory: bool = False,
+) -> RequirementMatchResult:
+    """
+    Versión asíncrona de interpret_candidate_answer_structured (usa ainvoke).
+    """
+    if CASCADE_ENABLED:
+        return await _ainterpret_answer_cascade(requisito, respuesta, mandatory)
+    return await _ainterpret_answer_call(requisito, respuesta)
+
+
+def _interpret_answers_call(
+    requisitos: list[str],
+    respuesta: str,
+    model: Optional[str] = None,
+    stage: str = "interpret_answers",
+) -> list[RequirementMatchItem]:
+    with track_call(stage):
+        chain = _interpret_answers_chain(model)
+        reqs_str = "\n".join(f"- {r}" for r in requisitos)
+        result: RequirementMatchList = chain.invoke({"reqs": reqs_str, "resp": respuesta})
+    return result.items
+
+
+async def _ainterpret_answers_call(
+    requisitos: list[str],
+    respuesta: str,
+    model: Optional[str] = None,
+    stage: str = "interpret_answers",
+) -> list[RequirementMatchItem]:
+    with track_call(stage):
+        chain = _interpret_answers_chain(model)
+        reqs_str = "\n".join(f"- {r}" for r in requisitos)
+        result: RequirementMatchList = await chain.ainvoke({"reqs": reqs_str, "resp": respuesta})
     return result.items
 
 
+def _answers_for(requisitos: list[str], items: list[RequirementMatchItem]) -> list[RequirementMatchItem]:
+    # Un item por requisito, en orden; los que el modelo no devuelva cuentan como no cumplidos
+    by_req, _ = reconcile_items(requisitos, items)
+    return [
+        by_req.get(r) or RequirementMatchItem(
+            requisito=r,
+            cumple=False,
+            justificacion="La respuesta no permite confirmar este requisito.",
+        )
+        for r in requisitos
+    ]
+
 
-def interpret_candidate_answer_structured(requisito: str, respuesta: str) -> RequirementMatchResult:
+def interpret_candidate_answers_structured(
+    requisitos: list[str],
+    respuesta: str,
+    mandatory: Iterable[str] = (),
+) -> list[RequirementMatchItem]:
     """
-    Interpreta si el candidato cumple el requisito a partir de su respuesta libre.
+    Interpreta una única respuesta del candidato contra varios requisitos a la
+    vez (una sola llamada al LLM). Los items se concilian con los requisitos
+    (reconcile_items); los que el modelo no devuelva se consideran no cumplidos.
     """
-    llm = get_llm(temperature=0.0)
-    structured_llm = llm.with_structured_output(RequirementMatchResult)
+    if CASCADE_ENABLED:
+        items = _interpret_answers_cascade(requisitos, respuesta, set(mandatory))
+    else:
+        items = _interpret_answers_call(requisitos, respuesta)
+    return _answers_for(requisitos, items)
 
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", INTERPRET_CANDIDATE_ANSWER_SYSTEM_PROMPT),
-            ("user", "Requisito: {req}\nRespuesta del candidato: {resp}"),
-        ]
+
+async def ainterpret_candidate_answers_structured(
+    requisitos: list[str],
+    respuesta: str,
+    mandatory: Iterable[str] = (),
+) -> list[RequirementMatchItem]:
+    """
+    Versión asíncrona de interpret_candidate_answers_structured (usa ainvoke).
+    """
+    if CASCADE_ENABLED:
+        items = await _ainterpret_answers_cascade(requisitos, respuesta, set(mandatory))
+    else:
+        items = await _ainterpret_answers_call(requisitos, respuesta)
+    return _answers_for(requisitos, items)
+
+
+# ==========================
+# CASCADA DE MODELOS (barato -> fuerte)
+# ==========================
+# Con CASCADE_ENABLED, cada veredicto se pide primero a un modelo barato que
+# devuelve también su confianza. Solo se repiten con el modelo fuerte:
+#   - los de confianza < min_confidence de la etapa,
+#   - los requisitos obligatorios, según escalate_mandatory ("negative": solo
+#     si el modelo barato dice que no se cumple, porque eso descarta al
+#     candidato; "all": siempre; "none": nunca),
+#   - los que el modelo barato no devolvió (o todos, si su llamada falla).
+# Las etapas y sus umbrales están en config.CASCADE_STAGES.
+
+_cascade_lock = threading.Lock()
+_cascade_counts: Dict[str, Dict[str, int]] = {}
+
+
+def verdict_model(stage: str) -> str:
+    """
+    Identificador del "modelo" que produce los veredictos de la etapa (para
+    las claves de caché): con la cascada activa depende de ambos modelos y del umbral.
+    """
+    if not CASCADE_ENABLED:
+        return DEFAULT_LLM_MODEL
+    cfg = CASCADE_STAGES[stage]
+    return (
+        f"cascade:{cfg['cheap_model']}>{cfg['strong_model']}"
+        f"@{cfg['min_confidence']}:{cfg['escalate_mandatory']}"
     )
 
-    chain = prompt | structured_llm
-    result: RequirementMatchResult = chain.invoke({"req": requisito, "resp": respuesta})
-    return result
 
+def _count_cascade(stage: str, verdicts: int, reasons: Dict[str, int]) -> None:
+    with _cascade_lock:
+        counts = _cascade_counts.setdefault(stage, {"verdicts": 0, "escalated": 0})
+        counts["verdicts"] += verdicts
+        for reason, n in reasons.items():
+            counts["escalated"] += n
+            counts[reason] = counts.get(reason, 0) + n
+
+
+def cascade_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Por etapa: veredictos pedidos al modelo barato, cuántos se escalaron al
+    fuerte (total y por motivo) y la tasa de escalado.
+    """
+    with _cascade_lock:
+        out: Dict[str, Dict[str, float]] = {}
+        for stage, counts in _cascade_counts.items():
+            out[stage] = dict(counts)
+            out[stage]["escalation_rate"] = round(counts["escalated"] / counts["verdicts"], 4) if counts["verdicts"] else 0.0
+        return out
+
+
+def reset_cascade_stats() -> None:
+    with _cascade_lock:
+        _cascade_counts.clear()
 
+
+def _escalation_reason(stage: str, cumple: bool, confianza: float, mandatory: bool) -> Optional[str]:
+    cfg = CASCADE_STAGES[stage]
+    if mandatory:
+        policy = cfg["escalate_mandatory"]
+        if policy == "all" or (policy == "negative" and not cumple):
+            return "mandatory"
+    if confianza < cfg["min_confidence"]:
+        return "low_confidence"
+    return None
+
+
+def _strip_confidence(item: BaseModel, base: type) -> BaseModel:
+    return base(**item.dict(exclude={"confianza"}))
+
+
+def _split_scored(
+    stage: str,
+    requisitos: list[str],
+    scored_items: Optional[list],
+    mandatory: Set[str],
+    base: type,
+) -> tuple[list, list[str]]:
+    """
+    Separa la respuesta del modelo barato en veredictos aceptados (sin la
+    confianza, como los del modelo normal) y requisitos a escalar.
+    """
+    reasons: Dict[str, int] = {}
+    kept: list = []
+    escalate: list[str] = []
+    by_req, _ = reconcile_items(requisitos, scored_items or [])
+    unique = list(dict.fromkeys(requisitos))
+    for r in unique:
+        item = by_req.get(r)
+        if scored_items is None:
+            reason = "cheap_error"
+        elif item is None:
+            reason = "missing"
+        else:
+            reason = _escalation_reason(stage, item.cumple, item.confianza, r in mandatory)
+        if reason is None:
+            kept.append(_strip_confidence(item, base))
+        else:
+            escalate.append(r)
+            reasons[reason] = reasons.get(reason, 0) + 1
+    _count_cascade(stage, len(unique), reasons)
+    return kept, escalate
+
+
+def _in_request_order(requisitos: list[str], items: list) -> list:
+    """
+    Items del modelo barato y del fuerte en el orden de `requisitos`, como los
+    devolvería una sola llamada; los que no coinciden con ningún requisito
+    (texto reformulado) van al final, para la conciliación de quien llama.
+    """
+    position: Dict[str, int] = {}
+    for i, r in enumerate(requisitos):
+        position.setdefault(_match_text(r), i)
+    return sorted(items, key=lambda item: position.get(_match_text(item.requisito), len(requisitos)))
+
+
+def _check_cheap_call(requisitos: list[str], cv_text: str) -> Optional[list]:
+    model = CASCADE_STAGES["check_requirements"]["cheap_model"]
+    try:
+        with track_call("check_requirements:cheap"):
+            chain = _check_requirements_scored_chain(model)
+            return chain.invoke(_check_requirements_input(requisitos, cv_text)).items
+    except Exception as exc:
+        logger.warning("Cascada: fallo del modelo barato (%s), se usa el fuerte: %s", model, exc)
+        return None
+
+
+async def _acheck_cheap_call(requisitos: list[str], cv_text: str) -> Optional[list]:
+    model = CASCADE_STAGES["check_requirements"]["cheap_model"]
+    try:
+        with track_call("check_requirements:cheap"):
+            chain = _check_requirements_scored_chain(model)
+            return (await chain.ainvoke(_check_requirements_input(requisitos, cv_text))).items
+    except Exception as exc:
+        logger.warning("Cascada: fallo del modelo barato (%s), se usa el fuerte: %s", model, exc)
+        return None
+
+
+def _check_cascade(requisitos: list[str], cv_text: str, mandatory: Set[str]) -> list[RequirementEvalItem]:
+    scored = _check_cheap_call(requisitos, cv_text)
+    items, escalate = _split_scored("check_requirements", requisitos, scored, mandatory, RequirementEvalItem)
+    if escalate:
+        strong = CASCADE_STAGES["check_requirements"]["strong_model"]
+        items += _check_requirements_call(escalate, cv_text, strong, "check_requirements:strong")
+    return _in_request_order(requisitos, items)
+
+
+async def _acheck_cascade(requisitos: list[str], cv_text: str, mandatory: Set[str]) -> list[RequirementEvalItem]:
+    scored = await _acheck_cheap_call(requisitos, cv_text)
+    items, escalate = _split_scored("check_requirements", requisitos, scored, mandatory, RequirementEvalItem)
+    if escalate:
+        strong = CASCADE_STAGES["check_requirements"]["strong_model"]
+        items += await _acheck_requirements_call(escalate, cv_text, strong, "check_requirements:strong")
+    return _in_request_order(requisitos, items)
+
+
+def _interpret_answer_cascade(requisito: str, respuesta: str, mandatory: bool) -> RequirementMatchResult:
+    cfg = CASCADE_STAGES["interpret_answer"]
+    try:
+        with track_call("interpret_answer:cheap"):
+            scored = _interpret_answer_scored_chain(cfg["cheap_model"]).invoke({"req": requisito, "resp": respuesta})
+        reason = _escalation_reason("interpret_answer", scored.cumple, scored.confianza, mandatory)
+        _count_cascade("interpret_answer", 1, {reason: 1} if reason else {})
+    except Exception as exc:
+        logger.warning("Cascada: fallo del modelo barato (%s), se usa el fuerte: %s", cfg["cheap_model"], exc)
+        reason = "cheap_error"
+        _count_cascade("interpret_answer", 1, {reason: 1})
+    if reason is None:
+        return _strip_confidence(scored, RequirementMatchResult)
+    return _interpret_answer_call(requisito, respuesta, cfg["strong_model"], "interpret_answer:strong")
+
+
+async def _ainterpret_answer_cascade(requisito: str, respuesta: str, mandatory: bool) -> RequirementMatchResult:
+    cfg = CASCADE_STAGES["interpret_answer"]
+    try:
+        with track_call("interpret_answer:cheap"):
+            scored = await _interpret_answer_scored_chain(cfg["cheap_model"]).ainvoke({"req": requisito, "resp": respuesta})
+        reason = _escalation_reason("interpret_answer", scored.cumple, scored.confianza, mandatory)
+        _count_cascade("interpret_answer", 1, {reason: 1} if reason else {})
+    except Exception as exc:
+        logger.warning("Cascada: fallo del modelo barato (%s), se usa el fuerte: %s", cfg["cheap_model"], exc)
+        reason = "cheap_error"
+        _count_cascade("interpret_answer", 1, {reason: 1})
+    if reason is None:
+        return _strip_confidence(scored, RequirementMatchResult)
+    return await _ainterpret_answer_call(requisito, respuesta, cfg["strong_model"], "interpret_answer:strong")
+
+
+def _interpret_answers_cascade(requisitos: list[str], respuesta: str, mandatory: Set[str]) -> list[RequirementMatchItem]:
+    # Comparte modelos y umbrales con interpret_answer (mismo tipo de veredicto)
+    cfg = CASCADE_STAGES["interpret_answer"]
+    reqs_str = "\n".join(f"- {r}" for r in requisitos)
+    try:
+        with track_call("interpret_answers:cheap"):
+            chain = _interpret_answers_scored_chain(cfg["cheap_model"])
+            scored = chain.invoke({"reqs": reqs_str, "resp": respuesta}).items
+    except Exception as exc:
+        logger.warning("Cascada: fallo del modelo barato (%s), se usa el fuerte: %s", cfg["cheap_model"], exc)
+        scored = None
+    items, escalate = _split_scored("interpret_answer", requisitos, scored, mandatory, RequirementMatchItem)
+    if escalate:
+        items += _interpret_answers_call(escalate, respuesta, cfg["strong_model"], "interpret_answers:strong")
+    return _in_request_order(requisitos, items)
+
+
+async def _ainterpret_answers_cascade(requisitos: list[str], respuesta: str, mandatory: Set[str]) -> list[RequirementMatchItem]:
+    cfg = CASCADE_STAGES["interpret_answer"]
+    reqs_str = "\n".join(f"- {r}" for r in requisitos)
+    try:
+        with track_call("interpret_answers:cheap"):
+            chain = _interpret_answers_scored_chain(cfg["cheap_model"])
+            scored = (await chain.ainvoke({"reqs": reqs_str, "resp": respuesta})).items
+    except Exception as exc:
+        logger.warning("Cascada: fallo del modelo barato (%s), se usa el fuerte: %s", cfg["cheap_model"], exc)
+        scored = None
+    items, escalate = _split_scored("interpret_answer", requisitos, scored, mandatory, RequirementMatchItem)
+    if escalate:
+        items += await _ainterpret_answers_call(escalate, respuesta, cfg["strong_model"], "interpret_answers:strong")
+    return _in_request_order(requisitos, items)
+
+
+@instrumented("promptlouder")
 def promptlouder(user_prompt: str) -> PromptLouderResult:
     """
     Función genérica que:
-    - Crea el LLM,
+    - Reutiliza el LLM con structured output del registro,
     - Usa PROMPTLOUDER_SYSTEM_PROMPT como system,
     - Devuelve PromptLouderResult validado.
     """
-    llm = get_llm(temperature=0.2)
-    structured_llm = llm.with_structured_output(PromptLouderResult)
+    structured_llm = get_structured_llm(PromptLouderResult, temperature=0.2)
 
     result: PromptLouderResult = structured_llm.invoke(
         [
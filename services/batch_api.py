@@ -0,0 +1,301 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import DEFAULT_LLM_MODEL, PREMATCH_ENABLED, RESULTS_FLUSH_EVERY, RETRIEVAL_ENABLED
+from schemas import (
+    RequirementEvalItem,
+    RequirementEvalList,
+    RequirementItemsResponse,
+    render_check_requirements,
+    render_parse_requirements,
+)
+from services.batch_evaluator import CandidateEvaluation
+from services.cv_evaluator import complete_deferred_checks, prepare_deferred_checks
+from services.cv_ingest import iter_cv_source
+from services.requirement_parser import get_requirements_cache, requirements_cache_key
+from services.results_store import ResultsStore, get_results_store, offer_id_for
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
+
+
+# ==========================
+# MODO BATCH OFFLINE (API batch del proveedor)
+# ==========================
+# Para cribas masivas nocturnas: en vez de llamar al LLM en vivo, se exportan
+# las peticiones a un JSONL en el formato de la API batch (más barata y sin
+# límites de cuota por minuto), el proveedor lo procesa y se ingieren los
+# resultados con la misma lógica de grupos, descarte y puntuación.
+#
+#   1. export  oferta + carpeta de CVs -> peticiones.jsonl (+ peticiones.manifest.jsonl)
+#              Si la oferta aún no está parseada, solo se exporta la petición de
+#              parseo: se ingiere y se vuelve a exportar para obtener las de los CVs.
+#   2. el proveedor procesa el fichero (en local: fake-process, con el LLM simulado)
+#   3. ingest  resultados.jsonl -> veredictos -> caché + almacén de resultados
+#
+# Los custom_id son estables (dependen solo de la oferta y del candidato), y
+# el manifiesto guarda lo necesario para ingerir sin releer los CVs: los
+# requisitos de la oferta, los pendientes de cada CV y los ya resueltos en local
+# (caché y pre-matcher). Lo que ya está en caché no se vuelve a exportar, así que
+# tras ingerir, un nuevo export solo incluye lo que falló o no llegó.
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+
+def manifest_path_for(requests_path: str) -> str:
+    path = Path(requests_path)
+    return str(path.with_name(path.stem + ".manifest.jsonl"))
+
+
+def parse_custom_id(offer_id: str) -> str:
+    return f"parse-{offer_id}"
+
+
+def check_custom_id(offer_id: str, candidate_id: str) -> str:
+    return f"check-{offer_id}-{candidate_id}"
+
+
+def _response_format(schema: type) -> Dict[str, Any]:
+    # Pydantic v2 (model_json_schema) o v1 (schema)
+    json_schema = schema.model_json_schema() if hasattr(schema, "model_json_schema") else schema.schema()
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": schema.__name__, "schema": json_schema},
+    }
+
+
+def _validate(schema: type, raw: str):
+    if hasattr(schema, "model_validate_json"):
+        return schema.model_validate_json(raw)
+    return schema.parse_raw(raw)
+
+
+def batch_request(custom_id: str, messages: List["BaseMessage"], schema: type, model: str = DEFAULT_LLM_MODEL) -> Dict[str, Any]:
+    """
+    Una línea del fichero de peticiones: la misma llamada que haría la cadena
+    en vivo (mensajes renderizados, temperatura 0 y salida estructurada).
+    """
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "temperature": 0.0,
+            "messages": [{"role": _ROLES.get(m.type, m.type), "content": m.content} for m in messages],
+            "response_format": _response_format(schema),
+        },
+    }
+
+
+def _known_requirements(oferta_texto: str, store: ResultsStore) -> Optional[List[Dict]]:
+    cached = get_requirements_cache().get(requirements_cache_key(oferta_texto))
+    if cached:
+        return cached
+    return store.requirements(offer_id_for(oferta_texto))
+
+
+def _write_jsonl(f, entry: Dict[str, Any]) -> None:
+    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def export_batch(
+    oferta_texto: str,
+    cvs: Iterable[Tuple[str, str]],
+    requests_path: str,
+    model: str = DEFAULT_LLM_MODEL,
+    store: Optional[ResultsStore] = None,
+    use_cache: bool = True,
+    prematch: bool = PREMATCH_ENABLED,
+    retrieve: bool = RETRIEVAL_ENABLED,
+) -> Dict[str, Any]:
+    """
+    Escribe el fichero de peticiones y su manifiesto. Los CVs se procesan de
+    uno en uno, así que `cvs` puede ser un generador sobre una carpeta grande.
+    """
+    store = store or get_results_store()
+    offer_id = offer_id_for(oferta_texto)
+    requisitos = _known_requirements(oferta_texto, store)
+    counts: Dict[str, Any] = {"offer_id": offer_id, "stage": "check" if requisitos else "parse", "requests": 0, "local": 0}
+
+    with open(requests_path, "w", encoding="utf-8") as req_f, \
+            open(manifest_path_for(requests_path), "w", encoding="utf-8") as man_f:
+        if not requisitos:
+            custom_id = parse_custom_id(offer_id)
+            _write_jsonl(req_f, batch_request(custom_id, render_parse_requirements(oferta_texto), RequirementItemsResponse, model))
+            _write_jsonl(man_f, {"kind": "parse", "custom_id": custom_id, "offer_id": offer_id, "oferta": oferta_texto})
+            counts["requests"] = 1
+            return counts
+
+        store.save_offer(oferta_texto, requisitos)
+        textos = [r["texto"] for r in requisitos]
+        _write_jsonl(man_f, {"kind": "offer", "offer_id": offer_id, "requisitos": requisitos})
+        for candidate_id, cv_text in cvs:
+            cv_hash, found, pending, llm_cv, cv_context = prepare_deferred_checks(
+                textos, cv_text, use_cache, prematch, retrieve
+            )
+            entry = {
+                "kind": "check" if pending else "local",
+                "custom_id": check_custom_id(offer_id, candidate_id),
+                "offer_id": offer_id,
+                "candidate_id": candidate_id,
+                "cv_hash": cv_hash,
+                "cv_context": cv_context,
+                "pending": pending,
+                "found": {texto: item.dict() for texto, item in found.items()},
+            }
+            _write_jsonl(man_f, entry)
+            if pending:
+                messages = render_check_requirements(pending, llm_cv)
+                _write_jsonl(req_f, batch_request(entry["custom_id"], messages, RequirementEvalList, model))
+                counts["requests"] += 1
+            else:
+                counts["local"] += 1
+    return counts
+
+
+def _read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _response_content(line: Dict[str, Any]) -> str:
+    """
+    Contenido JSON de la respuesta de una línea de resultados; lanza
+    RuntimeError si la petición falló en el proveedor.
+    """
+    if line.get("error"):
+        raise RuntimeError(f"Error del proveedor: {line['error']}")
+    response = line.get("response") or {}
+    if response.get("status_code") != 200:
+        raise RuntimeError(f"HTTP {response.get('status_code')}: {response.get('body')}")
+    return response["body"]["choices"][0]["message"]["content"]
+
+
+def ingest_batch(
+    results_path: str,
+    manifest_path: str,
+    store: Optional[ResultsStore] = None,
+    use_cache: bool = True,
+    flush_every: int = RESULTS_FLUSH_EVERY,
+) -> Dict[str, int]:
+    """
+    Ingiere el fichero de resultados del proveedor: la petición de parseo
+    guarda los requisitos (caché y almacén) y las de los CVs se convierten en
+    RequirementEvalItem, se puntúan y se guardan en bloques en el almacén.
+    Los CVs resueltos del todo en local se puntúan sin resultado del proveedor.
+    """
+    store = store or get_results_store()
+    counts = {"parsed": 0, "evaluated": 0, "local": 0, "errors": 0, "missing": 0}
+    manifest: Dict[str, Dict[str, Any]] = {}
+    offers: Dict[str, List[Dict]] = {}
+    local: List[Dict[str, Any]] = []
+    for entry in _read_jsonl(manifest_path):
+        if entry["kind"] == "offer":
+            offers[entry["offer_id"]] = entry["requisitos"]
+        elif entry["kind"] == "local":
+            local.append(entry)
+        else:
+            manifest[entry["custom_id"]] = entry
+
+    pending: Dict[str, List[CandidateEvaluation]] = {}
+
+    def add(offer_id: str, item: CandidateEvaluation) -> None:
+        batch = pending.setdefault(offer_id, [])
+        batch.append(item)
+        if len(batch) >= flush_every:
+            store.save_evaluations(offer_id, batch)
+            batch.clear()
+
+    def score(entry: Dict[str, Any], new_items: List[RequirementEvalItem]) -> Dict:
+        found = {texto: RequirementEvalItem(**item) for texto, item in entry["found"].items()}
+        return complete_deferred_checks(
+            offers[entry["offer_id"]], found, new_items, entry["cv_hash"],
+            use_cache=use_cache, cv_context=entry.get("cv_context", "raw"),
+        )
+
+    seen = set()
+    for line in _read_jsonl(results_path):
+        entry = manifest.get(line.get("custom_id"))
+        if entry is None:
+            continue
+        seen.add(entry["custom_id"])
+        try:
+            content = _response_content(line)
+            if entry["kind"] == "parse":
+                response = _validate(RequirementItemsResponse, content)
+                requisitos = [item.dict() for item in response.requirements]
+                if requisitos:
+                    get_requirements_cache().set(requirements_cache_key(entry["oferta"]), requisitos)
+                store.save_offer(entry["oferta"], requisitos)
+                counts["parsed"] += 1
+                continue
+            items = _validate(RequirementEvalList, content).items
+            add(entry["offer_id"], CandidateEvaluation(entry["candidate_id"], result=score(entry, items)))
+            counts["evaluated"] += 1
+        except Exception as exc:  # una línea fallida no debe tumbar la ingesta
+            counts["errors"] += 1
+            if entry["kind"] == "check":
+                add(entry["offer_id"], CandidateEvaluation(entry["candidate_id"], error=repr(exc)))
+
+    for entry in local:
+        add(entry["offer_id"], CandidateEvaluation(entry["candidate_id"], result=score(entry, [])))
+        counts["local"] += 1
+
+    counts["missing"] = len(set(manifest) - seen)
+    for offer_id, batch in pending.items():
+        if batch:
+            store.save_evaluations(offer_id, batch)
+    return counts
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluación con la API batch del proveedor (sin llamadas en vivo).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("export", help="Genera el JSONL de peticiones (y su manifiesto).")
+    p.add_argument("oferta")
+    p.add_argument("carpeta_cvs", help="Carpeta de CVs (*.txt) o JSONL de CVs (\"-\" = stdin).")
+    p.add_argument("salida", help="Fichero JSONL de peticiones.")
+    p.add_argument("--model", default=DEFAULT_LLM_MODEL)
+
+    p = sub.add_parser("ingest", help="Ingiere el JSONL de resultados del proveedor.")
+    p.add_argument("resultados")
+    p.add_argument("peticiones", help="Fichero de peticiones exportado (se lee su manifiesto).")
+
+    p = sub.add_parser("fake-process", help="Procesa las peticiones con el LLM simulado (sin red).")
+    p.add_argument("peticiones")
+    p.add_argument("resultados")
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        oferta_texto = Path(args.oferta).read_text(encoding="utf-8")
+        counts = export_batch(oferta_texto, iter_cv_source(args.carpeta_cvs), args.salida, model=args.model)
+        print(json.dumps(counts, ensure_ascii=False))
+        if counts["stage"] == "parse":
+            print("La oferta aún no está parseada: procesa e ingiere este fichero y vuelve a exportar.", file=sys.stderr)
+    elif args.command == "ingest":
+        counts = ingest_batch(args.resultados, manifest_path_for(args.peticiones))
+        print(json.dumps(counts, ensure_ascii=False))
+        print(f"Resultados guardados en {get_results_store().path}", file=sys.stderr)
+    else:
+        from models.fake_llm import process_batch_file
+
+        n = process_batch_file(args.peticiones, args.resultados, error_rate=args.error_rate, seed=args.seed)
+        print(f"{n} peticiones procesadas -> {args.resultados}")
+
+
+if __name__ == "__main__":
+    # Uso: python -m services.batch_api export oferta.txt carpeta_cvs/ peticiones.jsonl
+    #      python -m services.batch_api fake-process peticiones.jsonl resultados.jsonl
+    #      python -m services.batch_api ingest resultados.jsonl peticiones.jsonl
+    main()
@@ -0,0 +1,257 @@
+import asyncio
+import copy
+import json
+import sys
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+from config import BATCH_MAX_CONCURRENCY, CV_DEDUP_ENABLED, CV_DEDUP_MAX_RESULTS, RESULTS_FLUSH_EVERY
+from models.instrumentation import instrumentation_context, record_cache_hit
+from services.requirement_parser import aparse_requirements
+from services.cv_evaluator import aevaluate_cv_against_requirements
+from services.cv_ingest import DuplicateIndex, IngestedCV, ingest_cvs, iter_cv_source, normalize_cv
+from services.results_store import ResultsStore, get_results_store, offer_id_for
+
+
+CVSource = Union[Mapping[str, str], Iterable[str], Iterable[Tuple[str, str]]]
+
+
+@dataclass
+class CandidateEvaluation:
+    # Identificador del candidato (nombre de fichero, id externo o índice)
+    candidate_id: str
+    # Resultado de evaluate_cv_against_requirements (None si hubo error)
+    result: Optional[Dict] = None
+    # Error producido al evaluar este CV (el resto del batch continúa)
+    error: Optional[str] = None
+    # Tiempo de evaluación de este CV, en segundos
+    elapsed: float = 0.0
+    # Si el CV es duplicado (exacto o casi) de otro, el candidato cuya evaluación se reutilizó
+    duplicate_of: Optional[str] = None
+
+
+def _iter_cvs(cvs: CVSource) -> Iterator[Tuple[str, str]]:
+    """
+    Normaliza la entrada a pares (candidate_id, cv_text), con el texto
+    normalizado como en la ingesta (ver normalize_cv).
+    Acepta un dict {id: texto}, una lista de textos o una lista de pares.
+    """
+    if isinstance(cvs, Mapping):
+        yield from ((str(k), normalize_cv(v)) for k, v in cvs.items())
+        return
+
+    for idx, cv in enumerate(cvs):
+        if isinstance(cv, tuple):
+            candidate_id, cv_text = cv
+            yield str(candidate_id), normalize_cv(cv_text)
+        else:
+            yield str(idx), normalize_cv(cv)
+
+
+async def evaluate_many(
+    requisitos: List[Dict],
+    cvs: CVSource,
+    max_concurrency: Optional[int] = None,
+    dedup: bool = CV_DEDUP_ENABLED,
+    dedup_index: Optional[DuplicateIndex] = None,
+    **eval_kwargs,
+) -> AsyncIterator[CandidateEvaluation]:
+    """
+    Evalúa muchos CVs contra los mismos requisitos (ya parseados) en paralelo.
+
+    - Como mucho `max_concurrency` evaluaciones en vuelo a la vez.
+    - Los resultados se devuelven a medida que terminan, no en orden de entrada.
+    - Los CVs se consumen de forma perezosa, así que `cvs` puede ser un generador.
+    - Con `dedup`, un CV duplicado (exacto o casi, ver services/cv_ingest.py)
+      reutiliza la evaluación del primero en lugar de llamar al LLM.
+    """
+    limit = max(1, max_concurrency or BATCH_MAX_CONCURRENCY)
+    if dedup:
+        source: Iterator[IngestedCV] = ingest_cvs(_iter_cvs(cvs), dedup_index)
+    else:
+        source = (IngestedCV(candidate_id, cv_text) for candidate_id, cv_text in _iter_cvs(cvs))
+    results: asyncio.Queue = asyncio.Queue()
+    done = object()
+    # Evaluaciones de los CVs originales (en curso o terminadas) que pueden
+    # reutilizar sus duplicados; acotado a las CV_DEDUP_MAX_RESULTS más recientes
+    evaluations: "OrderedDict[str, asyncio.Future]" = OrderedDict()
+
+    async def reuse(cv: IngestedCV) -> Optional[CandidateEvaluation]:
+        original = evaluations.get(cv.duplicate.original_id)
+        if original is None:
+            return None
+        result = await asyncio.shield(original)
+        if result is None:
+            # El original falló: el duplicado se evalúa por su cuenta
+            return None
+        record_cache_hit(f"cv_duplicate_{cv.duplicate.kind}")
+        return CandidateEvaluation(
+            candidate_id=cv.candidate_id,
+            result=copy.deepcopy(result),
+            duplicate_of=cv.duplicate.original_id,
+        )
+
+    async def evaluate(cv: IngestedCV, future: Optional[asyncio.Future]) -> CandidateEvaluation:
+        try:
+            with instrumentation_context(cv.candidate_id):
+                result = await aevaluate_cv_against_requirements(requisitos, cv.text, **eval_kwargs)
+            item = CandidateEvaluation(candidate_id=cv.candidate_id, result=result)
+        except Exception as exc:  # un CV fallido no debe tumbar el batch
+            item = CandidateEvaluation(candidate_id=cv.candidate_id, error=repr(exc))
+        if future is not None and not future.done():
+            future.set_result(item.result)
+        return item
+
+    async def worker() -> None:
+        # Todos los workers comparten el mismo iterador: cada uno toma el
+        # siguiente CV en cuanto termina el anterior.
+        for cv in source:
+            start = time.perf_counter()
+            item = None
+            future = None
+            if cv.duplicate is not None:
+                item = await reuse(cv)
+            elif dedup:
+                # Se registra antes de cualquier await: un duplicado que llegue
+                # mientras tanto espera a esta evaluación en lugar de repetirla
+                future = evaluations[cv.candidate_id] = asyncio.get_running_loop().create_future()
+                while len(evaluations) > CV_DEDUP_MAX_RESULTS:
+                    evaluations.popitem(last=False)
+            if item is None:
+                item = await evaluate(cv, future)
+            item.elapsed = time.perf_counter() - start
+            await results.put(item)
+
+    async def run_workers() -> None:
+        tasks = [asyncio.create_task(worker()) for _ in range(limit)]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # Si falla la fuente de CVs (o un worker), se paran los demás workers
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await results.put(done)
+
+    runner = asyncio.create_task(run_workers())
+    try:
+        while True:
+            item = await results.get()
+            if item is done:
+                break
+            yield item
+        # Ya se han entregado los resultados terminados: si la fuente de CVs
+        # falló (por ejemplo, una entrada ilegible), el error se propaga aquí
+        await runner
+    finally:
+        if not runner.done():
+            runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+
+
+async def evaluate_offer_many(
+    oferta_texto: str,
+    cvs: CVSource,
+    max_concurrency: Optional[int] = None,
+    **eval_kwargs,
+) -> AsyncIterator[CandidateEvaluation]:
+    """
+    Parsea la oferta una sola vez y evalúa todos los CVs contra ella.
+    """
+    requisitos = await aparse_requirements(oferta_texto)
+    if not requisitos:
+        return
+
+    async for item in evaluate_many(requisitos, cvs, max_concurrency=max_concurrency, **eval_kwargs):
+        yield item
+
+
+async def evaluate_offer_into_store(
+    oferta_texto: str,
+    cvs: CVSource,
+    store: Optional[ResultsStore] = None,
+    max_concurrency: Optional[int] = None,
+    flush_every: int = RESULTS_FLUSH_EVERY,
+    **eval_kwargs,
+) -> AsyncIterator[CandidateEvaluation]:
+    """
+    Como evaluate_offer_many, pero guardando la oferta y los resultados en el
+    almacén de resultados, en escrituras por lotes de `flush_every` candidatos.
+    """
+    store = store or get_results_store()
+    requisitos = await aparse_requirements(oferta_texto)
+    if not requisitos:
+        return
+    offer_id = store.save_offer(oferta_texto, requisitos)
+
+    pending: List[CandidateEvaluation] = []
+    try:
+        async for item in evaluate_many(requisitos, cvs, max_concurrency=max_concurrency, **eval_kwargs):
+            pending.append(item)
+            if len(pending) >= flush_every:
+                store.save_evaluations(offer_id, pending)
+                pending = []
+            yield item
+    finally:
+        # Lo ya evaluado se guarda aunque el consumidor pare antes de tiempo
+        if pending:
+            store.save_evaluations(offer_id, pending)
+
+
+def evaluate_many_sync(
+    requisitos: List[Dict],
+    cvs: CVSource,
+    max_concurrency: Optional[int] = None,
+    **eval_kwargs,
+) -> List[CandidateEvaluation]:
+    """
+    Atajo síncrono de evaluate_many: devuelve todos los resultados en una lista.
+    """
+    async def collect() -> List[CandidateEvaluation]:
+        return [
+            item async for item in evaluate_many(
+                requisitos, cvs, max_concurrency=max_concurrency, **eval_kwargs
+            )
+        ]
+
+    return asyncio.run(collect())
+
+
+async def _main(oferta_path: str, cvs_source: str, max_concurrency: Optional[int]) -> None:
+    oferta_texto = Path(oferta_path).read_text(encoding="utf-8")
+    dedup_index = DuplicateIndex()
+    # Los resultados se imprimen y además quedan en el almacén (RESULTS_DB_PATH)
+    async for item in evaluate_offer_into_store(
+        oferta_texto,
+        iter_cv_source(cvs_source),
+        max_concurrency=max_concurrency,
+        dedup_index=dedup_index,
+    ):
+        print(json.dumps(
+            {
+                "candidate_id": item.candidate_id,
+                "elapsed": round(item.elapsed, 3),
+                "error": item.error,
+                "duplicate_of": item.duplicate_of,
+                "result": item.result,
+            },
+            ensure_ascii=False,
+        ))
+    if CV_DEDUP_ENABLED:
+        print(f"Duplicados reutilizados: {dedup_index.stats['exact']} exactos, "
+              f"{dedup_index.stats['near']} casi duplicados", file=sys.stderr)
+    print(f"Resultados guardados (oferta {offer_id_for(oferta_texto)}) en {get_results_store().path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    # Uso: python -m services.batch_evaluator oferta.txt carpeta_cvs/ [concurrencia]
+    #      python -m services.batch_evaluator oferta.txt cvs.jsonl [concurrencia]   ("-" = JSONL por stdin)
+    if len(sys.argv) < 3:
+        print("Uso: python -m services.batch_evaluator <oferta.txt> <carpeta_cvs | cvs.jsonl | -> [concurrencia]")
+        sys.exit(1)
+
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    asyncio.run(_main(sys.argv[1], sys.argv[2], concurrency))
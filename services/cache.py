@@ -0,0 +1,221 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import unicodedata
+from typing import Any, Dict, Optional
+
+from config import CACHE_DIR, CACHE_EVICT_SLACK, CACHE_TOUCH_BATCH, CACHE_TOUCH_INTERVAL, LLM_PROVIDER
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza un texto para usarlo como clave de caché: forma Unicode NFC
+    y espacios en blanco colapsados, de modo que cambios de formato
+    (saltos de línea, tabulaciones, espacios dobles) no invaliden la caché.
+    """
+    text = unicodedata.normalize("NFC", text or "")
+    return " ".join(text.split())
+
+
+def make_cache_key(*parts: str) -> str:
+    """
+    Clave de caché direccionada por contenido: SHA-256 de las partes.
+    """
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+def model_cache_id(model: str) -> str:
+    """
+    Modelo tal y como entra en las claves de caché. Con un proveedor distinto
+    del real (LLM_PROVIDER=fake) lleva su prefijo: sus respuestas simuladas no
+    se sirven nunca como si fueran del modelo real.
+    """
+    return model if LLM_PROVIDER == "openai" else f"{LLM_PROVIDER}:{model}"
+
+
+def text_hash(text: str) -> str:
+    """
+    Hash estable de un texto (p. ej. un CV) tras normalizarlo.
+    """
+    return make_cache_key(normalize_text(text))
+
+
+class DiskCache:
+    """
+    Caché persistente clave -> valor JSON sobre SQLite, con desalojo LRU
+    aproximado cuando se supera `max_entries`.
+
+    Es segura entre hilos (una conexión protegida por lock) y entre procesos
+    (SQLite gestiona el bloqueo del fichero).
+
+    Para que las lecturas no sean escrituras, un acierto solo renueva el último
+    acceso si tiene más de `touch_interval` segundos, y esas renovaciones se
+    escriben por lotes (con el siguiente set o cada `touch_batch` aciertos).
+    El desalojo se hace por lotes cuando el número de entradas (contado de
+    forma aproximada) pasa de max_entries más un margen (`evict_slack`).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 1024,
+        touch_interval: float = CACHE_TOUCH_INTERVAL,
+        touch_batch: int = CACHE_TOUCH_BATCH,
+        evict_slack: float = CACHE_EVICT_SLACK,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self.touch_batch = max(1, touch_batch)
+        self._evict_margin = max(1, int(max_entries * evict_slack))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Últimos accesos pendientes de escribir: clave -> instante
+        self._touched: Dict[str, float] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        # WAL: varios procesos (p. ej. los workers de services/job_queue.py) leen
+        # mientras otro escribe, sin bloquearse entre sí
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access)"
+        )
+        self._conn.commit()
+        # Número aproximado de entradas: cada set suma uno (aunque reemplace una
+        # clave) y se recuenta de verdad antes de desalojar
+        self._approx_count = self._count()
+        atexit.register(self.flush)
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, last_access FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            now = time.time()
+            if now - row[1] >= self.touch_interval:
+                self._touched[key] = now
+                if len(self._touched) >= self.touch_batch:
+                    self._flush_touches()
+                    self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._touched.pop(key, None)
+            self._flush_touches()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, last_access) VALUES (?, ?, ?)",
+                (key, payload, time.time()),
+            )
+            self._approx_count += 1
+            if self._approx_count > self.max_entries + self._evict_margin:
+                self._evict()
+            self._conn.commit()
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            self._touched.pop(key, None)
+            cur = self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+            self._approx_count = max(0, self._approx_count - cur.rowcount)
+            return cur.rowcount > 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self._approx_count = 0
+
+    def flush(self) -> None:
+        """
+        Escribe los últimos accesos pendientes (se llama también al salir del proceso).
+        """
+        with self._lock:
+            try:
+                if self._touched:
+                    self._flush_touches()
+                    self._conn.commit()
+            except sqlite3.ProgrammingError:
+                # Conexión ya cerrada
+                pass
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._count()
+
+    def _flush_touches(self) -> None:
+        if not self._touched:
+            return
+        self._conn.executemany(
+            "UPDATE entries SET last_access = ? WHERE key = ?",
+            [(ts, key) for key, ts in self._touched.items()],
+        )
+        self._touched.clear()
+
+    def _evict(self) -> None:
+        # Recuento real (otros procesos también escriben) y borrado de las
+        # entradas menos usadas recientemente, en un solo lote, hasta max_entries
+        count = self._count()
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                """
+                DELETE FROM entries WHERE key IN (
+                    SELECT key FROM entries
+                    ORDER BY last_access ASC
+                    LIMIT ?
+                )
+                """,
+                (excess,),
+            )
+            count = self.max_entries
+        self._approx_count = count
+
+
+def cache_path(name: str) -> str:
+    return os.path.join(CACHE_DIR, f"{name}.sqlite3")
+
+
+if __name__ == "__main__":
+    # Uso: python -m services.cache clear <nombre>   (p. ej. "requirements")
+    if len(sys.argv) != 3 or sys.argv[1] != "clear":
+        print("Uso: python -m services.cache clear <nombre>")
+        sys.exit(1)
+
+    path = cache_path(sys.argv[2])
+    if os.path.exists(path):
+        DiskCache(path).clear()
+    print(f"Caché '{sys.argv[2]}' vaciada.")
@@ -1,11 +1,55 @@
-from typing import List, Dict, Any, Optional
+import asyncio
+import contextvars
+import logging
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Iterable, List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass, field 
 
 
-from models.llm_provider import get_llm
-from schemas import interpret_candidate_answer_structured, RequirementMatchResult
+from config import (
+    SUMMARY_EVERY_N_TURNS,
+    SUMMARY_TOKEN_THRESHOLD,
+    SUMMARY_MAX_WORKERS,
+    HISTORY_MAX_ENTRIES,
+    HISTORY_MAX_TOKENS,
+    INTERVIEW_BATCH_SIZE,
+)
+from models.llm_provider import get_chain
+from models.instrumentation import instrumented
+from models.token_counter import count_tokens
+from schemas import (
+    ainterpret_candidate_answer_structured,
+    ainterpret_candidate_answers_structured,
+    interpret_candidate_answer_structured,
+    interpret_candidate_answers_structured,
+    RequirementMatchResult,
+)
+from services.prematcher import tokenize
+from services.requirement_plan import get_plan
+
+# langgraph y langchain_core se importan al construir el grafo / la cadena de
+# resumen, no al importar el módulo: los procesos que no entrevistan no los cargan.
+
+
+@dataclass(slots=True)
+class HistoryTurn:
+    """
+    Un mensaje del historial de corto plazo. Con __slots__ cada registro ocupa
+    lo justo (sin __dict__), y sus tokens se cuentan una sola vez, al guardarlo.
+    """
+    # Número de secuencia en la conversación (no se reutiliza al descartar mensajes)
+    seq: int
+    role: str
+    content: str
+    # Tokens de la línea "role: content" en el texto que se envía a resumir
+    tokens: int = 0
+
 
-from langgraph.graph import StateGraph, END
+def _new_history() -> Deque[HistoryTurn]:
+    return deque(maxlen=HISTORY_MAX_ENTRIES)
 
 
 @dataclass
@@ -14,67 +58,231 @@ class ConversationState:
     pending_requirements: List[str] = field(default_factory=list)
     # Requisitos que el candidato dice cumplir
     additional_fulfilled: List[str] = field(default_factory=list)
-    # Historial de mensajes (corto plazo)
-    history: List[Dict[str, str]] = field(default_factory=list)
+    # Requisitos de grupos obligatorios (la cascada de modelos los confirma con el modelo fuerte)
+    mandatory_requirements: List[str] = field(default_factory=list)
+    # Historial de mensajes (corto plazo): buffer circular acotado, ver _remember / _truncate_history
+    history: Deque[HistoryTurn] = field(default_factory=_new_history)
+    # Número de secuencia del siguiente mensaje (mensajes guardados desde el inicio)
+    history_seq: int = 0
+    # Tokens de los mensajes que siguen en `history` (se mantiene al añadir y descartar)
+    history_tokens: int = 0
     # Resumen de contexto (largo plazo)
     long_term_summary: str = ""
     # Último requisito preguntado
     current_requirement: Optional[str] = None
+    # Modo por lotes: bloques de requisitos relacionados que se preguntan en un mismo turno
+    pending_batches: List[List[str]] = field(default_factory=list)
+    # Requisitos preguntados en el turno actual (uno solo en el modo clásico)
+    current_batch: List[str] = field(default_factory=list)
     # Flag para terminar
     finished: bool = False
     # Última respuesta del candidato (opcional)
     last_candidate_answer: str = ""
+    # Identificador de la sesión (para asociar el resumen en segundo plano)
+    session_id: str = ""
+    # Los mensajes con seq < summarized_upto ya están incorporados (o en curso de incorporarse) al resumen
+    summarized_upto: int = 0
+    # Turnos transcurridos desde el último resumen programado
+    turns_since_summary: int = 0
+    # seq inicial del bloque del historial que se está resumiendo en segundo plano (None si no hay ninguno);
+    # si la sesión se reanuda en otro proceso, ese resumen se ha perdido y el bloque vuelve a quedar pendiente
+    summary_in_flight_from: Optional[int] = None
+
+
+logger = logging.getLogger(__name__)
+
+
+# ==========================
+# MEMORIA DE CORTO PLAZO
+# ==========================
+# El historial es un deque de HistoryTurn con maxlen=HISTORY_MAX_ENTRIES y un
+# contador de tokens que se actualiza al añadir y al descartar mensajes (no se
+# vuelve a unir ni a tokenizar el historial en cada turno). Los mensajes ya
+# resumidos se descartan; si el historial supera HISTORY_MAX_TOKENS, se resume
+# en ese mismo turno. Así la memoria de cada sesión y el prompt del resumen no
+# crecen con el número de requisitos preguntados.
+
+
+def _as_turn(entry: Any, seq: int) -> HistoryTurn:
+    if isinstance(entry, HistoryTurn):
+        return entry
+    # Checkpoints de versiones anteriores (dicts sin seq: seq = posición en la lista)
+    # o tipos no registrados en el serializador del checkpointer
+    role, content = entry["role"], entry["content"]
+    tokens = entry.get("tokens") or count_tokens(f"{role}: {content}") + 1
+    return HistoryTurn(entry.get("seq", seq), role, content, tokens)
+
+
+def _history(state: ConversationState) -> Deque[HistoryTurn]:
+    """
+    Historial de la sesión como buffer circular. Al restaurar un checkpoint
+    llega como deque sin maxlen (o lista): se reconstruye una vez y se recalculan
+    el contador de tokens y el siguiente seq.
+    """
+    history = state.history
+    if isinstance(history, deque) and history.maxlen == HISTORY_MAX_ENTRIES:
+        return history
+    history = deque((_as_turn(e, i) for i, e in enumerate(history)), maxlen=HISTORY_MAX_ENTRIES)
+    state.history = history
+    state.history_tokens = sum(t.tokens for t in history)
+    if history:
+        state.history_seq = max(state.history_seq, history[-1].seq + 1)
+    return history
+
+
+def _summarized_floor(state: ConversationState) -> int:
+    # Por debajo de este seq, el resumen ya incluye los mensajes (no hay resumen en vuelo que pueda fallar)
+    if state.summary_in_flight_from is not None:
+        return min(state.summarized_upto, state.summary_in_flight_from)
+    return state.summarized_upto
+
+
+def _remember(state: ConversationState, role: str, content: str) -> None:
+    history = _history(state)
+    turn = HistoryTurn(state.history_seq, role, content, count_tokens(f"{role}: {content}") + 1)
+    if len(history) == history.maxlen:
+        # El buffer está lleno: el deque descarta el más antiguo al añadir
+        evicted = history[0]
+        state.history_tokens -= evicted.tokens
+        if evicted.seq >= _summarized_floor(state):
+            logger.warning(
+                "Historial lleno en la sesión %s: se descarta un mensaje sin resumir (sube HISTORY_MAX_ENTRIES)",
+                state.session_id,
+            )
+    history.append(turn)
+    state.history_seq += 1
+    state.history_tokens += turn.tokens
+
+
+def _pending_turns(state: ConversationState) -> List[HistoryTurn]:
+    return [t for t in _history(state) if t.seq >= state.summarized_upto]
+
+
+def _truncate_history(state: ConversationState) -> None:
+    """
+    Descarta los mensajes que ya están en el resumen.
+    """
+    history = _history(state)
+    floor = _summarized_floor(state)
+    while history and history[0].seq < floor:
+        state.history_tokens -= history.popleft().tokens
+
+
+def _over_budget(state: ConversationState) -> bool:
+    history = _history(state)
+    # Con el buffer a media capacidad se resume ya: un turno puede añadir varios mensajes
+    # (pregunta, respuesta y una evaluación por requisito del bloque)
+    return state.history_tokens >= HISTORY_MAX_TOKENS or 2 * len(history) >= history.maxlen
+
+
+# Palabras clave para agrupar por tema los requisitos sin grupo lógico
+INTERVIEW_TOPICS: Dict[str, set] = {
+    "formacion": {"grado", "master", "licenciatura", "ingenieria", "titulacion", "doctorado", "fp", "ciclo", "carrera", "universitario"},
+    "idiomas": {"ingles", "frances", "aleman", "italiano", "portugues", "idioma", "idiomas", "b1", "b2", "c1", "c2"},
+    "certificaciones": {"certificacion", "certificado", "certificaciones"},
+    "condiciones": {"carnet", "vehiculo", "disponibilidad", "viajar", "presencial", "remoto", "horario", "incorporacion"},
+}
+
+
+def _interview_topic(requisito: str) -> str:
+    tokens = set(tokenize(requisito))
+    for topic, keywords in INTERVIEW_TOPICS.items():
+        if tokens & keywords:
+            return topic
+    return "experiencia"
+
+
+def group_requirements_for_interview(
+    requisitos: List[str],
+    requirement_dicts: Optional[List[Dict]] = None,
+    max_batch_size: int = INTERVIEW_BATCH_SIZE,
+) -> List[List[str]]:
+    """
+    Agrupa los requisitos a preguntar en bloques de como mucho `max_batch_size`:
+    primero por su `group` lógico de la oferta (si se pasan los dicts de requisitos)
+    y, si no tienen grupo, por tema (formación, idiomas, experiencia, ...).
+    """
+    group_of = {r["texto"]: r.get("group") for r in (requirement_dicts or [])}
+
+    buckets: Dict[str, List[str]] = {}
+    for req in requisitos:
+        key = f"group::{group_of[req]}" if group_of.get(req) else f"topic::{_interview_topic(req)}"
+        buckets.setdefault(key, []).append(req)
+
+    size = max(1, max_batch_size)
+    return [
+        reqs[i:i + size]
+        for reqs in buckets.values()
+        for i in range(0, len(reqs), size)
+    ]
+
 
 def node_select_next_requirement(state: ConversationState) -> ConversationState:
+    if state.pending_batches:
+        state.current_batch = state.pending_batches.pop(0)
+        state.current_requirement = state.current_batch[0]
+        return state
+
     if not state.pending_requirements:
         state.finished = True
         state.current_requirement = None
+        state.current_batch = []
         return state
 
     state.current_requirement = state.pending_requirements.pop(0)
+    state.current_batch = [state.current_requirement]
     return state
 
 
+def _question_for(batch: List[str]) -> str:
+    if len(batch) == 1:
+        return f"¿Tienes experiencia o cumples con este requisito?\n- {batch[0]}"
+    reqs = "\n".join(f"- {r}" for r in batch)
+    return f"¿Tienes experiencia o cumples con estos requisitos? Cuéntanos sobre cada uno.\n{reqs}"
+
+
 def node_ask_candidate(state: ConversationState) -> ConversationState:
     """
-    Pregunta al candidato por el requisito actual (interacción por terminal).
-    Añade el intercambio al historial de corto plazo.
+    Pregunta al candidato por el requisito (o bloque de requisitos) actual.
+    El grafo se detiene aquí (interrupt) hasta que llega la respuesta: por
+    terminal (ask_candidate_about_requirements_with_graph) o desde el gestor de
+    sesiones (services/interview_sessions.py). Añade el intercambio al historial
+    de corto plazo.
     """
     req = state.current_requirement
     if req is None:
         state.finished = True
         return state
 
-    # Saludo solo si es la primera pregunta (historial vacío)
-    if len(state.history) == 0:
-        print("\n--- INICIO DE CONVERSACIÓN CON EL CANDIDATO ---\n")
-        print("Hola, gracias por tu tiempo. Vamos a preguntarte por algunos requisitos específicos.\n")
+    from langgraph.types import interrupt
 
-    print(f"¿Tienes experiencia o cumples con este requisito?\n- {req}")
-    resp = input("Tu respuesta: ")
+    question = _question_for(state.current_batch or [req])
+    # Al reanudar, el nodo se ejecuta de nuevo desde el principio e interrupt devuelve la respuesta
+    resp = interrupt({
+        "question": question,
+        "requirements": list(state.current_batch or [req]),
+        # Saludo solo si es la primera pregunta (aún no hay mensajes)
+        "first": state.history_seq == 0,
+    })
 
     # Guardamos en historial
-    state.history.append(
-        {
-            "role": "agent",
-            "content": f"¿Tienes experiencia o cumples con este requisito?\n- {req}",
-        }
-    )
-    state.history.append(
-        {
-            "role": "candidate",
-            "content": resp,
-        }
-    )
+    _remember(state, "agent", question)
+    _remember(state, "candidate", resp)
 
     # Guardamos temporalmente la última respuesta en el estado
     state.last_candidate_answer = resp  # atributo dinámico
     return state
 
 
+def _mandatory_in(state: ConversationState, batch: List[str]) -> List[str]:
+    mandatory = set(state.mandatory_requirements)
+    return [r for r in batch if r in mandatory]
+
+
 def node_evaluate_answer(state: ConversationState) -> ConversationState:
     """
-    Usa el LLM (structured output) para decidir si el candidato cumple el requisito actual.
+    Usa el LLM (structured output) para decidir si el candidato cumple el
+    requisito actual o, en el modo por lotes, todos los del bloque con una sola llamada.
     """
     req = state.current_requirement
     resp = getattr(state, "last_candidate_answer", "")
@@ -83,32 +291,60 @@ def node_evaluate_answer(state: ConversationState) -> ConversationState:
         state.finished = True
         return state
 
-    # Llamamos a la función estructurada
-    result: RequirementMatchResult = interpret_candidate_answer_structured(req, resp)
+    batch = state.current_batch or [req]
+    if len(batch) == 1:
+        # Llamamos a la función estructurada
+        result: RequirementMatchResult = interpret_candidate_answer_structured(
+            req, resp, req in state.mandatory_requirements
+        )
+        results = [(req, result)]
+    else:
+        items = interpret_candidate_answers_structured(batch, resp, _mandatory_in(state, batch))
+        results = [(item.requisito, item) for item in items]
+    return _record_answer_results(state, results)
 
-    if result.cumple:
-        state.additional_fulfilled.append(req)
 
-    # Podrías guardar la justificación en el historial si quieres
-    state.history.append(
-        {
-            "role": "system",
-            "content": f"Evaluación requisito '{req}': cumple={result.cumple}, justificación={result.justificacion}",
-        }
-    )
+async def anode_evaluate_answer(state: ConversationState) -> ConversationState:
+    """
+    Versión asíncrona de node_evaluate_answer (la usan las sesiones de
+    services/interview_sessions.py: la llamada al LLM no ocupa un hilo).
+    """
+    req = state.current_requirement
+    resp = getattr(state, "last_candidate_answer", "")
 
-    return state
+    if not req:
+        state.finished = True
+        return state
 
+    batch = state.current_batch or [req]
+    if len(batch) == 1:
+        result: RequirementMatchResult = await ainterpret_candidate_answer_structured(
+            req, resp, req in state.mandatory_requirements
+        )
+        results = [(req, result)]
+    else:
+        items = await ainterpret_candidate_answers_structured(batch, resp, _mandatory_in(state, batch))
+        results = [(item.requisito, item) for item in items]
+    return _record_answer_results(state, results)
+
+
+def _record_answer_results(state: ConversationState, results: List[Tuple[str, Any]]) -> ConversationState:
+    for requisito, result in results:
+        if result.cumple:
+            state.additional_fulfilled.append(requisito)
+
+        # Podrías guardar la justificación en el historial si quieres
+        _remember(
+            state,
+            "system",
+            f"Evaluación requisito '{requisito}': cumple={result.cumple}, justificación={result.justificacion}",
+        )
+
+    return state
 
-def node_update_long_term_summary(state: ConversationState) -> ConversationState:
-    """
-    Actualiza la memoria a largo plazo (resumen del contexto) usando el historial reciente
-    + resumen previo si existe.
-    """
-    llm = get_llm(temperature=0.1)
 
-    # Preparamos un pequeño prompt para resumir
-    summary_prompt = """
+# Prompt para resumir la conversación (memoria a largo plazo)
+LONG_TERM_SUMMARY_PROMPT = """
 Eres un asistente que resume el contexto de una conversación con un candidato.
 
 Dispones de:
@@ -128,27 +364,206 @@ Historial reciente:
 Devuelve SOLO el nuevo resumen.
 """
 
-    history_text = "\n".join(
-        [f"{m['role']}: {m['content']}" for m in state.history[-6:]]  # solo últimos turnos
+
+def _build_summary_chain(llm):
+    from langchain_core.prompts import ChatPromptTemplate
+
+    prompt = ChatPromptTemplate.from_messages([("system", LONG_TERM_SUMMARY_PROMPT)])
+    return prompt | llm
+
+
+@instrumented("long_term_summary")
+def _summarize(chain, prev_summary: str, history_text: str) -> str:
+    resp = chain.invoke(
+        {
+            "prev_summary": prev_summary,
+            "history": history_text,
+        }
     )
+    return resp.content.strip()
 
-    messages = [
-        {"role": "system", "content": summary_prompt.format(
-            prev_summary=state.long_term_summary,
-            history=history_text
-        )}
-    ]
 
-    resp = llm.invoke(messages)
-    new_summary = resp.content.strip()
+@instrumented("long_term_summary")
+async def _asummarize(chain, prev_summary: str, history_text: str) -> str:
+    resp = await chain.ainvoke(
+        {
+            "prev_summary": prev_summary,
+            "history": history_text,
+        }
+    )
+    return resp.content.strip()
+
+
+def _history_text(entries: Iterable[HistoryTurn]) -> str:
+    return "\n".join(f"{m.role}: {m.content}" for m in entries)
+
+
+def _summary_chain():
+    # La cadena se compila una vez por proceso, no en cada turno
+    return get_chain("long_term_summary", _build_summary_chain, temperature=0.1)
+
+
+class _SummaryScheduler:
+    """
+    Ejecuta las actualizaciones del resumen en segundo plano, como mucho una
+    en vuelo por sesión. Los Future se guardan aquí (no en el estado del grafo)
+    para que el estado siga siendo serializable.
+    """
+
+    def __init__(self, max_workers: int):
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._jobs: Dict[str, Tuple[Future, int]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, session_id: str, prev_summary: str, history_text: str, start_seq: int) -> bool:
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is not None and not job[0].done():
+                # Ya hay un resumen en curso: se acumulan los turnos para el siguiente
+                return False
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="summary"
+                )
+            # copy_context: el registro de instrumentación conserva el candidato
+            ctx = contextvars.copy_context()
+            future = self._executor.submit(ctx.run, _summarize, _summary_chain(), prev_summary, history_text)
+            self._jobs[session_id] = (future, start_seq)
+            return True
+
+    def has_job(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._jobs
+
+    def collect(self, session_id: str, wait: bool = False) -> Optional[Tuple[Optional[str], int]]:
+        """
+        Devuelve (nuevo resumen o None si falló, seq inicial del bloque resumido)
+        si hay un resultado disponible (o si wait=True y había un resumen en curso).
+        """
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job is None or (not wait and not job[0].done()):
+                return None
+            del self._jobs[session_id]
+
+        future, start_seq = job
+        try:
+            return future.result(), start_seq
+        except Exception as exc:
+            logger.warning("Falló la actualización del resumen de la sesión %s: %r", session_id, exc)
+            return None, start_seq
+
+
+_summary_scheduler = _SummaryScheduler(SUMMARY_MAX_WORKERS)
+
+
+def _apply_summary_result(state: ConversationState, wait: bool = False) -> None:
+    collected = _summary_scheduler.collect(state.session_id, wait=wait)
+    if collected is None:
+        if state.summary_in_flight_from is not None and not _summary_scheduler.has_job(state.session_id):
+            # Resumen lanzado en otro proceso (o antes de un reinicio): se repite más adelante
+            state.summarized_upto = min(state.summarized_upto, state.summary_in_flight_from)
+            state.summary_in_flight_from = None
+        return
+    state.summary_in_flight_from = None
+    summary, start_seq = collected
+    if summary is None:
+        # Si el resumen falló, esos turnos vuelven a quedar pendientes
+        state.summarized_upto = min(state.summarized_upto, start_seq)
+    else:
+        state.long_term_summary = summary
+
+
+def node_update_long_term_summary(state: ConversationState) -> ConversationState:
+    """
+    Actualiza la memoria a largo plazo (resumen del contexto) sin bloquear la
+    siguiente pregunta: el resumen se calcula en segundo plano y se agrupa
+    (cada SUMMARY_EVERY_N_TURNS turnos o cuando el historial pendiente supera
+    SUMMARY_TOKEN_THRESHOLD tokens). El resumen final se hace en node_finalize_summary.
+    Si el historial llega al límite duro (HISTORY_MAX_TOKENS o medio buffer),
+    el resumen se espera en este turno para poder descartar lo resumido.
+    """
+    _apply_summary_result(state)
+
+    if state.finished:
+        _truncate_history(state)
+        return state
+
+    state.turns_since_summary += 1
+    over_budget = _over_budget(state)
+    if over_budget:
+        # Primero el resumen en curso (si lo hay): el siguiente parte de él
+        _apply_summary_result(state, wait=True)
+
+    pending = _pending_turns(state)
+    if pending:
+        due = (
+            over_budget
+            or state.turns_since_summary >= SUMMARY_EVERY_N_TURNS
+            or sum(t.tokens for t in pending) >= SUMMARY_TOKEN_THRESHOLD
+        )
+        if due and _summary_scheduler.submit(
+            state.session_id, state.long_term_summary, _history_text(pending), state.summarized_upto
+        ):
+            state.summary_in_flight_from = state.summarized_upto
+            state.summarized_upto = state.history_seq
+            state.turns_since_summary = 0
+            if over_budget:
+                _apply_summary_result(state, wait=True)
+
+    _truncate_history(state)
+    return state
+
+
+def node_finalize_summary(state: ConversationState) -> ConversationState:
+    """
+    Al terminar la conversación: espera el resumen en curso (si lo hay) e
+    incorpora, en una única llamada, los turnos que aún no estén resumidos.
+    """
+    _apply_summary_result(state, wait=True)
+
+    pending = _pending_turns(state)
+    if pending:
+        state.long_term_summary = _summarize(
+            _summary_chain(), state.long_term_summary, _history_text(pending)
+        )
+        state.summarized_upto = state.history_seq
+        state.turns_since_summary = 0
+
+    _truncate_history(state)
+    return state
+
+
+async def anode_update_long_term_summary(state: ConversationState) -> ConversationState:
+    # Solo puede bloquear (esperar un resumen) al llegar al límite duro del historial;
+    # en ese caso se espera en un hilo, sin parar el bucle de eventos
+    if _over_budget(state):
+        return await asyncio.to_thread(node_update_long_term_summary, state)
+    return node_update_long_term_summary(state)
+
+
+async def anode_finalize_summary(state: ConversationState) -> ConversationState:
+    if _summary_scheduler.has_job(state.session_id):
+        await asyncio.to_thread(_apply_summary_result, state, True)
+    else:
+        _apply_summary_result(state)
+
+    pending = _pending_turns(state)
+    if pending:
+        state.long_term_summary = await _asummarize(
+            _summary_chain(), state.long_term_summary, _history_text(pending)
+        )
+        state.summarized_upto = state.history_seq
+        state.turns_since_summary = 0
 
-    state.long_term_summary = new_summary
+    _truncate_history(state)
     return state
 
 
 def should_continue(state: ConversationState) -> str:
     if state.finished:
-        return END
+        return "finish"
     return "loop"
 
 # ==========================
@@ -156,14 +571,41 @@ def should_continue(state: ConversationState) -> str:
 # ==========================
 
 
-def build_conversation_graph():
+def checkpoint_serde():
+    """
+    Serializador de checkpoints con HistoryTurn registrado (el resto de tipos
+    del estado son los básicos que langgraph ya admite).
+    """
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+    return JsonPlusSerializer(allowed_msgpack_modules=[HistoryTurn])
+
+
+def build_conversation_graph(checkpointer=None):
+    """
+    Compila el grafo de la entrevista. Necesita un checkpointer (el estado se
+    guarda en cada interrupción, mientras se espera la respuesta del candidato);
+    conviene crearlo con serde=checkpoint_serde().
+    """
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.checkpoint.memory import InMemorySaver
+    from langgraph.graph import StateGraph, END
+
+    def node(func, afunc=None):
+        # invoke usa la versión síncrona y ainvoke la asíncrona; los nodos sin
+        # versión asíncrona no bloquean (no llaman al LLM) y se ejecutan en el propio bucle
+        async def run_inline(state):
+            return func(state)
+        return RunnableLambda(func, afunc=afunc or run_inline, name=func.__name__)
+
     graph = StateGraph(ConversationState)
 
     # Nodos
-    graph.add_node("select_next_requirement", node_select_next_requirement)
-    graph.add_node("ask_candidate", node_ask_candidate)
-    graph.add_node("evaluate_answer", node_evaluate_answer)
-    graph.add_node("update_long_term_summary", node_update_long_term_summary)
+    graph.add_node("select_next_requirement", node(node_select_next_requirement))
+    graph.add_node("ask_candidate", node(node_ask_candidate))
+    graph.add_node("evaluate_answer", node(node_evaluate_answer, anode_evaluate_answer))
+    graph.add_node("update_long_term_summary", node(node_update_long_term_summary, anode_update_long_term_summary))
+    graph.add_node("finalize_summary", node(node_finalize_summary, anode_finalize_summary))
 
     # Flujo básico
     graph.set_entry_point("select_next_requirement")
@@ -177,34 +619,105 @@ def build_conversation_graph():
         should_continue,
         {
             "loop": "select_next_requirement",
-            END: END,
+            "finish": "finalize_summary",
         }
     )
+    graph.add_edge("finalize_summary", END)
 
-    # Checkpointing de memoria (opcional pero útil)
-    app = graph.compile()
+    # El checkpointer guarda el estado entre preguntas (en memoria, SQLite, ...)
+    app = graph.compile(checkpointer=checkpointer or InMemorySaver(serde=checkpoint_serde()))
 
     return app
 
+
+_graph_app = None
+_graph_lock = threading.Lock()
+
+
+def get_conversation_graph():
+    """
+    Grafo de la entrevista con checkpointer en memoria, compilado una sola vez
+    por proceso (cada entrevista es un thread_id distinto dentro del mismo grafo).
+    """
+    global _graph_app
+    with _graph_lock:
+        if _graph_app is None:
+            _graph_app = build_conversation_graph()
+        return _graph_app
+
+
+def initial_conversation_state(
+    not_found_requirements: List[str],
+    initial_long_term_summary: str = "",
+    requirement_dicts: Optional[List[Dict]] = None,
+    batch_size: int = 1,
+    session_id: Optional[str] = None,
+) -> ConversationState:
+    batches: List[List[str]] = []
+    if batch_size > 1:
+        batches = group_requirements_for_interview(
+            not_found_requirements, requirement_dicts, max_batch_size=batch_size
+        )
+
+    mandatory: List[str] = []
+    if requirement_dicts:
+        plan = get_plan(requirement_dicts)
+        mandatory = [
+            texto
+            for members, is_mandatory in zip(plan.group_members, plan.group_mandatory)
+            if is_mandatory
+            for texto in members
+            if texto in not_found_requirements
+        ]
+
+    return ConversationState(
+        pending_requirements=[] if batches else list(not_found_requirements),
+        pending_batches=batches,
+        additional_fulfilled=[],
+        mandatory_requirements=mandatory,
+        long_term_summary=initial_long_term_summary,
+        current_requirement=None,
+        finished=False,
+        session_id=session_id or uuid.uuid4().hex,
+    )
+
+
 def ask_candidate_about_requirements_with_graph(
     not_found_requirements: List[str],
     initial_long_term_summary: str = "",
+    requirement_dicts: Optional[List[Dict]] = None,
+    batch_size: int = 1,
 ) -> List[str]:
+    """
+    Entrevista al candidato por los requisitos no encontrados y devuelve los
+    que dice cumplir. Con batch_size > 1 se pregunta por bloques de requisitos
+    relacionados (mismo grupo lógico o tema) en un único turno.
+    """
     if not not_found_requirements:
         return []
 
-    app = build_conversation_graph()
+    from langgraph.types import Command
 
-    init_state = ConversationState(
-        pending_requirements=list(not_found_requirements),
-        additional_fulfilled=[],
-        history=[],
-        long_term_summary=initial_long_term_summary,
-        current_requirement=None,
-        finished=False,
+    app = get_conversation_graph()
+    init_state = initial_conversation_state(
+        not_found_requirements, initial_long_term_summary, requirement_dicts, batch_size
     )
-
-    final_state = app.invoke(init_state)
+    config = {"configurable": {"thread_id": init_state.session_id}}
+
+    # Cada ejecución avanza hasta la siguiente pregunta (interrupt); la respuesta se pide por terminal
+    try:
+        final_state = app.invoke(init_state, config=config)
+        while "__interrupt__" in final_state:
+            prompt = final_state["__interrupt__"][0].value
+            if prompt["first"]:
+                print("\n--- INICIO DE CONVERSACIÓN CON EL CANDIDATO ---\n")
+                print("Hola, gracias por tu tiempo. Vamos a preguntarte por algunos requisitos específicos.\n")
+            print(prompt["question"])
+            resp = input("Tu respuesta: ")
+            final_state = app.invoke(Command(resume=resp), config=config)
+    finally:
+        # El grafo es compartido: los checkpoints de esta entrevista no se quedan en memoria
+        app.checkpointer.delete_thread(init_state.session_id)
 
    
     print("\nGracias, hemos registrado tus respuestas.\n")
@@ -1,7 +1,66 @@
-from typing import List, Dict, Tuple
-from langchain_core.prompts import ChatPromptTemplate
-from models.llm_provider import get_llm
-from schemas import check_requirement_structured, RequirementEvalItem
+import logging
+from typing import Iterable, List, Dict, Sequence, Tuple, Optional
+from config import (
+    CV_CONTEXT_MODE,
+    EVAL_CACHE_MAX_ENTRIES,
+    PREMATCH_ENABLED,
+    RECONCILE_MAX_REASKS,
+    REQUIREMENT_CANON_ENABLED,
+    RETRIEVAL_ENABLED,
+)
+from models.instrumentation import record_cache_hit
+from schemas import (
+    check_requirement_structured,
+    acheck_requirement_structured,
+    reconcile_items,
+    verdict_model,
+    RequirementEvalItem,
+    MATCH_REQUIREMENT_PROMPT_VERSION,
+)
+from services.cache import DiskCache, cache_path, make_cache_key, model_cache_id, normalize_text, text_hash
+from services.prematcher import get_prematcher
+from services.cv_retrieval import build_cv_context
+from services.cv_profile import aprofile_context, profile_context
+from services.requirement_plan import get_plan
+from services.requirement_canon import canonical_id, equivalent_texts, suggest_aliases, unique_requirements
+
+
+logger = logging.getLogger(__name__)
+
+# Contexto de caché de los veredictos obtenidos con secciones recuperadas del CV
+RETRIEVED_CONTEXT = "retrieved"
+
+_eval_cache: Optional[DiskCache] = None
+
+
+def get_eval_cache() -> DiskCache:
+    """
+    Caché en disco de veredictos individuales (CV, requisito) -> RequirementEvalItem.
+    """
+    global _eval_cache
+    if _eval_cache is None:
+        _eval_cache = DiskCache(cache_path("requirement_evals"), max_entries=EVAL_CACHE_MAX_ENTRIES)
+    return _eval_cache
+
+
+def eval_cache_key(cv_hash: str, requisito: str, model: Optional[str] = None, cv_context: str = "raw") -> str:
+    """
+    Clave = hash(CV, requisito canónico (ver services/requirement_canon.py; con
+    REQUIREMENT_CANON_ENABLED=false, el texto normalizado), proveedor y modelo, versión del
+    prompt y, si no es el CV completo, el contexto enviado: secciones recuperadas
+    ("retrieved"), perfil o perfil + fragmentos).
+    Por defecto el modelo es el que produce los veredictos (con la cascada
+    activa, la combinación barato / fuerte y su umbral).
+    """
+    parts = [
+        cv_hash,
+        canonical_id(requisito) if REQUIREMENT_CANON_ENABLED else normalize_text(requisito).casefold(),
+        model_cache_id(model or verdict_model("check_requirements")),
+        MATCH_REQUIREMENT_PROMPT_VERSION,
+    ]
+    if cv_context != "raw":
+        parts.append(cv_context)
+    return make_cache_key(*parts)
 
 def check_requirement_against_cv(requisito: str, cv_text: str) -> bool:
     result = check_requirement_structured(requisito, cv_text)
@@ -9,102 +68,414 @@ def check_requirement_against_cv(requisito: str, cv_text: str) -> bool:
     return result.cumple
 
 
+def _empty_evaluation() -> Dict:
+    return {
+        "score": 0.0,
+        "discarded": False,
+        "matching_requirements": [],
+        "unmatching_requirements": [],
+        "not_found_requirements": [],
+    }
+
+
+def _cache_contexts(cv_context: str, retrieve: bool) -> List[str]:
+    # Un veredicto con el CV completo vale también cuando se recuperarían
+    # secciones; uno con secciones recortadas solo vale para otra recuperación
+    if cv_context == "raw" and retrieve:
+        return ["raw", RETRIEVED_CONTEXT]
+    return [cv_context]
+
+
+def _lookup_cached_evals(
+    textos: List[str],
+    cv_hash: str,
+    contexts: Sequence[str] = ("raw",),
+) -> Tuple[Dict[str, RequirementEvalItem], List[str]]:
+    """
+    Separa los requisitos en los que ya tienen veredicto en caché (con alguno
+    de `contexts`, por orden) y los que hay que mandar al LLM (uno por
+    requisito canónico, en el orden original).
+    """
+    cache = get_eval_cache()
+    found: Dict[str, RequirementEvalItem] = {}
+    missing: List[str] = []
+    for texto in unique_requirements(textos):
+        cached = None
+        for cv_context in contexts:
+            cached = cache.get(eval_cache_key(cv_hash, texto, cv_context=cv_context))
+            if cached is not None:
+                break
+        if cached is None:
+            missing.append(texto)
+        else:
+            # El veredicto se reutiliza con el texto tal y como se pide ahora
+            cached["requisito"] = texto
+            found[texto] = RequirementEvalItem(**cached)
+    record_cache_hit("check_requirements", n=len(found))
+    return found, missing
+
+
+def _prepare_checks(
+    textos: List[str],
+    cv_text: str,
+    use_cache: bool,
+    prematch: bool,
+    cv_context: str = "raw",
+    retrieve: bool = False,
+) -> Tuple[str, Dict[str, RequirementEvalItem], List[str]]:
+    """
+    Resuelve todo lo posible sin LLM (caché y pre-matcher local) y devuelve
+    (hash del CV, veredictos resueltos, requisitos pendientes para el LLM).
+    """
+    cv_hash = text_hash(cv_text)
+    if use_cache:
+        found, pending = _lookup_cached_evals(textos, cv_hash, _cache_contexts(cv_context, retrieve))
+    else:
+        found, pending = {}, unique_requirements(textos)
+
+    if prematch and pending:
+        local, pending = get_prematcher().split(pending, cv_text)
+        found.update(local)
+
+    return cv_hash, found, pending
+
+
+def _merge_evals(
+    textos: List[str],
+    found: Dict[str, RequirementEvalItem],
+    new_items: List[RequirementEvalItem],
+    cv_hash: str,
+    use_cache: bool = True,
+    cv_context: str = "raw",
+) -> List[RequirementEvalItem]:
+    """
+    Guarda en caché los veredictos nuevos del LLM y devuelve todos en el orden de `textos`.
+    Los textos equivalentes a uno ya evaluado (mismo requisito canónico)
+    reciben una copia de su veredicto.
+    """
+    cache = get_eval_cache() if use_cache else None
+    for item in new_items:
+        if item.requisito in textos and item.requisito not in found:
+            if cache is not None:
+                cache.set(eval_cache_key(cv_hash, item.requisito, cv_context=cv_context), item.dict())
+            found[item.requisito] = item
+
+    by_id = {canonical_id(texto): item for texto, item in found.items()}
+    merged = []
+    seen = set()
+    for texto in textos:
+        if texto in seen:
+            continue
+        item = found.get(texto)
+        if item is None:
+            item = by_id.get(canonical_id(texto))
+            if item is None:
+                continue
+            item = RequirementEvalItem(**{**item.dict(), "requisito": texto})
+        seen.add(texto)
+        merged.append(item)
+    return merged
+
+
+def _llm_cv_text(pending: List[str], cv_text: str, retrieve: bool) -> Tuple[str, str]:
+    """
+    (texto del CV que se envía al LLM, contexto con el que se guardan sus
+    veredictos en caché). Con retrieve=True solo se envían las secciones del
+    CV relevantes para los pendientes: un "no cumple" visto sobre un CV
+    recortado no vale para una evaluación con el CV completo.
+    """
+    if not retrieve:
+        return cv_text, "raw"
+    result = build_cv_context(pending, cv_text)
+    return result.text, "raw" if result.fallback else RETRIEVED_CONTEXT
+
+
+def _llm_context(pending: List[str], cv_text: str, retrieve: bool, cv_context: str) -> Tuple[str, str]:
+    # Con un perfil (services/cv_profile.py) se envía el perfil en lugar del CV
+    if cv_context == "raw":
+        return _llm_cv_text(pending, cv_text, retrieve)
+    return profile_context(pending, cv_text, cv_context), cv_context
+
+
+async def _allm_context(pending: List[str], cv_text: str, retrieve: bool, cv_context: str) -> Tuple[str, str]:
+    if cv_context == "raw":
+        return _llm_cv_text(pending, cv_text, retrieve)
+    return await aprofile_context(pending, cv_text, cv_context), cv_context
+
+
+def _log_unanswered(missing: List[str]) -> None:
+    if missing:
+        logger.warning(
+            "El LLM no devolvió veredicto para %d requisito(s) tras %d re-pregunta(s); cuentan como no cumplidos: %s",
+            len(missing), RECONCILE_MAX_REASKS, missing,
+        )
+
+
+def _ask_llm(
+    pending: List[str],
+    cv_text: str,
+    retrieve: bool,
+    mandatory: Iterable[str],
+    cv_context: str = "raw",
+) -> Tuple[List[RequirementEvalItem], str]:
+    """
+    Pide al LLM los veredictos de `pending` y concilia la respuesta con los
+    requisitos pedidos; si faltan algunos, re-pregunta solo por esos.
+    Devuelve (veredictos, contexto con el que guardarlos en caché).
+    """
+    mandatory = list(mandatory)
+    renames: Dict[str, str] = {}
+    context, sent = _llm_context(pending, cv_text, retrieve, cv_context)
+    items = check_requirement_structured(pending, context, mandatory)
+    matched, missing = reconcile_items(pending, items, renames=renames)
+    for _ in range(RECONCILE_MAX_REASKS):
+        if not missing:
+            break
+        context, resent = _llm_context(missing, cv_text, retrieve, cv_context)
+        if resent == RETRIEVED_CONTEXT:
+            sent = resent
+        items = check_requirement_structured(missing, context, mandatory)
+        found, missing = reconcile_items(missing, items, renames=renames)
+        matched.update(found)
+    _log_unanswered(missing)
+    # Las reformulaciones del LLM se sugieren como alias (no se aprenden solas)
+    suggest_aliases(renames)
+    return list(matched.values()), sent
+
+
+async def _aask_llm(
+    pending: List[str],
+    cv_text: str,
+    retrieve: bool,
+    mandatory: Iterable[str],
+    cv_context: str = "raw",
+) -> Tuple[List[RequirementEvalItem], str]:
+    mandatory = list(mandatory)
+    renames: Dict[str, str] = {}
+    context, sent = await _allm_context(pending, cv_text, retrieve, cv_context)
+    items = await acheck_requirement_structured(pending, context, mandatory)
+    matched, missing = reconcile_items(pending, items, renames=renames)
+    for _ in range(RECONCILE_MAX_REASKS):
+        if not missing:
+            break
+        context, resent = await _allm_context(missing, cv_text, retrieve, cv_context)
+        if resent == RETRIEVED_CONTEXT:
+            sent = resent
+        items = await acheck_requirement_structured(missing, context, mandatory)
+        found, missing = reconcile_items(missing, items, renames=renames)
+        matched.update(found)
+    _log_unanswered(missing)
+    suggest_aliases(renames)
+    return list(matched.values()), sent
+
+
+def check_requirements(
+    textos: List[str],
+    cv_text: str,
+    use_cache: bool = True,
+    prematch: bool = PREMATCH_ENABLED,
+    retrieve: bool = RETRIEVAL_ENABLED,
+    mandatory: Iterable[str] = (),
+    cv_context: str = CV_CONTEXT_MODE,
+) -> List[RequirementEvalItem]:
+    """
+    Evalúa los requisitos contra el CV por niveles:
+      1. veredictos en caché,
+      2. pre-matcher local (requisitos evidentes, sin LLM),
+      3. LLM, solo para los requisitos que quedan pendientes (y, con
+         retrieve=True, solo con las secciones relevantes del CV); los que
+         el LLM omita se vuelven a preguntar solos (RECONCILE_MAX_REASKS).
+    `mandatory` son los textos obligatorios (los usa la cascada de modelos).
+    `cv_context` decide qué se envía como CV: "raw", "profile" o "profile+snippets"
+    (ver services/cv_profile.py).
+    """
+    cv_hash, found, pending = _prepare_checks(textos, cv_text, use_cache, prematch, cv_context, retrieve)
+    new_items, sent = [], cv_context
+    if pending:
+        new_items, sent = _ask_llm(pending, cv_text, retrieve, mandatory, cv_context)
+    return _merge_evals(textos, found, new_items, cv_hash, use_cache=use_cache, cv_context=sent)
+
+
+async def acheck_requirements(
+    textos: List[str],
+    cv_text: str,
+    use_cache: bool = True,
+    prematch: bool = PREMATCH_ENABLED,
+    retrieve: bool = RETRIEVAL_ENABLED,
+    mandatory: Iterable[str] = (),
+    cv_context: str = CV_CONTEXT_MODE,
+) -> List[RequirementEvalItem]:
+    cv_hash, found, pending = _prepare_checks(textos, cv_text, use_cache, prematch, cv_context, retrieve)
+    new_items, sent = [], cv_context
+    if pending:
+        new_items, sent = await _aask_llm(pending, cv_text, retrieve, mandatory, cv_context)
+    return _merge_evals(textos, found, new_items, cv_hash, use_cache=use_cache, cv_context=sent)
+
+
+def prepare_deferred_checks(
+    textos: List[str],
+    cv_text: str,
+    use_cache: bool = True,
+    prematch: bool = PREMATCH_ENABLED,
+    retrieve: bool = RETRIEVAL_ENABLED,
+) -> Tuple[str, Dict[str, RequirementEvalItem], List[str], str, str]:
+    """
+    Primera mitad de check_requirements para cuando la llamada al LLM se hace
+    fuera de este proceso (API batch): devuelve (hash del CV, veredictos ya
+    resueltos, requisitos pendientes, texto del CV que hay que enviar y
+    contexto con el que guardar los veredictos, que se pasa a
+    complete_deferred_checks).
+    """
+    cv_hash, found, pending = _prepare_checks(textos, cv_text, use_cache, prematch, retrieve=retrieve)
+    llm_cv, cv_context = _llm_cv_text(pending, cv_text, retrieve) if pending else ("", "raw")
+    return cv_hash, found, pending, llm_cv, cv_context
+
+
+def complete_deferred_checks(
+    requisitos: List[Dict],
+    found: Dict[str, RequirementEvalItem],
+    new_items: List[RequirementEvalItem],
+    cv_hash: str,
+    use_cache: bool = True,
+    cv_context: str = "raw",
+) -> Dict:
+    """
+    Segunda mitad: junta los veredictos resueltos en local con los que llegan
+    del LLM (guardándolos en caché) y puntúa como evaluate_cv_against_requirements.
+    Los items se concilian con los requisitos pendientes; los que falten no
+    se guardan en caché (un nuevo export los vuelve a pedir).
+    """
+    textos = [r["texto"] for r in requisitos]
+    renames: Dict[str, str] = {}
+    matched, _ = reconcile_items(unique_requirements(t for t in textos if t not in found), new_items, renames=renames)
+    suggest_aliases(renames)
+    new_items = list(matched.values())
+    merged = _merge_evals(textos, dict(found), new_items, cv_hash, use_cache=use_cache, cv_context=cv_context)
+    return _score_requirements(requisitos, merged)
+
+
+def _split_mandatory(requisitos: List[Dict]) -> Tuple[List[str], List[str]]:
+    """
+    Separa los textos de los requisitos según el tipo de su grupo lógico
+    (el tipo de un grupo es el de su primer requisito, como en _score_requirements).
+    Los requisitos de un grupo obligatorio van juntos para respetar la semántica OR.
+    """
+    group_tipo: Dict[str, str] = {}
+    mandatory: List[str] = []
+    optional: List[str] = []
+    for r in requisitos:
+        texto = r["texto"]
+        gid = r.get("group") or f"__single__::{texto}"
+        tipo = group_tipo.setdefault(gid, r.get("tipo", "obligatorio"))
+        if tipo == "obligatorio":
+            mandatory.append(texto)
+        else:
+            optional.append(texto)
+    return mandatory, optional
+
+
+def _short_circuit_result(
+    requisitos: List[Dict],
+    eval_items: List[RequirementEvalItem],
+    skipped: List[str],
+) -> Dict:
+    """
+    Resultado de un candidato descartado en la primera fase: los opcionales no
+    evaluados se informan aparte, no como "no encontrados".
+    """
+    result = _score_requirements(requisitos, eval_items)
+    skipped_set = set(skipped)
+    result["not_found_requirements"] = [
+        t for t in result["not_found_requirements"] if t not in skipped_set
+    ]
+    result["skipped_requirements"] = skipped
+    return result
+
+
 def evaluate_cv_against_requirements(
     requisitos: List[Dict],   # [{"texto":..., "tipo":..., "group":..., "operator":...}, ...]
     cv_text: str,
+    short_circuit: bool = False,
+    **check_kwargs,
 ) -> Dict:
+    """
+    Evalúa el CV contra los requisitos y aplica grupos, descarte y puntuación.
+
+    Con short_circuit=True se evalúa en dos fases: primero los grupos
+    obligatorios y, solo si el candidato no queda descartado, los opcionales.
+    `check_kwargs` son las opciones de check_requirements (use_cache, prematch, ...).
+    """
     if not requisitos:
-        return {
-            "score": 0.0,
-            "discarded": False,
-            "matching_requirements": [],
-            "unmatching_requirements": [],
-            "not_found_requirements": [],
-        }
+        return _empty_evaluation()
+
+    mandatory, optional = _split_mandatory(requisitos)
+    check_kwargs.setdefault("mandatory", mandatory)
+    if short_circuit:
+        if mandatory and optional:
+            eval_items = check_requirements(mandatory, cv_text, **check_kwargs)
+            if _score_requirements(_requisitos_subset(requisitos, mandatory), eval_items)["discarded"]:
+                return _short_circuit_result(requisitos, eval_items, optional)
+            eval_items += check_requirements(optional, cv_text, **check_kwargs)
+            return _score_requirements(requisitos, eval_items)
 
     textos = [r["texto"] for r in requisitos]
 
     
-    eval_items: List[RequirementEvalItem] = check_requirement_structured(textos, cv_text)
+    eval_items: List[RequirementEvalItem] = check_requirements(textos, cv_text, **check_kwargs)
 
-    cumple_map = {item.requisito: item.cumple for item in eval_items}
+    return _score_requirements(requisitos, eval_items)
 
-    
-    groups: Dict[str, Dict] = {}
-    for r in requisitos:
-        texto = r["texto"]
-        tipo = r.get("tipo", "obligatorio")
-        group = r.get("group")  # puede ser None
-        operator = r.get("operator", "AND")  # por defecto
-
-        cumple = bool(cumple_map.get(texto, False))
-
-        if group is None:
-            # tratamos cada uno como grupo unitario
-            gid = f"__single__::{texto}"
-            groups[gid] = {
-                "tipo": tipo,
-                "operator": "AND",
-                "requirements": [
-                    {"texto": texto, "cumple": cumple}
-                ],
-            }
-        else:
-            if group not in groups:
-                groups[group] = {
-                    "tipo": tipo,
-                    "operator": operator,
-                    "requirements": [],
-                }
-            groups[group]["requirements"].append(
-                {"texto": texto, "cumple": cumple}
-            )
-
-    matching = []
-    unmatching = []
-    not_found = []
-
-    descartado = False
-
-    # 3) Evaluar cada grupo según su operador
-    for gid, gdata in groups.items():
-        tipo = gdata["tipo"]          
-        operator = gdata["operator"]  
-        reqs = gdata["requirements"]  
-
-        if operator == "OR":
-            group_cumple = any(r["cumple"] for r in reqs)
-        else:  # AND o por defecto
-            group_cumple = all(r["cumple"] for r in reqs)
-
-        # Distribuimos matching / unmatching / not_found a nivel de requisito
-        if group_cumple:
-            for r in reqs:
-                matching.append(r["texto"])
-        else:
-            # el grupo no se cumple
-            if tipo == "obligatorio":
-                descartado = True
-                for r in reqs:
-                    unmatching.append(r["texto"])
-            else:
-                for r in reqs:
-                    not_found.append(r["texto"])
-
-    total_requisitos = len(requisitos)
-    num_cumplidos = len(set(matching))  # por si algún texto se repite
-
-    score = (num_cumplidos / total_requisitos) * 100.0 if total_requisitos > 0 else 0.0
-    if descartado:
-        score = 0.0
 
-    return {
-        "score": round(score, 2),
-        "discarded": descartado,
-        "matching_requirements": matching,
-        "unmatching_requirements": unmatching,
-        "not_found_requirements": not_found,
-    }
+async def aevaluate_cv_against_requirements(
+    requisitos: List[Dict],
+    cv_text: str,
+    short_circuit: bool = False,
+    **check_kwargs,
+) -> Dict:
+    """
+    Versión asíncrona de evaluate_cv_against_requirements: misma lógica de
+    grupos y descarte, pero la llamada al LLM se hace con ainvoke.
+    """
+    if not requisitos:
+        return _empty_evaluation()
+
+    mandatory, optional = _split_mandatory(requisitos)
+    check_kwargs.setdefault("mandatory", mandatory)
+    if short_circuit:
+        if mandatory and optional:
+            eval_items = await acheck_requirements(mandatory, cv_text, **check_kwargs)
+            if _score_requirements(_requisitos_subset(requisitos, mandatory), eval_items)["discarded"]:
+                return _short_circuit_result(requisitos, eval_items, optional)
+            eval_items += await acheck_requirements(optional, cv_text, **check_kwargs)
+            return _score_requirements(requisitos, eval_items)
+
+    textos = [r["texto"] for r in requisitos]
+    eval_items: List[RequirementEvalItem] = await acheck_requirements(textos, cv_text, **check_kwargs)
+
+    return _score_requirements(requisitos, eval_items)
+
+
+def _requisitos_subset(requisitos: List[Dict], textos: List[str]) -> List[Dict]:
+    """
+    Filtra los requisitos cuyo texto está en `textos` (manteniendo el orden).
+    """
+    wanted = set(textos)
+    return [r for r in requisitos if r["texto"] in wanted]
+
+
+def _score_requirements(
+    requisitos: List[Dict],
+    eval_items: List[RequirementEvalItem],
+) -> Dict:
+    """
+    Aplica la lógica de grupos (AND / OR), descarte y puntuación a partir
+    de las evaluaciones individuales devueltas por el LLM, con el plan
+    compilado de la oferta (ver services/requirement_plan.py).
+    """
+    result = get_plan(requisitos).evaluate({item.requisito: item.cumple for item in eval_items})
+    result["justifications"] = {item.requisito: item.justificacion for item in eval_items}
+    return result
+
 
 def reevaluate_with_additional_info(
     requisitos: List[Dict],
@@ -118,35 +489,23 @@ def reevaluate_with_additional_info(
     - requisitos: lista completa de requisitos
     - initial_matching: requisitos cumplidos detectados en el CV
     - additional_fulfilled: requisitos que el candidato dice cumplir en la conversación
+
+    Usa el mismo plan que la evaluación inicial, así que respeta los grupos
+    OR (basta con cumplir una de las alternativas de un grupo obligatorio).
     """
-    total_requisitos = len(requisitos)
-    if total_requisitos == 0:
+    if not requisitos:
         return {"score": 0.0, "discarded": False}
 
     # un requisito cuenta como cumplido si:
     #   - estaba en initial_matching, o
     #   - el candidato ha dicho en conversación que lo cumple
+    # (o si es equivalente a uno de ellos, aunque la oferta lo redacte distinto)
     all_matching = set(initial_matching) | set(additional_fulfilled)
-
-    # si no cumple algún obligatorio (ni en CV ni en conversación) => descartado
-    descartado = False
-    for r in requisitos:
-        texto = r["texto"]
-        tipo = r.get("tipo", "obligatorio")
-        if tipo == "obligatorio" and texto not in all_matching:
-            descartado = True
-            break
-
-    num_cumplidos = len(
-        [r for r in requisitos if r["texto"] in all_matching]
-    )
-    score = (num_cumplidos / total_requisitos) * 100.0
-
-    if descartado:
-        score = 0.0
+    all_matching |= equivalent_texts((r["texto"] for r in requisitos), all_matching)
+    result = get_plan(requisitos).evaluate(all_matching)
 
     return {
-        "score": round(score, 2),
-        "discarded": descartado,
-        "matching_requirements": list(all_matching),
+        "score": result["score"],
+        "discarded": result["discarded"],
+        "matching_requirements": result["matching_requirements"],
     }
@@ -0,0 +1,332 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from config import (
+    CV_DEDUP_MAX_ENTRIES,
+    CV_MINHASH_BANDS,
+    CV_MINHASH_PERMUTATIONS,
+    CV_NEAR_DUP_THRESHOLD,
+    CV_SHINGLE_SIZE,
+)
+from services.cache import text_hash
+
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# INGESTA DE CVs EN STREAMING + DETECCIÓN DE DUPLICADOS
+# ==========================
+# Los CVs se leen de uno en uno (carpeta de .txt o JSONL, también por stdin),
+# con la codificación y los espacios normalizados, sin cargar el lote entero.
+#
+# Muchos candidatos envían el mismo CV, o versiones con retoques mínimos:
+#   - duplicado exacto: mismo hash del texto normalizado,
+#   - casi duplicado: similitud de Jaccard de los shingles (grupos de
+#     CV_SHINGLE_SIZE palabras) >= CV_NEAR_DUP_THRESHOLD, estimada con MinHash.
+# Los candidatos a casi duplicado se buscan con LSH (bandas de la firma
+# MinHash): solo se comparan los CVs que coinciden en alguna banda.
+# El índice recuerda como mucho CV_DEDUP_MAX_ENTRIES CVs distintos, así que la
+# memoria no crece con el tamaño del lote.
+
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+_WORD = re.compile(r"\w+")
+
+
+def decode_cv(data: bytes) -> str:
+    """
+    Bytes de un CV -> texto: UTF-8 (con o sin BOM) y, si no lo es, Windows-1252 / Latin-1.
+    """
+    if data.startswith(b"\xef\xbb\xbf"):
+        data = data[3:]
+    for encoding in ("utf-8", "cp1252"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+def normalize_cv(text: str) -> str:
+    """
+    Forma Unicode NFC, saltos de línea \\n, espacios colapsados dentro de cada
+    línea y como mucho una línea en blanco seguida. Conserva las líneas (la
+    recuperación por secciones de cv_retrieval.py las necesita).
+    """
+    text = unicodedata.normalize("NFC", text or "").replace("\r\n", "\n").replace("\r", "\n")
+    text = _CONTROL_CHARS.sub(" ", text)
+    lines: List[str] = []
+    for line in text.split("\n"):
+        line = " ".join(line.split())
+        if line or (lines and lines[-1]):
+            lines.append(line)
+    return "\n".join(lines).strip()
+
+
+# ---------- lectura en streaming ----------
+
+
+def iter_cv_folder(folder: Path, pattern: str = "*.txt") -> Iterator[Tuple[str, str]]:
+    """
+    (candidate_id, texto) de cada fichero de la carpeta (id = nombre sin extensión).
+    Se recorre con scandir, sin listar la carpeta entera en memoria.
+    """
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_file() and Path(entry.name).match(pattern):
+                with open(entry.path, "rb") as f:
+                    text = normalize_cv(decode_cv(f.read()))
+                if not text:
+                    logger.warning("CV vacío, se omite: %s", entry.path)
+                    continue
+                yield Path(entry.name).stem, text
+
+
+def _iter_jsonl_lines(lines: Iterable[str], source: str = "<jsonl>") -> Iterator[Tuple[str, str]]:
+    # Una línea ilegible o sin texto se registra y se omite: no corta el resto del lote
+    # ni se evalúa como un CV vacío
+    for idx, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as exc:
+            logger.warning("%s:%d: JSON no válido, se omite la línea (%s)", source, idx + 1, exc)
+            continue
+        if not isinstance(record, dict):
+            logger.warning("%s:%d: se esperaba un objeto JSON, se omite la línea", source, idx + 1)
+            continue
+        candidate_id = record.get("candidate_id", record.get("id", idx))
+        text = next((record[k] for k in ("cv", "text", "texto") if k in record), None)
+        if not isinstance(text, str) or not text.strip():
+            logger.warning(
+                "%s:%d: el candidato %s no tiene texto de CV (campo cv, text o texto), se omite",
+                source, idx + 1, candidate_id,
+            )
+            continue
+        yield str(candidate_id), normalize_cv(text)
+
+
+def iter_cv_jsonl(path: str) -> Iterator[Tuple[str, str]]:
+    """
+    (candidate_id, texto) de un JSONL con una línea por CV:
+    {"candidate_id": ..., "cv": ...} (también valen "id", "text" y "texto"). "-" lee de stdin.
+    Las líneas ilegibles o sin texto se omiten con un aviso en el log.
+    """
+    if path == "-":
+        yield from _iter_jsonl_lines(sys.stdin, "<stdin>")
+        return
+    with open(path, "r", encoding="utf-8-sig", errors="replace") as f:
+        yield from _iter_jsonl_lines(f, path)
+
+
+def iter_cv_source(source: str) -> Iterator[Tuple[str, str]]:
+    """
+    CVs de una carpeta de .txt o de un fichero JSONL ("-" para stdin).
+    """
+    if source != "-" and Path(source).is_dir():
+        return iter_cv_folder(Path(source))
+    return iter_cv_jsonl(source)
+
+
+# ---------- MinHash ----------
+
+
+def shingles(text: str, size: int = CV_SHINGLE_SIZE) -> List[str]:
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)] if words else []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+def _shingle_hashes(items: Iterable[str]) -> np.ndarray:
+    return np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in set(items)),
+        dtype=np.uint64,
+    )
+
+
+class MinHasher:
+    """
+    Firmas MinHash de `num_perm` valores. Cada "permutación" es un hash
+    multiply-shift (a * x + b) >> 32 sobre el hash de 64 bits del shingle.
+    """
+
+    def __init__(self, num_perm: int = CV_MINHASH_PERMUTATIONS, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str, shingle_size: int = CV_SHINGLE_SIZE) -> np.ndarray:
+        hashes = _shingle_hashes(shingles(text, shingle_size))
+        if hashes.size == 0:
+            return np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        # (num_perm, n_shingles); la multiplicación desborda módulo 2^64 a propósito
+        with np.errstate(over="ignore"):
+            mixed = self._a[:, None] * hashes[None, :] + self._b[:, None]
+        return (mixed >> np.uint64(32)).min(axis=1).astype(np.uint32)
+
+
+def estimated_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+# ---------- índice de duplicados ----------
+
+
+@dataclass
+class DuplicateMatch:
+    # "exact" o "near"
+    kind: str
+    # Candidato cuyo CV se vio primero
+    original_id: str
+    similarity: float = 1.0
+
+
+@dataclass
+class IngestedCV:
+    candidate_id: str
+    text: str
+    # Si es duplicado, el candidato original y el tipo / similitud
+    duplicate: Optional[DuplicateMatch] = None
+
+
+class DuplicateIndex:
+    """
+    Índice acotado de CVs ya vistos: hash exacto + bandas LSH de la firma MinHash.
+    check() devuelve el original si el CV es duplicado; si no, lo añade al índice.
+    """
+
+    def __init__(
+        self,
+        threshold: float = CV_NEAR_DUP_THRESHOLD,
+        shingle_size: int = CV_SHINGLE_SIZE,
+        num_perm: int = CV_MINHASH_PERMUTATIONS,
+        bands: int = CV_MINHASH_BANDS,
+        max_entries: int = CV_DEDUP_MAX_ENTRIES,
+    ):
+        if num_perm % bands:
+            raise ValueError(f"CV_MINHASH_PERMUTATIONS ({num_perm}) debe ser múltiplo de CV_MINHASH_BANDS ({bands})")
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_entries = max(1, max_entries)
+        self.hasher = MinHasher(num_perm)
+        # candidate_id -> (hash exacto, firma o None)
+        self._entries: "OrderedDict[str, Tuple[str, Optional[np.ndarray]]]" = OrderedDict()
+        self._exact: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self.stats = {"seen": 0, "exact": 0, "near": 0, "evicted": 0}
+
+    @property
+    def near_enabled(self) -> bool:
+        return self.threshold <= 1.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def _near_match(self, signature: np.ndarray) -> Optional[DuplicateMatch]:
+        best: Optional[DuplicateMatch] = None
+        checked = set()
+        for key in self._band_keys(signature):
+            for candidate_id in self._buckets.get(key, ()):
+                if candidate_id in checked:
+                    continue
+                checked.add(candidate_id)
+                similarity = estimated_similarity(signature, self._entries[candidate_id][1])
+                if similarity >= self.threshold and (best is None or similarity > best.similarity):
+                    best = DuplicateMatch("near", candidate_id, round(similarity, 3))
+        return best
+
+    def _add(self, candidate_id: str, exact_key: str, signature: Optional[np.ndarray]) -> None:
+        if candidate_id in self._entries:
+            self._remove(candidate_id)
+        self._entries[candidate_id] = (exact_key, signature)
+        self._exact[exact_key] = candidate_id
+        if signature is not None:
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, []).append(candidate_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats["evicted"] += 1
+
+    def _remove(self, candidate_id: str) -> None:
+        exact_key, signature = self._entries.pop(candidate_id)
+        if self._exact.get(exact_key) == candidate_id:
+            del self._exact[exact_key]
+        if signature is not None:
+            for key in self._band_keys(signature):
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    continue
+                bucket.remove(candidate_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def check(self, candidate_id: str, text: str) -> Optional[DuplicateMatch]:
+        self.stats["seen"] += 1
+        exact_key = text_hash(text)
+        original = self._exact.get(exact_key)
+        if original is not None:
+            self.stats["exact"] += 1
+            return DuplicateMatch("exact", original)
+
+        signature = self.hasher.signature(text, self.shingle_size) if self.near_enabled else None
+        if signature is not None:
+            match = self._near_match(signature)
+            if match is not None:
+                self.stats["near"] += 1
+                return match
+
+        self._add(candidate_id, exact_key, signature)
+        return None
+
+
+def ingest_cvs(cvs: Iterable[Tuple[str, str]], index: Optional[DuplicateIndex] = None) -> Iterator[IngestedCV]:
+    """
+    Etapa de ingesta: marca cada CV como nuevo o duplicado de uno anterior.
+    Es un generador: los CVs se procesan de uno en uno, a medida que se consumen.
+    """
+    if index is None:
+        index = DuplicateIndex()
+    for candidate_id, text in cvs:
+        yield IngestedCV(candidate_id, text, index.check(candidate_id, text))
+
+
+if __name__ == "__main__":
+    # Uso: python -m services.cv_ingest carpeta_cvs/   (o fichero.jsonl, o - para stdin)
+    # Imprime los duplicados encontrados y un resumen, sin evaluar nada
+    if len(sys.argv) != 2:
+        print("Uso: python -m services.cv_ingest <carpeta_cvs | cvs.jsonl | ->")
+        sys.exit(1)
+
+    dedup = DuplicateIndex()
+    for cv in ingest_cvs(iter_cv_source(sys.argv[1]), dedup):
+        if cv.duplicate is not None:
+            print(json.dumps({
+                "candidate_id": cv.candidate_id,
+                "duplicate_of": cv.duplicate.original_id,
+                "kind": cv.duplicate.kind,
+                "similarity": cv.duplicate.similarity,
+            }, ensure_ascii=False))
+    print(f"CVs: {dedup.stats['seen']}, duplicados exactos: {dedup.stats['exact']}, "
+          f"casi duplicados: {dedup.stats['near']}", file=sys.stderr)
@@ -0,0 +1,161 @@
+import json
+import sys
+from typing import List, Optional
+
+from config import (
+    CV_PROFILE_CACHE_MAX_ENTRIES,
+    CV_PROFILE_SNIPPET_TOKENS,
+    DEFAULT_LLM_MODEL,
+)
+from models.instrumentation import record_cache_hit
+from schemas import (
+    CV_PROFILE_PROMPT_VERSION,
+    CVProfile,
+    aextract_cv_profile_structured,
+    extract_cv_profile_structured,
+)
+from services.cache import DiskCache, cache_path, make_cache_key, model_cache_id, text_hash
+from services.cv_retrieval import build_cv_context
+
+
+# ==========================
+# PERFIL ESTRUCTURADO DEL CV
+# ==========================
+# El perfil (skills, tecnologías, años por puesto, formación, idiomas y
+# certificaciones) se extrae una sola vez por CV y se guarda por hash del CV.
+# Evaluar al mismo candidato contra otras ofertas envía el perfil, mucho más
+# corto que el CV, en lugar del texto completo.
+#
+# Modos de contexto del CV para check_requirements (CV_CONTEXT_MODE):
+#   "raw"              CV completo (o las secciones recuperadas, con retrieve=True)
+#   "profile"          solo el perfil
+#   "profile+snippets" perfil + las secciones del CV relevantes para los requisitos
+
+CV_CONTEXT_MODES = ("raw", "profile", "profile+snippets")
+
+_profile_cache: Optional[DiskCache] = None
+
+
+def get_profile_cache() -> DiskCache:
+    """
+    Caché en disco de perfiles: hash del CV -> CVProfile.
+    """
+    global _profile_cache
+    if _profile_cache is None:
+        _profile_cache = DiskCache(cache_path("cv_profiles"), max_entries=CV_PROFILE_CACHE_MAX_ENTRIES)
+    return _profile_cache
+
+
+def profile_cache_key(cv_hash: str, model: str = DEFAULT_LLM_MODEL) -> str:
+    """
+    Clave = hash(CV, proveedor y modelo, versión del prompt de perfil).
+    """
+    return make_cache_key(cv_hash, model_cache_id(model), CV_PROFILE_PROMPT_VERSION)
+
+
+def _cached_profile(cv_text: str) -> Optional[CVProfile]:
+    cached = get_profile_cache().get(profile_cache_key(text_hash(cv_text)))
+    if cached is None:
+        return None
+    record_cache_hit("cv_profile")
+    return CVProfile(**cached)
+
+
+def _store_profile(cv_text: str, profile: CVProfile) -> None:
+    get_profile_cache().set(profile_cache_key(text_hash(cv_text)), profile.dict())
+
+
+def get_cv_profile(cv_text: str, use_cache: bool = True) -> CVProfile:
+    """
+    Perfil del CV; solo se llama al LLM la primera vez que se ve el CV.
+    """
+    if use_cache:
+        profile = _cached_profile(cv_text)
+        if profile is not None:
+            return profile
+    profile = extract_cv_profile_structured(cv_text)
+    if use_cache:
+        _store_profile(cv_text, profile)
+    return profile
+
+
+async def aget_cv_profile(cv_text: str, use_cache: bool = True) -> CVProfile:
+    if use_cache:
+        profile = _cached_profile(cv_text)
+        if profile is not None:
+            return profile
+    profile = await aextract_cv_profile_structured(cv_text)
+    if use_cache:
+        _store_profile(cv_text, profile)
+    return profile
+
+
+def profile_to_text(profile: CVProfile) -> str:
+    """
+    Representación compacta del perfil para enviarla al LLM en lugar del CV.
+    """
+    lines = ["PERFIL DEL CANDIDATO (extraído de su CV)"]
+    if profile.skills:
+        lines.append("Habilidades: " + ", ".join(profile.skills))
+    if profile.tecnologias:
+        lines.append("Tecnologías: " + ", ".join(profile.tecnologias))
+    if profile.experiencia:
+        lines.append("Experiencia:")
+        for role in profile.experiencia:
+            empresa = f" en {role.empresa}" if role.empresa else ""
+            tecnologias = f" ({', '.join(role.tecnologias)})" if role.tecnologias else ""
+            lines.append(f"- {role.puesto}{empresa}: {role.anios:g} años{tecnologias}")
+    if profile.educacion:
+        lines.append("Formación: " + "; ".join(profile.educacion))
+    if profile.idiomas:
+        lines.append("Idiomas: " + ", ".join(
+            f"{i.idioma} ({i.nivel})" if i.nivel else i.idioma for i in profile.idiomas
+        ))
+    if profile.certificaciones:
+        lines.append("Certificaciones: " + "; ".join(profile.certificaciones))
+    return "\n".join(lines)
+
+
+def _check_mode(mode: str) -> None:
+    if mode not in CV_CONTEXT_MODES:
+        raise ValueError(f"Modo de contexto del CV no válido: {mode!r} (usa uno de {CV_CONTEXT_MODES})")
+
+
+def _with_snippets(profile_text: str, requisitos: List[str], cv_text: str) -> str:
+    context = build_cv_context(requisitos, cv_text, token_budget=CV_PROFILE_SNIPPET_TOKENS)
+    if context.fallback:
+        # CV corto o recuperación sin cobertura suficiente: el CV completo ya lo contiene todo
+        return cv_text
+    return f"{profile_text}\n\nFRAGMENTOS RELEVANTES DEL CV\n{context.text}"
+
+
+def profile_context(requisitos: List[str], cv_text: str, mode: str, use_cache: bool = True) -> str:
+    """
+    Texto que se envía al LLM en lugar del CV según `mode` ("profile" o "profile+snippets").
+    """
+    _check_mode(mode)
+    text = profile_to_text(get_cv_profile(cv_text, use_cache=use_cache))
+    if mode == "profile+snippets":
+        return _with_snippets(text, requisitos, cv_text)
+    return text
+
+
+async def aprofile_context(requisitos: List[str], cv_text: str, mode: str, use_cache: bool = True) -> str:
+    _check_mode(mode)
+    text = profile_to_text(await aget_cv_profile(cv_text, use_cache=use_cache))
+    if mode == "profile+snippets":
+        return _with_snippets(text, requisitos, cv_text)
+    return text
+
+
+if __name__ == "__main__":
+    # Uso: python -m services.cv_profile cv.txt   (imprime el perfil; se guarda en caché)
+    if len(sys.argv) != 2:
+        print("Uso: python -m services.cv_profile <cv.txt>")
+        sys.exit(1)
+
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        profile = get_cv_profile(f.read())
+    print(json.dumps(profile.dict(), ensure_ascii=False, indent=2))
+    print()
+    print(profile_to_text(profile))
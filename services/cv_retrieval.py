@@ -0,0 +1,201 @@
+import math
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from config import (
+    DEFAULT_LLM_MODEL,
+    RETRIEVAL_TOKEN_BUDGET,
+    RETRIEVAL_MIN_COVERAGE,
+    RETRIEVAL_MAX_SECTION_LINES,
+)
+from models.token_counter import count_tokens
+from services.prematcher import FILLER_WORDS, tokenize
+
+
+# Cabeceras típicas de un CV (sin acentos, en minúsculas)
+SECTION_HEADINGS = {
+    "perfil", "resumen", "sobre mi", "experiencia", "experiencia profesional", "experiencia laboral",
+    "formacion", "formacion academica", "educacion", "estudios", "idiomas", "habilidades",
+    "competencias", "conocimientos", "skills", "tecnologias", "proyectos", "publicaciones",
+    "certificaciones", "cursos", "premios", "voluntariado", "intereses", "otros", "referencias",
+    "experience", "education", "languages", "projects", "publications", "certifications", "summary",
+}
+
+
+def _is_heading(line: str) -> bool:
+    stripped = line.strip().rstrip(":").strip()
+    if not stripped or len(stripped) > 40:
+        return False
+    folded = " ".join(tokenize(stripped))
+    if folded in SECTION_HEADINGS:
+        return True
+    # Línea corta toda en mayúsculas ("EXPERIENCIA", "PROYECTOS DESTACADOS")
+    return stripped.isupper() and len(stripped.split()) <= 4
+
+
+def split_sections(cv_text: str, max_lines: int = RETRIEVAL_MAX_SECTION_LINES) -> List[str]:
+    """
+    Divide el CV en secciones por cabeceras y, dentro de cada una, en bloques
+    de como mucho `max_lines` líneas (para que una lista de publicaciones larga
+    no cuente como una única sección).
+    """
+    sections: List[List[str]] = []
+    current: List[str] = []
+    heading: Optional[str] = None
+
+    def flush():
+        if any(l.strip() for l in current):
+            body = [l for l in current if l.strip()]
+            for start in range(0, len(body), max_lines):
+                chunk = body[start:start + max_lines]
+                # La cabecera se repite en cada bloque para no perder contexto
+                if heading and chunk[0] != heading:
+                    chunk = [heading] + chunk
+                sections.append(chunk)
+
+    for line in cv_text.splitlines():
+        if _is_heading(line):
+            flush()
+            current = [line]
+            heading = line
+        else:
+            current.append(line)
+    flush()
+
+    return ["\n".join(s) for s in sections]
+
+
+class BM25:
+    """
+    Okapi BM25 sobre una lista de documentos (aquí, secciones del CV).
+    """
+
+    def __init__(self, docs: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.tfs = [Counter(d) for d in docs]
+        self.lens = [len(d) for d in docs]
+        self.avgdl = (sum(self.lens) / len(docs)) if docs else 0.0
+        df: Counter = Counter()
+        for tf in self.tfs:
+            df.update(tf.keys())
+        n = len(docs)
+        self.idf = {t: math.log(1 + (n - f + 0.5) / (f + 0.5)) for t, f in df.items()}
+
+    def scores(self, query: List[str]) -> List[float]:
+        out = []
+        for tf, dl in zip(self.tfs, self.lens):
+            s = 0.0
+            for term in query:
+                f = tf.get(term)
+                if not f:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * dl / self.avgdl) if self.avgdl else self.k1
+                s += self.idf[term] * f * (self.k1 + 1) / (f + norm)
+            out.append(s)
+        return out
+
+
+def _query_terms(requisito: str) -> List[str]:
+    return [t for t in tokenize(requisito) if t not in FILLER_WORDS and not re.fullmatch(r"\d+", t)]
+
+
+@dataclass
+class RetrievalResult:
+    # Texto que se enviará al LLM (secciones seleccionadas o el CV completo)
+    text: str
+    tokens_full: int
+    tokens_used: int
+    # Fracción de términos de los requisitos presentes en el CV que cubren las secciones elegidas
+    coverage: float
+    # True si se ha enviado el CV completo (CV corto o cobertura insuficiente)
+    fallback: bool
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_full - self.tokens_used
+
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, int] = {"calls": 0, "fallbacks": 0, "tokens_full": 0, "tokens_used": 0}
+
+
+def _record(result: RetrievalResult) -> RetrievalResult:
+    with _stats_lock:
+        _stats["calls"] += 1
+        _stats["fallbacks"] += int(result.fallback)
+        _stats["tokens_full"] += result.tokens_full
+        _stats["tokens_used"] += result.tokens_used
+    return result
+
+
+def retrieval_stats() -> Dict[str, float]:
+    """
+    Totales acumulados: llamadas, fallbacks y tokens ahorrados.
+    """
+    with _stats_lock:
+        stats: Dict[str, float] = dict(_stats)
+    stats["tokens_saved"] = stats["tokens_full"] - stats["tokens_used"]
+    stats["avg_tokens_saved_per_call"] = (
+        round(stats["tokens_saved"] / stats["calls"], 1) if stats["calls"] else 0.0
+    )
+    return stats
+
+
+def build_cv_context(
+    requisitos: List[str],
+    cv_text: str,
+    token_budget: int = RETRIEVAL_TOKEN_BUDGET,
+    min_coverage: float = RETRIEVAL_MIN_COVERAGE,
+    model: str = DEFAULT_LLM_MODEL,
+) -> RetrievalResult:
+    """
+    Selecciona las secciones del CV más relevantes para los requisitos (BM25)
+    hasta llenar `token_budget` tokens. Si la cobertura de los términos de los
+    requisitos queda por debajo de `min_coverage`, devuelve el CV completo.
+    """
+    tokens_full = count_tokens(cv_text, model)
+    if tokens_full <= token_budget:
+        return _record(RetrievalResult(cv_text, tokens_full, tokens_full, 1.0, True))
+
+    sections = split_sections(cv_text)
+    section_tokens = [tokenize(s) for s in sections]
+    bm25 = BM25(section_tokens)
+
+    # Ranking por requisito: así cada requisito aporta su mejor sección antes
+    # de que otro requisito aporte la segunda (reparto round-robin).
+    rankings = []
+    for req in requisitos:
+        query = _query_terms(req)
+        scores = bm25.scores(query)
+        ranked = [i for i in sorted(range(len(sections)), key=lambda i: -scores[i]) if scores[i] > 0]
+        rankings.append(ranked)
+
+    selected: List[int] = []
+    used = 0
+    sizes = [count_tokens(s, model) for s in sections]
+    depth = max((len(r) for r in rankings), default=0)
+    for level in range(depth):
+        for ranked in rankings:
+            if level >= len(ranked):
+                continue
+            idx = ranked[level]
+            if idx in selected or used + sizes[idx] > token_budget:
+                continue
+            selected.append(idx)
+            used += sizes[idx]
+
+    # Cobertura: términos de los requisitos presentes en el CV que están en lo seleccionado
+    cv_terms = set(t for toks in section_tokens for t in toks)
+    wanted = {t for req in requisitos for t in _query_terms(req)} & cv_terms
+    covered = {t for i in selected for t in section_tokens[i]} & wanted
+    coverage = len(covered) / len(wanted) if wanted else 1.0
+
+    if not selected or coverage < min_coverage:
+        return _record(RetrievalResult(cv_text, tokens_full, tokens_full, coverage, True))
+
+    text = "\n\n".join(sections[i] for i in sorted(selected))
+    return _record(RetrievalResult(text, tokens_full, count_tokens(text, model), coverage, False))
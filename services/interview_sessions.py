@@ -0,0 +1,236 @@
+import asyncio
+import os
+import sys
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.types import Command
+
+from config import INTERVIEW_CHECKPOINT_PATH, INTERVIEW_KEEP_FINISHED, INTERVIEW_MAX_CONCURRENCY
+from services.conversation_agent import build_conversation_graph, checkpoint_serde, initial_conversation_state
+
+
+# ==========================
+# SESIONES DE ENTREVISTA CONCURRENTES (asyncio + checkpoints en SQLite)
+# ==========================
+# Cada entrevista es un hilo (thread_id = session_id) del grafo de
+# conversation_agent. El grafo se detiene en node_ask_candidate (interrupt) y
+# su estado queda guardado en SQLite: una sesión a la espera de respuesta no
+# ocupa memoria ni una corrutina, solo filas en el fichero.
+#
+# Cuando llega una respuesta, cualquier proceso que abra el mismo fichero
+# reanuda la sesión (Command(resume=...)) hasta la siguiente pregunta o el final.
+# Las respuestas de una misma sesión se procesan de una en una dentro del
+# proceso; entre procesos, la misma sesión debe ir siempre al mismo worker a la vez.
+# Con ainvoke, los nodos que llaman al LLM usan sus versiones asíncronas
+# (anode_evaluate_answer, anode_finalize_summary): ninguna sesión ocupa un hilo
+# mientras espera al modelo.
+
+
+@dataclass
+class InterviewTurn:
+    session_id: str
+    # Siguiente pregunta para el candidato (None si la entrevista ha terminado)
+    question: Optional[str] = None
+    # Requisitos por los que se pregunta en `question`
+    requirements: List[str] = field(default_factory=list)
+    # True en la primera pregunta (para saludar al candidato)
+    first: bool = False
+    finished: bool = False
+    # Requisitos que el candidato dice cumplir hasta ahora
+    fulfilled: List[str] = field(default_factory=list)
+    # Resumen de la conversación (memoria a largo plazo)
+    summary: str = ""
+
+
+@dataclass
+class _SessionLock:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    # Corrutinas que tienen o esperan el lock
+    users: int = 0
+
+
+class UnknownSessionError(KeyError):
+    """No hay ninguna sesión guardada con ese identificador."""
+
+
+def _turn(session_id: str, values: Dict[str, Any], interrupts: List[Any]) -> InterviewTurn:
+    turn = InterviewTurn(
+        session_id=session_id,
+        fulfilled=list(values.get("additional_fulfilled", [])),
+        summary=values.get("long_term_summary", ""),
+    )
+    if interrupts:
+        prompt = interrupts[0].value
+        turn.question = prompt["question"]
+        turn.requirements = list(prompt.get("requirements", []))
+        turn.first = bool(prompt.get("first"))
+    else:
+        turn.finished = True
+    return turn
+
+
+class InterviewSessionManager:
+    """
+    Gestor de entrevistas no bloqueantes. Uso:
+
+        async with InterviewSessionManager() as manager:
+            turn = await manager.start(not_found, requirement_dicts=requisitos)
+            ...  # se envía turn.question al candidato
+            turn = await manager.answer(turn.session_id, respuesta)
+
+    El grafo se compila una vez por gestor; como mucho `max_concurrency`
+    sesiones avanzan a la vez (las demás esperan su turno sin bloquear el bucle).
+    """
+
+    def __init__(
+        self,
+        path: str = INTERVIEW_CHECKPOINT_PATH,
+        max_concurrency: int = INTERVIEW_MAX_CONCURRENCY,
+        keep_finished: bool = INTERVIEW_KEEP_FINISHED,
+    ):
+        self.path = path
+        self.keep_finished = keep_finished
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._locks: Dict[str, _SessionLock] = {}
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._saver: Optional[AsyncSqliteSaver] = None
+        self._app = None
+
+    async def open(self) -> "InterviewSessionManager":
+        if self._app is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = await aiosqlite.connect(self.path, timeout=30)
+            self._saver = AsyncSqliteSaver(self._conn, serde=checkpoint_serde())
+            await self._saver.setup()
+            self._app = build_conversation_graph(checkpointer=self._saver)
+        return self
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+        self._conn = self._saver = self._app = None
+
+    async def __aenter__(self) -> "InterviewSessionManager":
+        return await self.open()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    # ---------- sesiones ----------
+
+    @asynccontextmanager
+    async def _session(self, session_id: str) -> AsyncIterator[None]:
+        """
+        Turno exclusivo sobre la sesión. El lock se borra cuando nadie lo tiene
+        ni lo espera: no se guarda nada por sesión inactiva.
+        """
+        entry = self._locks.get(session_id)
+        if entry is None:
+            entry = self._locks[session_id] = _SessionLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if entry.users == 0 and self._locks.get(session_id) is entry:
+                del self._locks[session_id]
+
+    @staticmethod
+    def _config(session_id: str) -> Dict[str, Any]:
+        return {"configurable": {"thread_id": session_id}}
+
+    async def _run(self, session_id: str, graph_input: Any, resume: bool = False) -> InterviewTurn:
+        await self.open()
+        async with self._session(session_id):
+            if resume:
+                # Dentro del lock: otra respuesta a la misma sesión puede haberla terminado
+                current = await self.get(session_id)
+                if current is None:
+                    raise UnknownSessionError(session_id)
+                if current.finished:
+                    return current
+            async with self._semaphore:
+                result = await self._app.ainvoke(graph_input, config=self._config(session_id))
+            turn = _turn(session_id, result, result.get("__interrupt__", []))
+            if turn.finished and not self.keep_finished:
+                await self.delete(session_id)
+        return turn
+
+    async def start(
+        self,
+        not_found_requirements: List[str],
+        requirement_dicts: Optional[List[Dict]] = None,
+        batch_size: int = 1,
+        initial_long_term_summary: str = "",
+        session_id: Optional[str] = None,
+    ) -> InterviewTurn:
+        """
+        Crea una sesión y la avanza hasta la primera pregunta.
+        """
+        state = initial_conversation_state(
+            not_found_requirements, initial_long_term_summary, requirement_dicts, batch_size, session_id
+        )
+        if not not_found_requirements:
+            return InterviewTurn(session_id=state.session_id, finished=True, summary=initial_long_term_summary)
+        return await self._run(state.session_id, state)
+
+    async def answer(self, session_id: str, respuesta: str) -> InterviewTurn:
+        """
+        Reanuda la sesión con la respuesta del candidato y la avanza hasta la
+        siguiente pregunta (o hasta el final, con el resumen ya cerrado).
+        """
+        return await self._run(session_id, Command(resume=respuesta), resume=True)
+
+    async def get(self, session_id: str) -> Optional[InterviewTurn]:
+        """
+        Estado actual de una sesión (la pregunta pendiente, si la hay) o None si no existe.
+        """
+        await self.open()
+        snapshot = await self._app.aget_state(self._config(session_id))
+        if not snapshot.values:
+            return None
+        interrupts = [i for task in snapshot.tasks for i in task.interrupts]
+        return _turn(session_id, snapshot.values, interrupts)
+
+    async def delete(self, session_id: str) -> None:
+        await self.open()
+        await self._saver.adelete_thread(session_id)
+
+
+async def _interactive(path: str, session_id: Optional[str], requisitos: List[str]) -> None:
+    # Demo por terminal: cada respuesta puede darse en una ejecución distinta del proceso
+    async with InterviewSessionManager(path, keep_finished=True) as manager:
+        turn = await manager.get(session_id) if session_id else None
+        if turn is None:
+            turn = await manager.start(requisitos, session_id=session_id)
+        print(f"Sesión {turn.session_id}")
+        while not turn.finished:
+            print(turn.question)
+            respuesta = await asyncio.to_thread(input, "Tu respuesta (vacío para pausar): ")
+            if not respuesta:
+                print(f"Sesión pausada; reanuda con: python -m services.interview_sessions --session {turn.session_id}")
+                return
+            turn = await manager.answer(turn.session_id, respuesta)
+        print(f"Requisitos cumplidos: {turn.fulfilled}")
+        print(f"Resumen: {turn.summary}")
+
+
+if __name__ == "__main__":
+    # Uso: python -m services.interview_sessions "Inglés B2" "Docker" ...
+    #      python -m services.interview_sessions --session <id>   (reanuda una sesión pausada)
+    args = sys.argv[1:]
+    sid = None
+    if len(args) >= 2 and args[0] == "--session":
+        sid, args = args[1], args[2:]
+    if not args and sid is None:
+        print('Uso: python -m services.interview_sessions "<requisito>" ["<requisito>" ...]')
+        print("     python -m services.interview_sessions --session <id>")
+        sys.exit(1)
+    asyncio.run(_interactive(INTERVIEW_CHECKPOINT_PATH, sid, args))
@@ -0,0 +1,494 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config import (
+    LLM_RPM,
+    LLM_TPM,
+    JOB_QUEUE_PATH,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_CLAIM_SIZE,
+    JOB_WORKER_CONCURRENCY,
+)
+from services.cache import text_hash
+
+
+# ==========================
+# COLA DE TRABAJOS DURADERA (SQLite)
+# ==========================
+# Cada trabajo es una evaluación (oferta, CV). Los workers (procesos) toman
+# lotes de trabajos con un "lease" de JOB_LEASE_SECONDS segundos, que renuevan
+# periódicamente mientras evalúan el lote:
+#   - si el worker termina, marca el trabajo como hecho (solo si el lease sigue siendo suyo),
+#   - si falla, el trabajo vuelve a la cola con backoff hasta JOB_MAX_ATTEMPTS intentos,
+#   - si el proceso muere, el lease caduca y otro worker lo recoge.
+# El estado vive en el fichero, así que una campaña interrumpida se reanuda
+# volviendo a lanzar `run`. Los resultados se guardan con INSERT OR REPLACE
+# por (oferta, candidato), de modo que repetir un trabajo es idempotente.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cvs (
+    cv_hash TEXT PRIMARY KEY,
+    texto TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS jobs (
+    offer_id TEXT NOT NULL,
+    candidate_id TEXT NOT NULL,
+    cv_hash TEXT NOT NULL,
+    -- pending | leased | done | failed
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    last_error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (offer_id, candidate_id)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs (status, available_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_lease ON jobs (status, lease_expires);
+"""
+
+STATUSES = ("pending", "leased", "done", "failed")
+
+
+@dataclass
+class Job:
+    offer_id: str
+    candidate_id: str
+    cv_text: str
+    attempts: int
+
+
+class JobQueue:
+    """
+    Cola de trabajos (oferta, CV) sobre SQLite en modo WAL, compartida por
+    varios procesos. Cada proceso abre su propia instancia.
+    """
+
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # isolation_level=None: las transacciones se abren a mano (BEGIN IMMEDIATE)
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self):
+        conn = self._conn
+
+        class _Tx:
+            def __enter__(self_inner):
+                # IMMEDIATE toma el bloqueo de escritura al empezar: dos workers
+                # no pueden reclamar el mismo trabajo
+                conn.execute("BEGIN IMMEDIATE")
+                return conn
+
+            def __exit__(self_inner, exc_type, exc, tb):
+                conn.execute("ROLLBACK" if exc_type else "COMMIT")
+                return False
+
+        return _Tx()
+
+    def enqueue(self, offer_id: str, cvs: Iterable[Tuple[str, str]]) -> int:
+        """
+        Añade un trabajo por CV. Los trabajos ya existentes (misma oferta y
+        candidato) no se duplican ni se reinician.
+        """
+        now = time.time()
+        cv_rows = []
+        job_rows = []
+        for candidate_id, cv_text in cvs:
+            cv_hash = text_hash(cv_text)
+            cv_rows.append((cv_hash, cv_text))
+            job_rows.append((offer_id, candidate_id, cv_hash, now))
+
+        with self._lock, self._transaction() as conn:
+            conn.executemany("INSERT OR IGNORE INTO cvs (cv_hash, texto) VALUES (?, ?)", cv_rows)
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (offer_id, candidate_id, cv_hash, updated_at) VALUES (?, ?, ?, ?)",
+                job_rows,
+            )
+            return conn.total_changes - before
+
+    def claim(
+        self,
+        owner: str,
+        n: int = JOB_CLAIM_SIZE,
+        lease_seconds: float = JOB_LEASE_SECONDS,
+        max_attempts: int = JOB_MAX_ATTEMPTS,
+    ) -> List[Job]:
+        """
+        Reclama hasta `n` trabajos pendientes (o con el lease caducado) para `owner`.
+        Un lease caducado con los intentos agotados (el CV tumba o bloquea al
+        worker, así que nunca llega a fail()) se marca como fallido en lugar de
+        volver a repartirse.
+        """
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            conn.execute(
+                """
+                UPDATE jobs SET status = 'failed', lease_owner = NULL, lease_expires = NULL,
+                    last_error = ?, updated_at = ?
+                WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?
+                """,
+                (f"lease caducado tras {max_attempts} intento(s): el worker murió o se bloqueó", now, now, max_attempts),
+            )
+            rows = conn.execute(
+                """
+                SELECT offer_id, candidate_id FROM jobs
+                WHERE (status = 'pending' AND available_at <= ?)
+                   OR (status = 'leased' AND lease_expires < ? AND attempts < ?)
+                LIMIT ?
+                """,
+                (now, now, max_attempts, n),
+            ).fetchall()
+            if not rows:
+                return []
+            conn.executemany(
+                """
+                UPDATE jobs
+                SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                    attempts = attempts + 1, updated_at = ?
+                WHERE offer_id = ? AND candidate_id = ?
+                """,
+                [(owner, now + lease_seconds, now, o, c) for o, c in rows],
+            )
+            jobs = []
+            for offer_id, candidate_id in rows:
+                attempts, cv_text = conn.execute(
+                    """
+                    SELECT j.attempts, c.texto FROM jobs j JOIN cvs c ON c.cv_hash = j.cv_hash
+                    WHERE j.offer_id = ? AND j.candidate_id = ?
+                    """,
+                    (offer_id, candidate_id),
+                ).fetchone()
+                jobs.append(Job(offer_id, candidate_id, cv_text, attempts))
+            return jobs
+
+    def complete(self, owner: str, jobs: List[Job]) -> int:
+        """
+        Marca como hechos los trabajos cuyo lease sigue siendo de `owner`.
+        Si el lease caducó y otro worker lo tomó, no se toca (el resultado de
+        ambos es el mismo y se guardó con upsert).
+        """
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                UPDATE jobs SET status = 'done', lease_owner = NULL, lease_expires = NULL,
+                    last_error = NULL, updated_at = ?
+                WHERE offer_id = ? AND candidate_id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                [(now, j.offer_id, j.candidate_id, owner) for j in jobs],
+            )
+            return conn.total_changes - before
+
+    def renew(self, owner: str, jobs: List[Job], lease_seconds: float = JOB_LEASE_SECONDS) -> int:
+        """
+        Prolonga el lease de los trabajos que siguen en manos de `owner`
+        (latido mientras se evalúa un lote). Devuelve cuántos se renovaron.
+        """
+        now = time.time()
+        with self._lock, self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                UPDATE jobs SET lease_expires = ?, updated_at = ?
+                WHERE offer_id = ? AND candidate_id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                [(now + lease_seconds, now, j.offer_id, j.candidate_id, owner) for j in jobs],
+            )
+            return conn.total_changes - before
+
+    def fail(self, owner: str, job: Job, error: str, max_attempts: int = JOB_MAX_ATTEMPTS) -> None:
+        """
+        Devuelve el trabajo a la cola con backoff exponencial, o lo marca como
+        fallido si ya agotó los intentos.
+        """
+        now = time.time()
+        status = "failed" if job.attempts >= max_attempts else "pending"
+        backoff = min(300.0, 2.0 ** job.attempts)
+        with self._lock, self._transaction() as conn:
+            conn.execute(
+                """
+                UPDATE jobs SET status = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL,
+                    last_error = ?, updated_at = ?
+                WHERE offer_id = ? AND candidate_id = ? AND status = 'leased' AND lease_owner = ?
+                """,
+                (status, now + backoff, error[:2000], now, job.offer_id, job.candidate_id, owner),
+            )
+
+    def retry_failed(self) -> int:
+        """
+        Vuelve a encolar los trabajos fallidos (con los intentos a cero).
+        """
+        with self._lock, self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, available_at = 0 WHERE status = 'failed'"
+            )
+            return cur.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {s: 0 for s in STATUSES}
+        counts.update(dict(rows))
+        return counts
+
+    def next_wakeup(self) -> Optional[float]:
+        """
+        Segundos hasta que haya algo reclamable (reintento o lease caducado), o
+        None si no queda nada por hacer.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT MIN(CASE WHEN status = 'pending' THEN available_at ELSE lease_expires END)
+                FROM jobs WHERE status IN ('pending', 'leased')
+                """
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - now)
+
+
+# ==========================
+# WORKERS
+# ==========================
+
+def _owner_id(index: int) -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{index}"
+
+
+async def _run_jobs(queue: JobQueue, owner: str, jobs: List[Job], concurrency: int) -> None:
+    from services.batch_evaluator import evaluate_many
+    from services.results_store import get_results_store
+
+    store = get_results_store()
+    by_offer: Dict[str, List[Job]] = {}
+    for job in jobs:
+        by_offer.setdefault(job.offer_id, []).append(job)
+
+    for offer_id, offer_jobs in by_offer.items():
+        requisitos = store.requirements(offer_id)
+        if not requisitos:
+            for job in offer_jobs:
+                queue.fail(owner, job, f"Oferta {offer_id} sin requisitos en el almacén")
+            continue
+
+        by_candidate = {j.candidate_id: j for j in offer_jobs}
+        done: List = []
+        async for item in evaluate_many(
+            requisitos,
+            ((j.candidate_id, j.cv_text) for j in offer_jobs),
+            max_concurrency=concurrency,
+        ):
+            if item.error:
+                queue.fail(owner, by_candidate[item.candidate_id], item.error)
+            else:
+                done.append(item)
+        # Primero el resultado (upsert) y después el trabajo: si el proceso
+        # muere entre medias, el trabajo se repite y reescribe lo mismo
+        store.save_evaluations(offer_id, done)
+        queue.complete(owner, [by_candidate[item.candidate_id] for item in done])
+
+
+async def _heartbeat(queue: JobQueue, owner: str, jobs: List[Job], lease_seconds: float) -> None:
+    # Renueva los leases a un tercio de su duración: un lote lento no caduca
+    # (y otro worker no lo repite) mientras este proceso siga vivo
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        queue.renew(owner, jobs, lease_seconds)
+
+
+async def _worker_loop(
+    queue: JobQueue,
+    owner: str,
+    concurrency: int,
+    claim_size: int,
+    poll_seconds: float,
+    lease_seconds: float,
+) -> int:
+    batches = 0
+    while True:
+        jobs = queue.claim(owner, n=claim_size, lease_seconds=lease_seconds)
+        if jobs:
+            heartbeat = asyncio.create_task(_heartbeat(queue, owner, jobs, lease_seconds))
+            try:
+                await _run_jobs(queue, owner, jobs, concurrency)
+            finally:
+                heartbeat.cancel()
+            batches += 1
+            continue
+        wait = queue.next_wakeup()
+        if wait is None:
+            return batches
+        # Trabajos en backoff o en manos de otro worker: esperar a que se liberen
+        await asyncio.sleep(min(max(wait, 0.05), poll_seconds))
+
+
+def run_worker(
+    queue_path: str = JOB_QUEUE_PATH,
+    index: int = 0,
+    concurrency: int = JOB_WORKER_CONCURRENCY,
+    claim_size: int = JOB_CLAIM_SIZE,
+    poll_seconds: float = 1.0,
+    lease_seconds: float = JOB_LEASE_SECONDS,
+) -> int:
+    """
+    Bucle de un worker: reclama lotes y los evalúa hasta que la cola queda vacía.
+    Todo el bucle corre en un único event loop: los clientes async del LLM se
+    cachean por proceso y quedan ligados al loop en el que se crearon.
+    Devuelve el nº de lotes procesados.
+    """
+    queue = JobQueue(queue_path)
+    try:
+        return asyncio.run(
+            _worker_loop(queue, _owner_id(index), concurrency, claim_size, poll_seconds, lease_seconds)
+        )
+    finally:
+        queue.close()
+
+
+def _quota_share(processes: int) -> Dict[str, str]:
+    """
+    Parte de la cuota del proveedor (LLM_RPM / LLM_TPM) que le toca a cada
+    worker: el limitador es por proceso y la cuota es de toda la cuenta.
+    """
+    env = {}
+    if LLM_RPM:
+        env["LLM_RPM"] = repr(LLM_RPM / processes)
+    if LLM_TPM:
+        env["LLM_TPM"] = repr(LLM_TPM / processes)
+    return env
+
+
+def run_campaign(
+    processes: int,
+    queue_path: str = JOB_QUEUE_PATH,
+    concurrency: int = JOB_WORKER_CONCURRENCY,
+    claim_size: int = JOB_CLAIM_SIZE,
+) -> Dict[str, int]:
+    """
+    Lanza `processes` workers sobre la cola y espera a que terminen. Cada uno
+    recibe 1/`processes` de LLM_RPM y LLM_TPM. Se puede volver a llamar tras
+    una interrupción: continúa con lo pendiente.
+    """
+    processes = max(1, processes)
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(target=run_worker, args=(queue_path, i, concurrency, claim_size))
+        for i in range(processes)
+    ]
+    # Los procesos "spawn" heredan el entorno al arrancar y leen config al importarla
+    share = _quota_share(processes)
+    saved = {k: os.environ.get(k) for k in share}
+    os.environ.update(share)
+    try:
+        for w in workers:
+            w.start()
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    for w in workers:
+        w.join()
+
+    queue = JobQueue(queue_path)
+    try:
+        return queue.counts()
+    finally:
+        queue.close()
+
+
+def enqueue_offer(oferta_texto: str, cvs: Iterable[Tuple[str, str]], queue_path: str = JOB_QUEUE_PATH) -> Tuple[str, int]:
+    """
+    Parsea la oferta (una vez, con caché), la guarda en el almacén de
+    resultados y encola un trabajo por CV. Devuelve (offer_id, trabajos nuevos).
+    """
+    from services.requirement_parser import parse_requirements
+    from services.results_store import get_results_store
+
+    requisitos = parse_requirements(oferta_texto)
+    if not requisitos:
+        raise ValueError("No se han podido extraer requisitos de la oferta.")
+    offer_id = get_results_store().save_offer(oferta_texto, requisitos)
+
+    queue = JobQueue(queue_path)
+    try:
+        return offer_id, queue.enqueue(offer_id, cvs)
+    finally:
+        queue.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Campañas de evaluación en varios procesos.")
+    parser.add_argument("--queue", default=JOB_QUEUE_PATH, help="Fichero SQLite de la cola.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_enqueue = sub.add_parser("enqueue", help="Encola una oferta contra una carpeta de CVs (*.txt) o un JSONL de CVs.")
+    p_enqueue.add_argument("oferta")
+    p_enqueue.add_argument("carpeta_cvs")
+
+    p_run = sub.add_parser("run", help="Procesa la cola (reanuda si se interrumpió).")
+    p_run.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    p_run.add_argument("--concurrency", type=int, default=JOB_WORKER_CONCURRENCY, help="Evaluaciones en vuelo por proceso.")
+    p_run.add_argument("--claim-size", type=int, default=JOB_CLAIM_SIZE)
+
+    sub.add_parser("status", help="Trabajos por estado.")
+    sub.add_parser("retry-failed", help="Vuelve a encolar los trabajos fallidos.")
+
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        from services.cv_ingest import iter_cv_source
+
+        oferta_texto = Path(args.oferta).read_text(encoding="utf-8")
+        offer_id, added = enqueue_offer(oferta_texto, iter_cv_source(args.carpeta_cvs), args.queue)
+        print(f"Oferta {offer_id}: {added} trabajos nuevos.")
+    elif args.command == "run":
+        start = time.perf_counter()
+        counts = run_campaign(args.processes, args.queue, args.concurrency, args.claim_size)
+        print(f"{counts} en {time.perf_counter() - start:.1f}s")
+    else:
+        queue = JobQueue(args.queue)
+        try:
+            if args.command == "retry-failed":
+                print(f"{queue.retry_failed()} trabajos reencolados.")
+            print(queue.counts())
+        finally:
+            queue.close()
+
+
+if __name__ == "__main__":
+    # Uso: python -m services.job_queue enqueue oferta.txt carpeta_cvs/
+    #      python -m services.job_queue run --processes 4
+    #      python -m services.job_queue status
+    main()
@@ -0,0 +1,382 @@
+import json
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from config import PREMATCH_SKILLS_PATH
+from schemas import RequirementEvalItem
+
+
+# ==========================
+# 1. TABLA DE HABILIDADES E IMPLICACIONES
+# ==========================
+# skill canónica -> alias (formas en que aparece en un CV) e "implied_by"
+# (tecnologías cuyo uso implica conocer la skill, p. ej. Django => Python).
+# Se puede ampliar con un JSON propio en PREMATCH_SKILLS_PATH con el mismo formato.
+DEFAULT_SKILLS_GRAPH: Dict[str, Dict[str, List[str]]] = {
+    "python": {
+        "aliases": ["python", "python3"],
+        "implied_by": ["django", "flask", "fastapi", "pandas", "numpy", "scikit-learn", "pytorch", "pyspark"],
+    },
+    "javascript": {
+        "aliases": ["javascript", "js", "ecmascript"],
+        "implied_by": ["typescript", "react", "angular", "vue", "node.js", "nodejs", "express.js"],
+    },
+    "typescript": {"aliases": ["typescript", "ts"], "implied_by": ["angular"]},
+    "java": {"aliases": ["java"], "implied_by": ["spring", "spring boot", "hibernate"]},
+    "c#": {"aliases": ["c#", "csharp"], "implied_by": [".net", "asp.net"]},
+    "sql": {
+        "aliases": ["sql"],
+        "implied_by": ["postgresql", "postgres", "mysql", "mariadb", "sql server", "sqlite", "pl/sql"],
+    },
+    "docker": {"aliases": ["docker"], "implied_by": ["docker compose", "docker-compose"]},
+    "kubernetes": {"aliases": ["kubernetes", "k8s"], "implied_by": ["openshift", "helm"]},
+    "git": {"aliases": ["git"], "implied_by": ["github", "gitlab", "bitbucket"]},
+    "linux": {"aliases": ["linux"], "implied_by": ["ubuntu", "debian", "centos", "red hat", "bash"]},
+    "aws": {"aliases": ["aws", "amazon web services"], "implied_by": ["ec2", "s3", "sagemaker"]},
+    "machine learning": {
+        "aliases": ["machine learning", "aprendizaje automatico", "ml"],
+        "implied_by": ["scikit-learn", "tensorflow", "pytorch", "xgboost", "deep learning"],
+    },
+    "deep learning": {"aliases": ["deep learning", "aprendizaje profundo"], "implied_by": ["tensorflow", "pytorch", "keras"]},
+    "react": {"aliases": ["react", "react.js", "reactjs"], "implied_by": ["next.js", "nextjs", "react native"]},
+    "django": {"aliases": ["django"], "implied_by": ["django rest framework"]},
+    "apis rest": {"aliases": ["api rest", "apis rest", "rest api", "restful"], "implied_by": ["fastapi", "django rest framework"]},
+}
+
+# Idiomas: palabra del requisito -> formas en que aparece en el CV
+LANGUAGES: Dict[str, List[str]] = {
+    "ingles": ["ingles", "english"],
+    "frances": ["frances", "french"],
+    "aleman": ["aleman", "german"],
+    "italiano": ["italiano", "italian"],
+    "portugues": ["portugues", "portuguese"],
+}
+
+_LANGUAGE_FORMS = {form for forms in LANGUAGES.values() for form in forms}
+
+CEFR_LEVELS = {"a1": 1, "a2": 2, "b1": 3, "b2": 4, "c1": 5, "c2": 6, "nativo": 6, "bilingue": 6, "native": 6}
+
+# Palabras de relleno de un requisito: si el requisito solo contiene una skill
+# conocida más estas palabras, se puede resolver localmente con confianza.
+# Los calificativos de nivel ("avanzado", "sólidos", "nivel alto") no son
+# relleno: cambian el requisito y lo decide el LLM.
+FILLER_WORDS = {
+    "experiencia", "en", "con", "de", "del", "el", "la", "los", "las", "y", "conocimiento",
+    "conocimientos", "manejo", "dominio", "uso", "desarrollo", "programacion", "lenguaje",
+    "valorable", "deseable", "se", "valora", "requerido", "buen", "buenos",
+    "trabajo", "herramientas", "tecnologia", "framework",
+    "idioma", "a", "un", "una", "equivalente",
+}
+
+# En un requisito de idioma el nivel lo da el MCER: "Inglés nivel B2 o superior"
+LANGUAGE_FILLER_WORDS = FILLER_WORDS | {"nivel", "minimo", "o", "superior"}
+
+# Palabras que, justo antes de una skill en el CV, indican que el candidato no
+# la tiene: negación o intención ("sin experiencia en", "me gustaría aprender")
+NEGATION_CUES = {
+    "no", "sin", "nunca", "ningun", "ninguna", "aprender", "aprendiendo", "gustaria",
+    "quiero", "quisiera", "interesa", "interes", "interesado", "interesada",
+    "not", "without", "never", "learn", "learning",
+}
+# Tokens que se miran antes de una mención buscando esas palabras
+NEGATION_WINDOW = 4
+# Alias tan cortos ("ml", "js") que solo cuentan si no siguen a un número ("500 ml")
+SHORT_ALIAS_LEN = 2
+
+
+def fold(text: str) -> str:
+    """
+    Minúsculas y sin acentos: "Inglés" -> "ingles".
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9.#+-]*[a-z0-9#+]")
+# Puntuación que separa frases o elementos de una lista ("Inglés A2, Francés C1")
+_BREAK_RE = re.compile(r"[,;.!?|/\n]")
+
+# Tokens que se miran tras el idioma en el CV buscando su nivel
+LANGUAGE_LEVEL_WINDOW = 4
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(fold(text))
+
+
+def _load_skills_graph(path: Optional[str]) -> Dict[str, Dict[str, List[str]]]:
+    graph = {k: {"aliases": list(v["aliases"]), "implied_by": list(v["implied_by"])}
+             for k, v in DEFAULT_SKILLS_GRAPH.items()}
+    if path:
+        with open(path, encoding="utf-8") as f:
+            custom = json.load(f)
+        for skill, spec in custom.items():
+            entry = graph.setdefault(fold(skill), {"aliases": [fold(skill)], "implied_by": []})
+            entry["aliases"] += [fold(a) for a in spec.get("aliases", [])]
+            entry["implied_by"] += [fold(i) for i in spec.get("implied_by", [])]
+    return graph
+
+
+# ==========================
+# 2. ÍNDICE INVERTIDO DEL CV
+# ==========================
+
+class CVIndex:
+    """
+    Índice invertido token -> posiciones del CV, para buscar términos y
+    frases de varias palabras sin recorrer el texto completo.
+    """
+
+    def __init__(self, cv_text: str):
+        text = fold(cv_text)
+        self.tokens: List[str] = []
+        # Posiciones de los tokens que empiezan una frase o elemento de lista
+        self.breaks: Set[int] = set()
+        last = 0
+        for m in _TOKEN_RE.finditer(text):
+            if _BREAK_RE.search(text, last, m.start()):
+                self.breaks.add(len(self.tokens))
+            self.tokens.append(m.group())
+            last = m.end()
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for pos, tok in enumerate(self.tokens):
+            self.postings[tok].append(pos)
+
+    def positions(self, phrase: str) -> List[int]:
+        words = tokenize(phrase)
+        if not words:
+            return []
+        starts = self.postings.get(words[0], [])
+        if len(words) == 1:
+            return starts
+        return [
+            p for p in starts
+            if all(self.tokens[p + i: p + i + 1] == [w] for i, w in enumerate(words[1:], start=1))
+        ]
+
+    def affirmed(self, pos: int, phrase: str) -> bool:
+        """
+        False si la mención en `pos` va negada o es una intención dentro de su
+        frase ("no he usado Docker", "me gustaría aprender Python"), o si es un
+        alias corto tras un número ("500 ml").
+        """
+        start = pos
+        while start > max(0, pos - NEGATION_WINDOW) and start not in self.breaks:
+            start -= 1
+        if any(t in NEGATION_CUES for t in self.tokens[start:pos]):
+            return False
+        if len(phrase) <= SHORT_ALIAS_LEN and pos > start and self.tokens[pos - 1].isdigit():
+            return False
+        return True
+
+    def contains(self, phrase: str) -> bool:
+        """
+        La frase aparece en el CV al menos una vez de forma afirmativa.
+        """
+        return any(self.affirmed(pos, phrase) for pos in self.positions(phrase))
+
+    def level_after(self, pos: int) -> Optional[int]:
+        """
+        Nivel MCER del idioma en `pos`: el primero que le sigue dentro de la
+        misma frase, sin pasar a otro idioma ("Inglés A2, Francés C1" -> A2).
+        """
+        for p in range(pos + 1, min(pos + 1 + LANGUAGE_LEVEL_WINDOW, len(self.tokens))):
+            token = self.tokens[p]
+            if p in self.breaks or token in _LANGUAGE_FORMS:
+                return None
+            if token in CEFR_LEVELS:
+                return CEFR_LEVELS[token]
+        return None
+
+
+# ==========================
+# 3. PRE-MATCHER POR NIVELES
+# ==========================
+
+class PreMatcher:
+    """
+    Resuelve localmente los requisitos evidentes antes de llamar al LLM.
+
+    Niveles (de más a menos directo):
+      - "exact": la skill del requisito (o un alias) aparece en el CV.
+      - "implication": aparece una tecnología que implica la skill (Django => Python).
+      - "language": idioma con nivel MCER igual o superior al pedido.
+
+    Solo se resuelven positivos: lo que no se puede confirmar se deja al LLM.
+    Las menciones negadas o de intención en el CV no cuentan.
+    """
+
+    TIERS = ("exact", "implication", "language")
+
+    def __init__(self, skills_graph: Optional[Dict[str, Dict[str, List[str]]]] = None):
+        self.skills_graph = skills_graph if skills_graph is not None else _load_skills_graph(PREMATCH_SKILLS_PATH)
+        # frase (alias) -> skill canónica
+        self._alias_to_skill: Dict[str, str] = {}
+        for skill, spec in self.skills_graph.items():
+            for alias in spec["aliases"] + [skill]:
+                self._alias_to_skill[" ".join(tokenize(alias))] = skill
+        self._max_alias_len = max((len(a.split()) for a in self._alias_to_skill), default=1)
+
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {tier: 0 for tier in self.TIERS + ("llm",)}
+
+    def _requirement_skills(self, tokens: List[str]) -> Optional[List[str]]:
+        """
+        Skills mencionadas en el requisito, o None si el requisito contiene
+        algo más que skills conocidas y palabras de relleno (ambiguo).
+        """
+        skills: List[str] = []
+        i = 0
+        while i < len(tokens):
+            for n in range(min(self._max_alias_len, len(tokens) - i), 0, -1):
+                phrase = " ".join(tokens[i:i + n])
+                if phrase in self._alias_to_skill:
+                    skills.append(self._alias_to_skill[phrase])
+                    i += n
+                    break
+            else:
+                if tokens[i] not in FILLER_WORDS:
+                    return None
+                i += 1
+        return skills or None
+
+    def canonical_tokens(self, tokens: List[str]) -> List[str]:
+        """
+        Sustituye los alias de skills conocidas por su nombre canónico
+        ("k8s" -> "kubernetes", "aprendizaje automatico" -> "machine learning").
+        """
+        out: List[str] = []
+        i = 0
+        while i < len(tokens):
+            for n in range(min(self._max_alias_len, len(tokens) - i), 0, -1):
+                phrase = " ".join(tokens[i:i + n])
+                if phrase in self._alias_to_skill:
+                    out.append(self._alias_to_skill[phrase])
+                    i += n
+                    break
+            else:
+                out.append(tokens[i])
+                i += 1
+        return out
+
+    def _match_skill(self, skill: str, index: CVIndex) -> Optional[Tuple[str, str]]:
+        spec = self.skills_graph[skill]
+        for alias in [skill] + spec["aliases"]:
+            if index.contains(alias):
+                return "exact", alias
+        for tech in spec["implied_by"]:
+            if index.contains(tech):
+                return "implication", tech
+        return None
+
+    def _match_language(self, tokens: List[str], index: CVIndex) -> Optional[str]:
+        langs = [t for t in tokens if t in LANGUAGES]
+        levels = [CEFR_LEVELS[t] for t in tokens if t in CEFR_LEVELS]
+        if len(langs) != 1 or len(levels) != 1:
+            return None
+        if any(t not in LANGUAGE_FILLER_WORDS and t not in LANGUAGES and t not in CEFR_LEVELS for t in tokens):
+            return None
+
+        required = levels[0]
+        for form in LANGUAGES[langs[0]]:
+            for pos in index.positions(form):
+                if not index.affirmed(pos, form):
+                    continue
+                level = index.level_after(pos)
+                if level is not None and level >= required:
+                    return form
+        return None
+
+    def match(self, requisito: str, index: CVIndex) -> Optional[Tuple[str, RequirementEvalItem]]:
+        """
+        Devuelve (nivel, veredicto positivo) o None si hay que preguntar al LLM.
+        """
+        tokens = tokenize(requisito)
+
+        lang_form = self._match_language(tokens, index)
+        if lang_form is not None:
+            return "language", RequirementEvalItem(
+                requisito=requisito,
+                cumple=True,
+                justificacion=f"Resuelto localmente: el CV indica {lang_form} con nivel suficiente.",
+            )
+
+        skills = self._requirement_skills(tokens)
+        if not skills:
+            return None
+
+        tiers = []
+        evidence = []
+        for skill in skills:
+            found = self._match_skill(skill, index)
+            if found is None:
+                return None
+            tiers.append(found[0])
+            evidence.append((skill, found[1]))
+
+        tier = "implication" if "implication" in tiers else "exact"
+        if tier == "exact":
+            detail = ", ".join(f"'{term}'" for _, term in evidence)
+            justificacion = f"Resuelto localmente: el CV menciona {detail}."
+        else:
+            detail = ", ".join(
+                f"'{term}' (implica {skill})" if term != skill else f"'{term}'" for skill, term in evidence
+            )
+            justificacion = f"Resuelto localmente: el CV menciona {detail}."
+        return tier, RequirementEvalItem(requisito=requisito, cumple=True, justificacion=justificacion)
+
+    def split(
+        self,
+        requisitos: Iterable[str],
+        cv_text: str,
+    ) -> Tuple[Dict[str, RequirementEvalItem], List[str]]:
+        """
+        Separa los requisitos en resueltos localmente y ambiguos (para el LLM).
+        """
+        index = CVIndex(cv_text)
+        resolved: Dict[str, RequirementEvalItem] = {}
+        pending: List[str] = []
+        tier_hits: Dict[str, int] = defaultdict(int)
+
+        for requisito in requisitos:
+            found = self.match(requisito, index)
+            if found is None:
+                pending.append(requisito)
+                tier_hits["llm"] += 1
+            else:
+                tier, item = found
+                resolved[requisito] = item
+                tier_hits[tier] += 1
+
+        with self._lock:
+            for tier, n in tier_hits.items():
+                self._counts[tier] += n
+        return resolved, pending
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """
+        Aciertos y tasa por nivel (incluido "llm": requisitos no resueltos).
+        """
+        with self._lock:
+            total = sum(self._counts.values())
+            return {
+                tier: {"hits": n, "rate": round(n / total, 4) if total else 0.0}
+                for tier, n in self._counts.items()
+            }
+
+
+_prematcher: Optional[PreMatcher] = None
+
+
+def get_prematcher() -> PreMatcher:
+    global _prematcher
+    if _prematcher is None:
+        _prematcher = PreMatcher()
+    return _prematcher
+
+
+def prematch_stats() -> Dict[str, Dict[str, float]]:
+    return get_prematcher().stats()
@@ -0,0 +1,258 @@
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from config import LLM_PROVIDER, REQUIREMENT_ALIASES_PATH, REQUIREMENT_CANON_ENABLED
+from services.cache import make_cache_key, normalize_text
+from services.prematcher import get_prematcher, tokenize
+
+logger = logging.getLogger(__name__)
+
+# ==========================
+# CANONICALIZACIÓN DE REQUISITOS
+# ==========================
+# El texto de cada requisito lo redacta el LLM, así que "Experiencia en Python",
+# "experiencia con Python" y "Python (experiencia)" llegan como textos distintos.
+# Cada texto se reduce a una forma canónica y a un identificador estable:
+#   1. minúsculas y sin acentos, tokens como en el pre-matcher,
+#   2. alias de skills conocidas -> skill canónica ("k8s" -> "kubernetes"),
+#   3. sin palabras vacías ni marcas de obligatoriedad ("se valora", "mínimo"),
+#   4. bolsa de palabras ordenada (el orden no cambia el requisito).
+# Encima, una tabla de alias (SQLite) une formas canónicas distintas que son el
+# mismo requisito. Los alias se añaden a mano con la CLI: las reformulaciones que
+# el LLM devuelve al evaluar (ver reconcile_items) solo se registran en el log
+# como sugerencias, porque un texto parecido no es necesariamente el mismo
+# requisito ("3 años" frente a "5 años" de Python).
+#
+# La caché de veredictos, la puntuación tras la entrevista y las preguntas al
+# candidato usan el identificador, no el texto.
+
+CANON_STOPWORDS = {
+    # palabras vacías (español / inglés)
+    "a", "al", "de", "del", "el", "la", "los", "las", "lo", "un", "una", "unos", "unas",
+    "en", "con", "para", "por", "sobre", "como", "the", "an", "of", "in", "with", "for", "on",
+    # marcas de obligatoriedad / preferencia: las recoge el tipo del requisito, no su contenido
+    "se", "valora", "valorara", "valoraran", "valorable", "deseable", "imprescindible",
+    "obligatorio", "obligatoria", "requerido", "requerida", "necesario", "necesaria",
+    "minimo", "minima", "plus", "preferible", "preferiblemente",
+}
+
+_NUMBER_PLUS = re.compile(r"^(\d+)\+$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS aliases (
+    alias_key TEXT PRIMARY KEY,
+    canonical_id TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    canonical TEXT NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_aliases_canonical ON aliases (canonical_id);
+"""
+
+
+@lru_cache(maxsize=65536)
+def canonical_text(texto: str) -> str:
+    """
+    Forma canónica de un requisito: "Se valora experiencia con K8s (3+ años)"
+    -> "3 anos experiencia kubernetes".
+    """
+    tokens = get_prematcher().canonical_tokens(tokenize(texto))
+    words = set()
+    for token in tokens:
+        token = _NUMBER_PLUS.sub(r"\1", token)
+        if token not in CANON_STOPWORDS:
+            words.add(token)
+    if not words:
+        # Solo palabras vacías: se usa el texto normalizado tal cual
+        return normalize_text(texto).casefold()
+    return " ".join(sorted(words))
+
+
+def _id_for_key(key: str) -> str:
+    return "req_" + make_cache_key(key)[:16]
+
+
+class AliasTable:
+    """
+    Alias aprendidos: forma canónica de un texto -> identificador del requisito
+    al que equivale. Se carga entera en memoria al abrirse (es pequeña) y cada
+    alias nuevo se escribe en el fichero al momento.
+    """
+
+    def __init__(self, path: str = REQUIREMENT_ALIASES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+        self._ids: Dict[str, str] = {}
+        self.reload()
+
+    def reload(self) -> None:
+        """
+        Vuelve a leer la tabla (alias aprendidos por otros procesos).
+        """
+        with self._lock:
+            self._ids = dict(self._conn.execute("SELECT alias_key, canonical_id FROM aliases"))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._ids)
+
+    def resolve(self, texto: str) -> str:
+        key = canonical_text(texto)
+        with self._lock:
+            return self._ids.get(key) or _id_for_key(key)
+
+    def learn(self, alias: str, canonical: str, source: str = "manual") -> bool:
+        """
+        Registra que `alias` es el mismo requisito que `canonical`. Los alias que
+        ya apuntaban a `alias` pasan a apuntar también a `canonical`.
+        Devuelve False si ya eran equivalentes.
+        """
+        key = canonical_text(alias)
+        target = self.resolve(canonical)
+        with self._lock:
+            old_id = self._ids.get(key) or _id_for_key(key)
+            if old_id == target:
+                return False
+            with self._conn:
+                self._conn.execute(
+                    """
+                    INSERT OR REPLACE INTO aliases (alias_key, canonical_id, alias, canonical, source, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    (key, target, alias, canonical, source, time.time()),
+                )
+                self._conn.execute("UPDATE aliases SET canonical_id = ? WHERE canonical_id = ?", (target, old_id))
+            self._ids[key] = target
+            for other, other_id in self._ids.items():
+                if other_id == old_id:
+                    self._ids[other] = target
+            return True
+
+    def forget(self, alias: str) -> bool:
+        key = canonical_text(alias)
+        with self._lock, self._conn:
+            deleted = self._conn.execute("DELETE FROM aliases WHERE alias_key = ?", (key,)).rowcount
+            self._ids.pop(key, None)
+        return bool(deleted)
+
+    def entries(self) -> List[Dict[str, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT alias, canonical, canonical_id, source FROM aliases ORDER BY canonical_id, created_at"
+            ).fetchall()
+        return [{"alias": a, "canonical": c, "id": i, "source": s} for a, c, i, s in rows]
+
+
+_aliases: Optional[AliasTable] = None
+_aliases_lock = threading.Lock()
+
+
+def get_alias_table() -> AliasTable:
+    global _aliases
+    with _aliases_lock:
+        if _aliases is None:
+            _aliases = AliasTable(REQUIREMENT_ALIASES_PATH)
+        return _aliases
+
+
+def canonical_id(texto: str) -> str:
+    """
+    Identificador estable del requisito (igual para todos sus textos equivalentes).
+    Con REQUIREMENT_CANON_ENABLED=false, solo coinciden los textos iguales tras normalizar.
+    """
+    if not REQUIREMENT_CANON_ENABLED:
+        return _id_for_key(normalize_text(texto).casefold())
+    return get_alias_table().resolve(texto)
+
+
+def unique_requirements(textos: Iterable[str]) -> List[str]:
+    """
+    Un texto por requisito canónico (el primero que aparece), en el orden original.
+    """
+    seen: Set[str] = set()
+    unique = []
+    for texto in textos:
+        rid = canonical_id(texto)
+        if rid not in seen:
+            seen.add(rid)
+            unique.append(texto)
+    return unique
+
+
+def equivalent_texts(textos: Iterable[str], matched: Iterable[str]) -> Set[str]:
+    """
+    Textos de `textos` equivalentes a alguno de `matched` (incluidos los propios).
+    """
+    ids = {canonical_id(t) for t in matched}
+    return {t for t in textos if canonical_id(t) in ids}
+
+
+_suggested: Set[Tuple[str, str]] = set()
+
+
+def suggest_aliases(renames: Mapping[str, str]) -> int:
+    """
+    Registra en el log {texto devuelto por el LLM: requisito pedido} (las
+    reformulaciones detectadas al conciliar veredictos) como posibles alias,
+    con el comando para añadirlos. No se aprenden solos. Devuelve cuántas
+    sugerencias son nuevas en este proceso. Con un proveedor simulado
+    (LLM_PROVIDER=fake) no se sugiere nada: sus reformulaciones no son reales.
+    """
+    if not REQUIREMENT_CANON_ENABLED or not renames or LLM_PROVIDER != "openai":
+        return 0
+    new = 0
+    for alias, canonical in renames.items():
+        if (alias, canonical) in _suggested or canonical_id(alias) == canonical_id(canonical):
+            continue
+        _suggested.add((alias, canonical))
+        new += 1
+        logger.info(
+            "Posible alias de requisito: %r -> %r (python -m services.requirement_canon alias %r %r)",
+            alias, canonical, alias, canonical,
+        )
+    return new
+
+
+if __name__ == "__main__":
+    # Uso: python -m services.requirement_canon id "<requisito>"
+    #      python -m services.requirement_canon alias "<texto>" "<requisito equivalente>"
+    #      python -m services.requirement_canon forget "<texto>"
+    #      python -m services.requirement_canon list
+    args = sys.argv[1:]
+    if args[:1] == ["id"] and len(args) == 2:
+        print(f"{canonical_id(args[1])}  {canonical_text(args[1])}")
+    elif args[:1] == ["alias"] and len(args) == 3:
+        added = get_alias_table().learn(args[1], args[2])
+        print(f"{'Alias añadido' if added else 'Ya eran equivalentes'}: {canonical_id(args[1])}")
+    elif args[:1] == ["forget"] and len(args) == 2:
+        print("Alias eliminado." if get_alias_table().forget(args[1]) else "No había alias para ese texto.")
+    elif args == ["list"]:
+        for entry in get_alias_table().entries():
+            print(f"{entry['id']}  {entry['alias']!r} -> {entry['canonical']!r} ({entry['source']})")
+    else:
+        print('Uso: python -m services.requirement_canon id "<requisito>"')
+        print('     python -m services.requirement_canon alias "<texto>" "<requisito equivalente>"')
+        print('     python -m services.requirement_canon forget "<texto>"')
+        print("     python -m services.requirement_canon list")
+        sys.exit(1)
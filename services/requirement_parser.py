@@ -1,6 +1,104 @@
-from typing import List
-from schemas import RequirementItem, parse_requirements_structured
+from typing import List, Optional
 
-def parse_requirements(oferta_texto: str) -> List[dict]:
-    items: List[RequirementItem] = parse_requirements_structured(oferta_texto)
-    return [item.dict() for item in items]
\ No newline at end of file
+from config import DEFAULT_LLM_MODEL, REQUIREMENTS_CACHE_MAX_ENTRIES
+from schemas import (
+    RequirementItem,
+    PARSE_REQUIREMENTS_PROMPT_VERSION,
+    parse_requirements_structured,
+    aparse_requirements_structured,
+)
+from models.instrumentation import record_cache_hit
+from services.cache import DiskCache, cache_path, make_cache_key, model_cache_id, normalize_text
+
+
+_requirements_cache: Optional[DiskCache] = None
+
+
+def get_requirements_cache() -> DiskCache:
+    """
+    Caché en disco de requisitos parseados (se crea al primer uso).
+    """
+    global _requirements_cache
+    if _requirements_cache is None:
+        _requirements_cache = DiskCache(
+            cache_path("requirements"),
+            max_entries=REQUIREMENTS_CACHE_MAX_ENTRIES,
+        )
+    return _requirements_cache
+
+
+def requirements_cache_key(oferta_texto: str, model: str = DEFAULT_LLM_MODEL) -> str:
+    """
+    Clave = hash(texto normalizado de la oferta, proveedor y modelo, versión del prompt).
+    """
+    return make_cache_key(
+        normalize_text(oferta_texto),
+        model_cache_id(model),
+        PARSE_REQUIREMENTS_PROMPT_VERSION,
+    )
+
+
+def invalidate_requirements_cache(oferta_texto: Optional[str] = None) -> None:
+    """
+    Invalida la entrada de una oferta concreta o, sin argumentos, toda la caché.
+    """
+    cache = get_requirements_cache()
+    if oferta_texto is None:
+        cache.clear()
+    else:
+        cache.delete(requirements_cache_key(oferta_texto))
+
+
+def _cached_items(oferta_texto: str) -> Optional[List[RequirementItem]]:
+    cached = get_requirements_cache().get(requirements_cache_key(oferta_texto))
+    if cached is None:
+        return None
+    record_cache_hit("parse_requirements")
+    return [RequirementItem(**item) for item in cached]
+
+
+def _store_items(oferta_texto: str, items: List[RequirementItem]) -> None:
+    # No guardamos respuestas vacías: suelen indicar un fallo del LLM o de la entrada
+    if items:
+        get_requirements_cache().set(
+            requirements_cache_key(oferta_texto),
+            [item.dict() for item in items],
+        )
+
+
+def parse_requirement_items(oferta_texto: str, use_cache: bool = True) -> List[RequirementItem]:
+    """
+    Como parse_requirements_structured, pero consultando antes la caché en disco:
+    un acierto devuelve los RequirementItem sin ninguna llamada de red.
+    """
+    if use_cache:
+        items = _cached_items(oferta_texto)
+        if items is not None:
+            return items
+
+    items = parse_requirements_structured(oferta_texto)
+    if use_cache:
+        _store_items(oferta_texto, items)
+    return items
+
+
+async def aparse_requirement_items(oferta_texto: str, use_cache: bool = True) -> List[RequirementItem]:
+    if use_cache:
+        items = _cached_items(oferta_texto)
+        if items is not None:
+            return items
+
+    items = await aparse_requirements_structured(oferta_texto)
+    if use_cache:
+        _store_items(oferta_texto, items)
+    return items
+
+
+def parse_requirements(oferta_texto: str, use_cache: bool = True) -> List[dict]:
+    items: List[RequirementItem] = parse_requirement_items(oferta_texto, use_cache=use_cache)
+    return [item.dict() for item in items]
+
+
+async def aparse_requirements(oferta_texto: str, use_cache: bool = True) -> List[dict]:
+    items: List[RequirementItem] = await aparse_requirement_items(oferta_texto, use_cache=use_cache)
+    return [item.dict() for item in items]
@@ -0,0 +1,233 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+
+# ==========================
+# PLAN COMPILADO DE LA LÓGICA DE REQUISITOS
+# ==========================
+# Los grupos (AND / OR), el tipo de cada grupo y la pertenencia de cada
+# requisito se calculan una sola vez por oferta. Después, puntuar a un
+# candidato o a miles es una operación matricial sobre sus veredictos:
+#
+#   V (candidatos x requisitos, bool) @ M (requisitos x grupos)
+#     -> requisitos cumplidos por grupo -> grupo cumplido -> descarte y score
+#
+# Cambiar el tipo de un requisito solo recompila el plan: los veredictos ya
+# obtenidos del LLM se reutilizan tal cual.
+
+Verdicts = Union[Mapping[str, bool], Iterable[str]]
+
+
+def _group_key(r: Dict) -> str:
+    return r.get("group") or f"__single__::{r['texto']}"
+
+
+@dataclass(frozen=True)
+class RequirementPlan:
+    # Requisitos tal y como vienen del parser (para recompilar con otro tipo)
+    requisitos: Tuple[Dict, ...]
+    # Textos únicos de los requisitos: columnas de la matriz de veredictos
+    textos: Tuple[str, ...]
+    # Claves de grupo en orden de aparición
+    groups: Tuple[str, ...]
+    # Pares (texto, grupo) como arrays de índices: member_text[k] pertenece a member_group[k]
+    member_text: np.ndarray
+    member_group: np.ndarray
+    # Por grupo: operador OR, obligatorio y número de miembros
+    group_or: np.ndarray
+    group_mandatory: np.ndarray
+    group_size: np.ndarray
+    # Textos de cada grupo, en orden (para las listas del resultado)
+    group_members: Tuple[Tuple[str, ...], ...]
+    # Matriz (requisitos x grupos) con 1 donde el requisito pertenece al grupo
+    membership: np.ndarray
+    # Nº de requisitos de la oferta (denominador del score, como en la versión original)
+    total: int
+
+    @classmethod
+    def compile(cls, requisitos: List[Dict]) -> "RequirementPlan":
+        """
+        Compila los requisitos de una oferta. Cada grupo toma el tipo y el
+        operador de su primer requisito; los requisitos sin grupo son grupos
+        unitarios AND.
+        """
+        text_index: Dict[str, int] = {}
+        group_index: Dict[str, int] = {}
+        group_or: List[bool] = []
+        group_mandatory: List[bool] = []
+        members: Dict[Tuple[int, int], None] = {}
+
+        for r in requisitos:
+            texto = r["texto"]
+            t = text_index.setdefault(texto, len(text_index))
+            gid = _group_key(r)
+            if gid not in group_index:
+                group_index[gid] = len(group_index)
+                group_or.append(r.get("group") is not None and r.get("operator") == "OR")
+                group_mandatory.append(r.get("tipo", "obligatorio") == "obligatorio")
+            members[(t, group_index[gid])] = None
+
+        pairs = np.array(list(members), dtype=np.intp).reshape(-1, 2)
+        membership = np.zeros((len(text_index), len(group_index)), dtype=np.int32)
+        membership[pairs[:, 0], pairs[:, 1]] = 1
+        textos = tuple(text_index)
+        group_members: List[List[str]] = [[] for _ in group_index]
+        for t, g in members:
+            group_members[g].append(textos[t])
+        return cls(
+            requisitos=tuple(dict(r) for r in requisitos),
+            textos=textos,
+            groups=tuple(group_index),
+            member_text=pairs[:, 0],
+            member_group=pairs[:, 1],
+            group_or=np.array(group_or, dtype=bool),
+            group_mandatory=np.array(group_mandatory, dtype=bool),
+            group_size=np.bincount(pairs[:, 1], minlength=len(group_index)),
+            group_members=tuple(tuple(m) for m in group_members),
+            membership=membership,
+            total=len(requisitos),
+        )
+
+    def with_tipo(self, texto: str, tipo: str) -> "RequirementPlan":
+        """
+        Nuevo plan con el tipo de `texto` cambiado (se aplica a todo su grupo,
+        cuyo tipo es el de su primer requisito). No requiere llamadas al LLM.
+        """
+        group = next((r.get("group") for r in self.requisitos if r["texto"] == texto), None)
+        updated = []
+        for r in self.requisitos:
+            if r["texto"] == texto or (group is not None and r.get("group") == group):
+                r = {**r, "tipo": tipo}
+            updated.append(r)
+        return RequirementPlan.compile(updated)
+
+    # ---------- matrices ----------
+
+    def verdict_row(self, verdicts: Verdicts) -> np.ndarray:
+        """
+        Vector booleano de veredictos en el orden de `textos`. Acepta un dict
+        texto -> cumple o una colección de textos cumplidos; lo que falta cuenta como no cumplido.
+        """
+        if isinstance(verdicts, Mapping):
+            return np.fromiter((bool(verdicts.get(t, False)) for t in self.textos), dtype=bool, count=len(self.textos))
+        met = set(verdicts)
+        return np.fromiter((t in met for t in self.textos), dtype=bool, count=len(self.textos))
+
+    def verdict_matrix(self, pool: Iterable[Verdicts]) -> np.ndarray:
+        """
+        Matriz (candidatos x requisitos) a partir de los veredictos de cada
+        candidato (p. ej. result["verdicts"] de evaluate_cv_against_requirements).
+        """
+        rows = [self.verdict_row(v) for v in pool]
+        if not rows:
+            return np.zeros((0, len(self.textos)), dtype=bool)
+        return np.vstack(rows)
+
+    def group_matrix(self, verdicts: np.ndarray) -> np.ndarray:
+        """
+        Grupos cumplidos por candidato (candidatos x grupos).
+        """
+        verdicts = np.atleast_2d(np.asarray(verdicts, dtype=bool))
+        met = verdicts.astype(np.int32) @ self.membership
+        return np.where(self.group_or, met > 0, met == self.group_size)
+
+    def score_matrix(self, verdicts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Puntúa una matriz de veredictos (candidatos x requisitos) en una sola
+        operación y devuelve (scores, descartados).
+        """
+        return self._score(self.group_matrix(verdicts))
+
+    def _score(self, group_ok: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        discarded = (~group_ok & self.group_mandatory).any(axis=1)
+        if not self.total:
+            return np.zeros(len(group_ok)), discarded
+        # Un requisito cuenta como cumplido si alguno de sus grupos se cumple
+        text_ok = (group_ok.astype(np.int32) @ self.membership.T) > 0
+        scores = text_ok.sum(axis=1) / self.total * 100.0
+        scores[discarded] = 0.0
+        return np.round(scores, 2), discarded
+
+    # ---------- un candidato ----------
+
+    def evaluate(self, verdicts: Verdicts) -> Dict:
+        """
+        Resultado completo de un candidato (mismo formato que _score_requirements),
+        con los veredictos individuales en "verdicts" (solo los evaluados si
+        `verdicts` es un dict: los opcionales omitidos por short_circuit no aparecen).
+        """
+        row = self.verdict_row(verdicts)
+        group_matrix = self.group_matrix(row)
+        scores, discarded = self._score(group_matrix)
+        group_ok = group_matrix[0]
+
+        matching: List[str] = []
+        unmatching: List[str] = []
+        not_found: List[str] = []
+        for g, textos in enumerate(self.group_members):
+            if group_ok[g]:
+                matching.extend(textos)
+            elif self.group_mandatory[g]:
+                unmatching.extend(textos)
+            else:
+                not_found.extend(textos)
+
+        return {
+            "score": float(scores[0]),
+            "discarded": bool(discarded[0]),
+            "matching_requirements": matching,
+            "unmatching_requirements": unmatching,
+            "not_found_requirements": not_found,
+            "verdicts": {
+                t: bool(v) for t, v in zip(self.textos, row)
+                if not isinstance(verdicts, Mapping) or t in verdicts
+            },
+        }
+
+
+# Planes compilados por oferta (clave: los requisitos tal cual), acotado LRU
+_PLAN_CACHE_SIZE = 256
+_plans: "OrderedDict[Tuple, RequirementPlan]" = OrderedDict()
+_plans_lock = threading.Lock()
+
+
+def _plan_key(requisitos: List[Dict]) -> Tuple:
+    return tuple(
+        (r["texto"], r.get("tipo", "obligatorio"), r.get("group"), r.get("operator"))
+        for r in requisitos
+    )
+
+
+def get_plan(requisitos: List[Dict]) -> RequirementPlan:
+    """
+    Devuelve el plan compilado de la oferta (se compila una vez y se reutiliza).
+    """
+    key = _plan_key(requisitos)
+    with _plans_lock:
+        plan: Optional[RequirementPlan] = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            return plan
+    plan = RequirementPlan.compile(requisitos)
+    with _plans_lock:
+        _plans[key] = plan
+        while len(_plans) > _PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
+
+
+def rescore_pool(requisitos: List[Dict], results: List[Dict]) -> List[Dict]:
+    """
+    Vuelve a puntuar un conjunto de resultados (con su clave "verdicts") contra
+    `requisitos`, p. ej. tras cambiar el tipo de un requisito. Sin llamadas al LLM.
+    """
+    plan = get_plan(requisitos)
+    scores, discarded = plan.score_matrix(plan.verdict_matrix(r.get("verdicts", {}) for r in results))
+    return [
+        {"score": float(s), "discarded": bool(d)}
+        for s, d in zip(scores, discarded)
+    ]
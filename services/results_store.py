@@ -0,0 +1,354 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import RESULTS_DB_PATH
+from services.cache import text_hash
+from services.requirement_plan import get_plan
+
+
+# ==========================
+# ALMACÉN DE RESULTADOS (SQLite, modo WAL)
+# ==========================
+# Guarda ofertas parseadas, veredictos por requisito (con justificación),
+# puntuaciones y resultados de la entrevista, para poder reordenar o filtrar
+# un conjunto de candidatos sin volver a llamar al LLM.
+#
+# En modo WAL las lecturas no bloquean a las escrituras (ni al revés), así
+# que varios procesos pueden escribir y consultar el mismo fichero.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS offers (
+    offer_id TEXT PRIMARY KEY,
+    texto TEXT NOT NULL,
+    requisitos TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS evaluations (
+    offer_id TEXT NOT NULL,
+    candidate_id TEXT NOT NULL,
+    score REAL,
+    discarded INTEGER,
+    result TEXT,
+    error TEXT,
+    elapsed REAL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (offer_id, candidate_id)
+);
+-- top-k de candidatos no descartados de una oferta
+CREATE INDEX IF NOT EXISTS idx_evaluations_rank
+    ON evaluations (offer_id, discarded, score DESC, candidate_id);
+
+CREATE TABLE IF NOT EXISTS verdicts (
+    offer_id TEXT NOT NULL,
+    candidate_id TEXT NOT NULL,
+    requisito TEXT NOT NULL,
+    -- "cv" (evaluación del CV) o "interview" (respuesta del candidato)
+    source TEXT NOT NULL,
+    cumple INTEGER NOT NULL,
+    justificacion TEXT,
+    PRIMARY KEY (offer_id, candidate_id, requisito, source)
+);
+-- candidatos que cumplen un requisito de una oferta
+CREATE INDEX IF NOT EXISTS idx_verdicts_requirement
+    ON verdicts (offer_id, requisito, cumple, candidate_id);
+
+CREATE TABLE IF NOT EXISTS interviews (
+    offer_id TEXT NOT NULL,
+    candidate_id TEXT NOT NULL,
+    fulfilled TEXT NOT NULL,
+    score REAL NOT NULL,
+    discarded INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (offer_id, candidate_id)
+);
+"""
+
+
+def offer_id_for(oferta_texto: str) -> str:
+    """
+    Identificador estable de una oferta: hash de su texto normalizado.
+    """
+    return text_hash(oferta_texto)[:16]
+
+
+class ResultsStore:
+    """
+    Almacén persistente de resultados de evaluación.
+
+    Una conexión por instancia protegida por lock (como DiskCache); para
+    varios procesos, cada uno abre su propia instancia sobre el mismo fichero.
+    Las escrituras por lotes van en una sola transacción.
+    """
+
+    def __init__(self, path: str = RESULTS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # En WAL, NORMAL solo sincroniza en los checkpoints: seguro ante caídas del proceso
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # ---------- escritura ----------
+
+    def save_offer(self, oferta_texto: str, requisitos: List[Dict]) -> str:
+        offer_id = offer_id_for(oferta_texto)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO offers (offer_id, texto, requisitos, created_at) VALUES (?, ?, ?, ?)",
+                (offer_id, oferta_texto, json.dumps(requisitos, ensure_ascii=False), time.time()),
+            )
+        return offer_id
+
+    def save_evaluations(self, offer_id: str, evaluations: Iterable[Any]) -> int:
+        """
+        Inserta (o reemplaza) en bloque los resultados de varios candidatos.
+
+        Acepta objetos con candidate_id / result / error / elapsed (como
+        CandidateEvaluation) o pares (candidate_id, result).
+        """
+        now = time.time()
+        eval_rows: List[Tuple] = []
+        verdict_rows: List[Tuple] = []
+        candidates: List[Tuple[str, str]] = []
+        for ev in evaluations:
+            if isinstance(ev, tuple):
+                candidate_id, result, error, elapsed = ev[0], ev[1], None, None
+            else:
+                candidate_id, result, error, elapsed = ev.candidate_id, ev.result, ev.error, ev.elapsed
+            candidates.append((offer_id, candidate_id))
+            eval_rows.append((
+                offer_id,
+                candidate_id,
+                result["score"] if result else None,
+                int(result["discarded"]) if result else None,
+                json.dumps(result, ensure_ascii=False) if result else None,
+                error,
+                elapsed,
+                now,
+            ))
+            if result:
+                justifications = result.get("justifications", {})
+                for requisito, cumple in result.get("verdicts", {}).items():
+                    verdict_rows.append((
+                        offer_id, candidate_id, requisito, "cv", int(cumple), justifications.get(requisito),
+                    ))
+
+        if not eval_rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM verdicts WHERE offer_id = ? AND candidate_id = ? AND source = 'cv'",
+                candidates,
+            )
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO evaluations
+                    (offer_id, candidate_id, score, discarded, result, error, elapsed, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                eval_rows,
+            )
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO verdicts
+                    (offer_id, candidate_id, requisito, source, cumple, justificacion)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                verdict_rows,
+            )
+        return len(eval_rows)
+
+    def save_interview(
+        self,
+        offer_id: str,
+        candidate_id: str,
+        fulfilled: List[str],
+        reeval: Dict,
+    ) -> None:
+        """
+        Guarda el resultado de la entrevista: requisitos que el candidato dice
+        cumplir y la puntuación recalculada (reevaluate_with_additional_info).
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO interviews
+                    (offer_id, candidate_id, fulfilled, score, discarded, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    offer_id,
+                    candidate_id,
+                    json.dumps(fulfilled, ensure_ascii=False),
+                    reeval["score"],
+                    int(reeval["discarded"]),
+                    time.time(),
+                ),
+            )
+            self._conn.executemany(
+                """
+                INSERT OR REPLACE INTO verdicts
+                    (offer_id, candidate_id, requisito, source, cumple, justificacion)
+                VALUES (?, ?, ?, 'interview', 1, NULL)
+                """,
+                [(offer_id, candidate_id, r) for r in fulfilled],
+            )
+
+    # ---------- consultas ----------
+
+    def requirements(self, offer_id: str) -> Optional[List[Dict]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT requisitos FROM offers WHERE offer_id = ?", (offer_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def evaluation(self, offer_id: str, candidate_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result FROM evaluations WHERE offer_id = ? AND candidate_id = ?",
+                (offer_id, candidate_id),
+            ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def top_k(self, offer_id: str, k: int = 10) -> List[Dict]:
+        """
+        Los `k` candidatos no descartados con mejor puntuación (usa idx_evaluations_rank).
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT candidate_id, score FROM evaluations
+                WHERE offer_id = ? AND discarded = 0
+                ORDER BY score DESC, candidate_id
+                LIMIT ?
+                """,
+                (offer_id, k),
+            ).fetchall()
+        return [{"candidate_id": c, "score": s} for c, s in rows]
+
+    def candidates_meeting(self, offer_id: str, requisito: str, include_interview: bool = True) -> List[str]:
+        """
+        Candidatos que cumplen `requisito` según el CV (y, por defecto, también
+        según la entrevista). Usa idx_verdicts_requirement.
+        """
+        sources = ("cv", "interview") if include_interview else ("cv",)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT DISTINCT candidate_id FROM verdicts
+                WHERE offer_id = ? AND requisito = ? AND cumple = 1
+                  AND source IN ({",".join("?" * len(sources))})
+                ORDER BY candidate_id
+                """,
+                (offer_id, requisito, *sources),
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def verdicts(self, offer_id: str) -> Dict[str, Dict[str, bool]]:
+        """
+        Veredictos del CV por candidato: {candidate_id: {requisito: cumple}}.
+        """
+        out: Dict[str, Dict[str, bool]] = {}
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT candidate_id, requisito, cumple FROM verdicts WHERE offer_id = ? AND source = 'cv'",
+                (offer_id,),
+            ).fetchall()
+        for candidate_id, requisito, cumple in rows:
+            out.setdefault(candidate_id, {})[requisito] = bool(cumple)
+        return out
+
+    def rescore(self, offer_id: str, requisitos: Optional[List[Dict]] = None) -> int:
+        """
+        Recalcula el resultado (score, descarte y listas de requisitos) de todos
+        los candidatos de la oferta a partir de los veredictos guardados (p. ej. tras cambiar el tipo de un
+        requisito), sin llamar al LLM. Si se pasan `requisitos`, pasan a ser
+        los de la oferta.
+        """
+        if requisitos is None:
+            requisitos = self.requirements(offer_id) or []
+        else:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "UPDATE offers SET requisitos = ? WHERE offer_id = ?",
+                    (json.dumps(requisitos, ensure_ascii=False), offer_id),
+                )
+
+        by_candidate = self.verdicts(offer_id)
+        if not by_candidate or not requisitos:
+            return 0
+        with self._lock:
+            stored = dict(self._conn.execute(
+                "SELECT candidate_id, result FROM evaluations WHERE offer_id = ?", (offer_id,)
+            ))
+        plan = get_plan(requisitos)
+        rows = []
+        for candidate_id, verdicts in by_candidate.items():
+            # Se rehace el resultado completo (listas de requisitos cumplidos /
+            # no cumplidos incluidas); las justificaciones del CV se conservan
+            previous = json.loads(stored[candidate_id]) if stored.get(candidate_id) else {}
+            result = {**previous, **plan.evaluate(verdicts)}
+            rows.append((
+                result["score"],
+                int(result["discarded"]),
+                json.dumps(result, ensure_ascii=False),
+                offer_id,
+                candidate_id,
+            ))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "UPDATE evaluations SET score = ?, discarded = ?, result = ? WHERE offer_id = ? AND candidate_id = ?",
+                rows,
+            )
+        return len(rows)
+
+
+_store: Optional[ResultsStore] = None
+_store_lock = threading.Lock()
+
+
+def get_results_store() -> ResultsStore:
+    """
+    Almacén de resultados del proceso (RESULTS_DB_PATH).
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ResultsStore(RESULTS_DB_PATH)
+        return _store
+
+
+if __name__ == "__main__":
+    # Uso: python -m services.results_store top <offer_id> [k]
+    #      python -m services.results_store meeting <offer_id> "<requisito>"
+    if len(sys.argv) < 3 or sys.argv[1] not in ("top", "meeting"):
+        print("Uso: python -m services.results_store top <offer_id> [k]")
+        print('     python -m services.results_store meeting <offer_id> "<requisito>"')
+        sys.exit(1)
+
+    store = get_results_store()
+    if sys.argv[1] == "top":
+        k = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+        for row in store.top_k(sys.argv[2], k):
+            print(f"{row['score']:>7.2f}  {row['candidate_id']}")
+    else:
+        for candidate_id in store.candidates_meeting(sys.argv[2], sys.argv[3]):
+            print(candidate_id)
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+import pytest
+
+
+# config.py lee el entorno al importarse: antes de que los tests importen nada
+# del proyecto se fija el LLM simulado (sin red ni claves) y las cachés y
+# almacenes en un directorio temporal, para no tocar los de la instalación.
+_TMP_DIR = tempfile.mkdtemp(prefix="ia_ev_tests_")
+
+os.environ.update({
+    "LLM_PROVIDER": "fake",
+    "FAKE_LLM_ERROR_RATE": "0",
+    "FAKE_LLM_RATE_LIMIT_SHARE": "0",
+    "FAKE_LLM_LATENCY": "0",
+    "LLM_CASSETTE_MODE": "",
+    "LLM_RATE_LIMIT_ENABLED": "false",
+    "CASCADE_ENABLED": "false",
+    "PREMATCH_ENABLED": "false",
+    "RETRIEVAL_ENABLED": "false",
+    "CV_CONTEXT_MODE": "raw",
+    "CACHE_DIR": _TMP_DIR,
+})
+for _name in ("REQUIREMENT_ALIASES_PATH", "RESULTS_DB_PATH", "JOB_QUEUE_PATH", "INTERVIEW_CHECKPOINT_PATH"):
+    os.environ.pop(_name, None)
+
+
+@pytest.fixture
+def tmp_db(tmp_path):
+    """
+    Ruta de un fichero SQLite nuevo para el test.
+    """
+    return str(tmp_path / "test.sqlite3")
@@ -0,0 +1,67 @@
+import pytest
+
+from models.fake_llm import process_batch_file
+from services.batch_api import export_batch, ingest_batch, manifest_path_for
+from services.cv_evaluator import check_requirements
+from services.results_store import ResultsStore
+
+OFERTA = """Desarrollador backend (test batch {n}).
+Requisitos: experiencia en Python, Docker, inglés B2.
+Se valora experiencia con Kubernetes."""
+
+CVS = [
+    ("ana", "Ana. Backend con Python y Docker desde 2019. Inglés C1."),
+    ("luis", "Luis. Desarrollador Java y Spring. Francés B1."),
+]
+
+
+@pytest.fixture
+def store(tmp_db):
+    s = ResultsStore(tmp_db)
+    yield s
+    s.close()
+
+
+def _round_trip(oferta, cvs, store, tmp_path, name, error_rate=0.0):
+    requests_path = str(tmp_path / f"{name}.jsonl")
+    results_path = str(tmp_path / f"{name}.results.jsonl")
+    counts = export_batch(oferta, cvs, requests_path, store=store)
+    process_batch_file(requests_path, results_path, error_rate=error_rate)
+    return counts, ingest_batch(results_path, manifest_path_for(requests_path), store=store)
+
+
+def test_export_process_ingest_round_trip(store, tmp_path):
+    oferta = OFERTA.format(n=1)
+
+    # 1ª vuelta: la oferta no está parseada, solo se exporta su parseo
+    exported, ingested = _round_trip(oferta, CVS, store, tmp_path, "parse")
+    assert exported["stage"] == "parse" and exported["requests"] == 1
+    assert ingested["parsed"] == 1 and ingested["errors"] == 0
+    requisitos = store.requirements(exported["offer_id"])
+    assert requisitos
+
+    # 2ª vuelta: una petición por CV
+    exported, ingested = _round_trip(oferta, CVS, store, tmp_path, "check")
+    assert exported["stage"] == "check" and exported["requests"] == len(CVS)
+    assert ingested == {"parsed": 0, "evaluated": len(CVS), "local": 0, "errors": 0, "missing": 0}
+
+    # Los veredictos coinciden con los de una evaluación en vivo con el mismo LLM
+    textos = [r["texto"] for r in requisitos]
+    for candidate_id, cv_text in CVS:
+        result = store.evaluation(exported["offer_id"], candidate_id)
+        live = check_requirements(textos, cv_text, use_cache=False)
+        assert result["verdicts"] == {item.requisito: item.cumple for item in live}
+
+    # 3ª vuelta: todo está en la caché de veredictos, nada va al proveedor
+    exported, ingested = _round_trip(oferta, CVS, store, tmp_path, "cached")
+    assert exported["requests"] == 0 and exported["local"] == len(CVS)
+    assert ingested["local"] == len(CVS)
+
+
+def test_failed_lines_are_stored_as_errors(store, tmp_path):
+    oferta = OFERTA.format(n=2)
+    _round_trip(oferta, CVS, store, tmp_path, "parse")
+    exported, ingested = _round_trip(oferta, CVS, store, tmp_path, "check", error_rate=1.0)
+    assert ingested["errors"] == len(CVS) and ingested["evaluated"] == 0
+    assert store.top_k(exported["offer_id"]) == []
+    assert store.evaluation(exported["offer_id"], "ana") is None
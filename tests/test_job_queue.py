@@ -0,0 +1,99 @@
+import pytest
+
+from services.job_queue import JobQueue, enqueue_offer, run_worker
+from services.results_store import get_results_store
+
+CVS = [("ana", "CV de Ana: Python y Docker."), ("luis", "CV de Luis: Java."), ("eva", "CV de Eva: Python.")]
+
+
+@pytest.fixture
+def queue(tmp_db):
+    q = JobQueue(tmp_db)
+    yield q
+    q.close()
+
+
+def test_enqueue_does_not_duplicate_jobs(queue):
+    assert queue.enqueue("oferta", CVS) == 3
+    assert queue.enqueue("oferta", CVS[:1]) == 0
+    assert queue.counts()["pending"] == 3
+
+
+def test_claim_and_complete(queue):
+    queue.enqueue("oferta", CVS)
+    jobs = queue.claim("w1", n=2)
+    assert [(j.candidate_id, j.attempts) for j in jobs] == [("ana", 1), ("luis", 1)]
+    assert jobs[0].cv_text == CVS[0][1]
+    # Lo reclamado no se reparte a otro worker mientras el lease siga vigente
+    assert [j.candidate_id for j in queue.claim("w2")] == ["eva"]
+
+    assert queue.complete("w1", jobs) == 2
+    assert queue.counts() == {"pending": 0, "leased": 1, "done": 2, "failed": 0}
+
+
+def test_expired_lease_is_reclaimed_and_stale_owner_cannot_complete(queue):
+    queue.enqueue("oferta", CVS[:1])
+    (job,) = queue.claim("w1", lease_seconds=-1)
+    (again,) = queue.claim("w2")
+    assert again.attempts == 2
+    # w1 perdió el lease: su complete no cuenta
+    assert queue.complete("w1", [job]) == 0
+    assert queue.complete("w2", [again]) == 1
+
+
+def test_expired_lease_after_last_attempt_fails_the_job(queue):
+    queue.enqueue("oferta", CVS[:1])
+    queue.claim("w1", lease_seconds=-1, max_attempts=1)
+    assert queue.claim("w2", max_attempts=1) == []
+    assert queue.counts()["failed"] == 1
+    assert queue.next_wakeup() is None
+
+
+def test_renew_keeps_the_lease(queue):
+    queue.enqueue("oferta", CVS[:1])
+    jobs = queue.claim("w1", lease_seconds=-1)
+    assert queue.renew("w1", jobs, lease_seconds=60) == 1
+    assert queue.claim("w2") == []
+    # Solo el dueño del lease lo renueva
+    assert queue.renew("w2", jobs, lease_seconds=60) == 0
+
+
+def test_fail_retries_with_backoff(queue):
+    queue.enqueue("oferta", CVS[:1])
+    (job,) = queue.claim("w1", max_attempts=2)
+    queue.fail("w1", job, "error", max_attempts=2)
+    assert queue.counts()["pending"] == 1
+    # En backoff: todavía no se puede reclamar
+    assert queue.claim("w1", max_attempts=2) == []
+    assert queue.next_wakeup() > 0
+
+
+def test_fail_after_last_attempt_and_retry_failed(queue):
+    queue.enqueue("oferta", CVS[:1])
+    (job,) = queue.claim("w1", max_attempts=1)
+    queue.fail("w1", job, "error", max_attempts=1)
+    assert queue.counts()["failed"] == 1
+
+    assert queue.retry_failed() == 1
+    (job,) = queue.claim("w1", max_attempts=1)
+    assert job.attempts == 1
+
+
+def test_worker_processes_several_batches_in_one_event_loop(tmp_db):
+    offer_id, added = enqueue_offer(
+        "Buscamos desarrollador. Requisitos: experiencia en Python, Docker. Se valora inglés B2.",
+        CVS,
+        queue_path=tmp_db,
+    )
+    assert added == 3
+    # claim_size=1: tres lotes con el mismo cliente async del LLM
+    assert run_worker(tmp_db, claim_size=1) == 3
+
+    queue = JobQueue(tmp_db)
+    try:
+        assert queue.counts()["done"] == 3
+    finally:
+        queue.close()
+    store = get_results_store()
+    for candidate_id, _ in CVS:
+        assert store.evaluation(offer_id, candidate_id) is not None
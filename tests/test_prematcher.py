@@ -0,0 +1,61 @@
+import pytest
+
+from services.prematcher import CVIndex, PreMatcher
+
+
+@pytest.fixture(scope="module")
+def prematcher():
+    return PreMatcher()
+
+
+def _tier(prematcher, requisito, cv_text):
+    found = prematcher.match(requisito, CVIndex(cv_text))
+    return found[0] if found else None
+
+
+@pytest.mark.parametrize(
+    "requisito, cv_text, tier",
+    [
+        ("Experiencia en Python", "Desarrollador backend con Python y Flask.", "exact"),
+        ("Python", "Proyectos con Django y Flask.", "implication"),
+        ("K8s", "Despliegues en Kubernetes.", "exact"),
+        ("Inglés B2", "Idiomas: inglés C1, francés A2.", "language"),
+        ("Inglés nivel B2 o superior", "English (C2)", "language"),
+    ],
+)
+def test_obvious_requirements_resolve_locally(prematcher, requisito, cv_text, tier):
+    assert _tier(prematcher, requisito, cv_text) == tier
+
+
+@pytest.mark.parametrize(
+    "requisito, cv_text",
+    [
+        # El nivel es el del idioma al que sigue, no el de otro idioma cercano
+        ("Inglés B2", "Idiomas: Inglés A2, Francés C1"),
+        ("Inglés C1", "Inglés básico. Alemán C1"),
+        # Intención o negación, no experiencia
+        ("Python", "Me gustaría aprender Python."),
+        ("Docker", "Sin experiencia en Docker. Uso Git a diario."),
+        ("Inglés B2", "No hablo inglés. Francés C1."),
+        # Alias corto tras un número
+        ("Machine learning", "Consumo 500 ml de café al día."),
+        # Los calificativos de nivel cambian el requisito: lo decide el LLM
+        ("Python avanzado", "Python."),
+        ("Sólidos conocimientos de Docker", "Docker."),
+        ("Inglés nivel alto", "Inglés C1"),
+        ("Python o Java", "Python."),
+        # Skill que no aparece
+        ("Kubernetes", "Python y Docker."),
+    ],
+)
+def test_ambiguous_or_negative_cases_go_to_the_llm(prematcher, requisito, cv_text):
+    assert _tier(prematcher, requisito, cv_text) is None
+
+
+def test_split_separates_resolved_and_pending(prematcher):
+    resolved, pending = prematcher.split(
+        ["Python", "Git", "Python avanzado"], "Uso Python a diario. Me gustaría aprender Git."
+    )
+    assert list(resolved) == ["Python"]
+    assert resolved["Python"].cumple is True
+    assert pending == ["Git", "Python avanzado"]
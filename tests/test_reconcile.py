@@ -0,0 +1,64 @@
+from schemas import RequirementEvalItem, reconcile_items
+
+
+def _item(requisito: str, cumple: bool) -> RequirementEvalItem:
+    return RequirementEvalItem(requisito=requisito, cumple=cumple, justificacion="")
+
+
+def _verdicts(matched):
+    return {texto: item.cumple for texto, item in matched.items()}
+
+
+def test_exact_match_ignores_case_accents_and_bullets():
+    matched, missing = reconcile_items(
+        ["Inglés B2", "Experiencia en Docker"],
+        [_item("- experiencia en docker.", True), _item("INGLES B2", False)],
+    )
+    assert _verdicts(matched) == {"Inglés B2": False, "Experiencia en Docker": True}
+    assert missing == []
+    # El item devuelto lleva el texto pedido, no el del LLM
+    assert matched["Experiencia en Docker"].requisito == "Experiencia en Docker"
+
+
+def test_reordered_answer_does_not_swap_verdicts():
+    matched, missing = reconcile_items(
+        ["Experiencia en Python", "Experiencia en Java"],
+        [_item("Experiencia en Java (3 años)", True), _item("Experiencia en Python (1 año)", False)],
+    )
+    assert _verdicts(matched) == {"Experiencia en Python": False, "Experiencia en Java": True}
+    assert missing == []
+
+
+def test_position_breaks_ties_between_equally_similar_items():
+    matched, _ = reconcile_items(
+        ["Requisito A", "Requisito B"],
+        [_item("Requisito X", True), _item("Requisito Y", False)],
+    )
+    assert _verdicts(matched) == {"Requisito A": True, "Requisito B": False}
+
+
+def test_dissimilar_items_are_left_missing():
+    matched, missing = reconcile_items(
+        ["Python", "Docker", "Inglés B2"],
+        [_item("Python", True), _item("Carnet de conducir", True)],
+    )
+    assert _verdicts(matched) == {"Python": True}
+    assert missing == ["Docker", "Inglés B2"]
+
+
+def test_renames_only_record_close_rewordings():
+    renames = {}
+    matched, missing = reconcile_items(
+        ["Experiencia de 3 años en Python", "Inglés B2"],
+        [_item("Experiencia de 3 años con Python", True)],
+        renames=renames,
+    )
+    assert _verdicts(matched) == {"Experiencia de 3 años en Python": True}
+    assert missing == ["Inglés B2"]
+    assert renames == {"Experiencia de 3 años con Python": "Experiencia de 3 años en Python"}
+
+
+def test_duplicated_requests_get_one_item():
+    matched, missing = reconcile_items(["Python", "Python"], [_item("Python", True)])
+    assert _verdicts(matched) == {"Python": True}
+    assert missing == []
@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+
+from services import requirement_canon
+from services.requirement_canon import AliasTable, canonical_text
+
+
+@pytest.fixture
+def table(tmp_db):
+    aliases = AliasTable(tmp_db)
+    yield aliases
+    aliases.close()
+
+
+def test_canonical_text_ignores_order_stopwords_and_skill_aliases():
+    assert canonical_text("Se valora experiencia con K8s") == canonical_text("Kubernetes (experiencia)")
+    assert canonical_text("Experiencia de 3 años en Python") != canonical_text("Experiencia de 5 años en Python")
+
+
+def test_learn_makes_texts_equivalent(table):
+    assert table.resolve("Nivel de inglés B2") != table.resolve("Inglés B2")
+    assert table.learn("Nivel de inglés B2", "Inglés B2") is True
+    assert table.resolve("Nivel de inglés B2") == table.resolve("Inglés B2")
+    # Ya eran equivalentes
+    assert table.learn("Nivel de inglés B2", "Inglés B2") is False
+
+
+def test_learn_repoints_aliases_of_the_alias(table):
+    table.learn("Python 3", "Programación en Python")
+    table.learn("Programación en Python", "Experiencia en Python")
+    target = table.resolve("Experiencia en Python")
+    assert table.resolve("Python 3") == target
+    assert table.resolve("Programación en Python") == target
+
+
+def test_aliases_persist_and_can_be_forgotten(table, tmp_db):
+    table.learn("Nivel de inglés B2", "Inglés B2")
+    other = AliasTable(tmp_db)
+    try:
+        assert other.resolve("Nivel de inglés B2") == other.resolve("Inglés B2")
+        assert [e["source"] for e in other.entries()] == ["manual"]
+    finally:
+        other.close()
+
+    assert table.forget("Nivel de inglés B2") is True
+    assert table.resolve("Nivel de inglés B2") != table.resolve("Inglés B2")
+    assert table.forget("Nivel de inglés B2") is False
+
+
+def test_reconcile_renames_are_only_suggested(table, monkeypatch, caplog):
+    monkeypatch.setattr(requirement_canon, "LLM_PROVIDER", "openai")
+    monkeypatch.setattr(requirement_canon, "REQUIREMENT_CANON_ENABLED", True)
+    monkeypatch.setattr(requirement_canon, "get_alias_table", lambda: table)
+    monkeypatch.setattr(requirement_canon, "_suggested", set())
+
+    renames = {"Experiencia de 5 años en Python": "Experiencia de 3 años en Python"}
+    with caplog.at_level(logging.INFO, logger=requirement_canon.__name__):
+        assert requirement_canon.suggest_aliases(renames) == 1
+        # La misma sugerencia no se repite en el proceso
+        assert requirement_canon.suggest_aliases(renames) == 0
+
+    assert len(table) == 0
+    assert table.resolve("Experiencia de 5 años en Python") != table.resolve("Experiencia de 3 años en Python")
+    assert "requirement_canon alias" in caplog.text